@@ -7,7 +7,7 @@ if error occures, raise the log level to debug mode and analyze the logs:
                     custom_components.sensor.broadlink_s1c: debug
 
 installation notes:
-place this file in the following folder and restart home assistant:
+place this file and broadlink_s1c_util.py in the following folder and restart home assistant:
 /config/custom_components/sensor
 
 yaml configuration example:
@@ -16,16 +16,21 @@ sensor:
   - platform: broadlink_s1c
     ip_address: "xxx.xxx.xxx.xxx" # set your s1c hub local ip address
     mac: "XX:XX:XX:XX:XX:XX" # set your s1c hub mac address
+    watch_interval: 0.5 # optional, target seconds between sensors status checks, 0 with the fast and quiet intervals queries back to back
+    fire_events: true # optional, fire BROADLINK_S1C_SENSOR_UPDATE on sensor changes for automations
+    poll_workers: 3 # optional, threads polling all the configured hubs, taken from the first hub configured
+    filters: # optional, debounce the sensors changes per sensor type
+      motion_sensor:
+        release_delay: 10 # no motion is reported only after lasting 10 seconds
 
 ////////////////////////////////////////////////////////////////////////////////////////////////"""
 import binascii
 import socket
+import traceback
 import datetime
 import logging
 import asyncio
-import traceback
-import json
-import threading
+import time
 
 import voluptuous as vol
 
@@ -34,8 +39,14 @@ import homeassistant.helpers.config_validation as cv
 from homeassistant.components.sensor import PLATFORM_SCHEMA
 from homeassistant.const import (CONF_IP_ADDRESS, CONF_MAC, CONF_TIMEOUT, STATE_UNKNOWN, STATE_OPEN, STATE_CLOSED,
     EVENT_HOMEASSISTANT_STOP, STATE_ALARM_DISARMED, STATE_ALARM_ARMED_HOME, STATE_ALARM_ARMED_AWAY)
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.util.dt import now
 
+from custom_components.sensor.broadlink_s1c_util import (DEFAULT_WATCH_INTERVAL, DEFAULT_FAST_WATCH_INTERVAL, DEFAULT_QUIET_WATCH_INTERVAL,
+    DEFAULT_POLL_WORKERS, METRICS_REFRESH_INTERVAL, S1CWatchCadence, S1CSensorsWatcher, S1CHubsPoller, S1CSensorHistory, S1CHubSession,
+    S1CBackoff, S1CSensorsDispatcher)
+
 """current broadlink moudle in ha is of version 0.5 which doesn't supports s1c hubs, usuing version 0.6 from github"""
 # REQUIREMENTS = ['https://github.com/mjg59/python-broadlink/archive/master.zip#broadlink==0.6']
 """one of the broadlink 0.6 requirements is the pycrypto library which is blocked ever since HA 0.64.0, my forked repository of python-broadlink is working with its replacement pycryptodome"""
@@ -50,6 +61,21 @@ DOMAIN = 'sensor'
 ENTITY_ID_FORMAT = DOMAIN + '.broadlink_s1c_{}'
 DEFAULT_TIMEOUT = 10
 
+"""watch cadence configuration keys"""
+CONF_WATCH_INTERVAL = "watch_interval"
+CONF_FAST_WATCH_INTERVAL = "fast_watch_interval"
+CONF_QUIET_WATCH_INTERVAL = "quiet_watch_interval"
+CONF_FIRE_EVENTS = "fire_events"
+CONF_POLL_WORKERS = "poll_workers"
+
+"""sensor filters configuration keys"""
+CONF_FILTERS = "filters"
+CONF_MIN_HOLD = "min_hold"
+CONF_RELEASE_DELAY = "release_delay"
+
+"""the hubs poller shared by all the platform entries"""
+DATA_POLLER = "broadlink_s1c_poller"
+
 """additional states that doesn't exists in homeassistant.const"""
 STATE_NO_MOTION = "no_motion"
 STATE_MOTION_DETECTED = "motion_detected"
@@ -70,11 +96,65 @@ SENSOR_TYPE_KEY_FOB = "Key Fob"
 SENSOR_TYPE_KEY_FOB_ICON = "mdi:remote"
 SENSOR_DEFAULT_ICON = "mdi:security-home"
 
+"""sensor states by sensor type and raw status"""
+SENSOR_STATES = {
+    (SENSOR_TYPE_DOOR_SENSOR, "0"): STATE_CLOSED,
+    (SENSOR_TYPE_DOOR_SENSOR, "128"): STATE_CLOSED,
+    (SENSOR_TYPE_DOOR_SENSOR, "16"): STATE_OPEN,
+    (SENSOR_TYPE_DOOR_SENSOR, "144"): STATE_OPEN,
+    (SENSOR_TYPE_DOOR_SENSOR, "48"): STATE_TAMPERED,
+    (SENSOR_TYPE_MOTION_SENSOR, "0"): STATE_NO_MOTION,
+    (SENSOR_TYPE_MOTION_SENSOR, "128"): STATE_NO_MOTION,
+    (SENSOR_TYPE_MOTION_SENSOR, "16"): STATE_MOTION_DETECTED,
+    (SENSOR_TYPE_MOTION_SENSOR, "32"): STATE_TAMPERED,
+    (SENSOR_TYPE_KEY_FOB, "16"): STATE_ALARM_DISARMED,
+    (SENSOR_TYPE_KEY_FOB, "32"): STATE_ALARM_ARMED_AWAY,
+    (SENSOR_TYPE_KEY_FOB, "64"): STATE_ALARM_ARMED_HOME,
+    (SENSOR_TYPE_KEY_FOB, "0"): STATE_ALARM_SOS,
+    (SENSOR_TYPE_KEY_FOB, "128"): STATE_ALARM_SOS
+}
+
+"""the states counted as activations in the sensors history, all the transitions are counted for other types"""
+SENSOR_ACTIVE_STATES = {
+    SENSOR_TYPE_DOOR_SENSOR: (STATE_OPEN,),
+    SENSOR_TYPE_MOTION_SENSOR: (STATE_MOTION_DETECTED,)
+}
+
+"""sensor types by filters configuration key and the states released after the release delay"""
+FILTER_SENSOR_TYPES = {
+    "door_sensor": SENSOR_TYPE_DOOR_SENSOR,
+    "motion_sensor": SENSOR_TYPE_MOTION_SENSOR,
+    "key_fob": SENSOR_TYPE_KEY_FOB
+}
+SENSOR_RELEASE_STATES = {
+    SENSOR_TYPE_DOOR_SENSOR: (STATE_CLOSED,),
+    SENSOR_TYPE_MOTION_SENSOR: (STATE_NO_MOTION,)
+}
+
+"""sensor history attributes"""
+ATTR_EVENTS_LAST_HOUR = "events_last_hour"
+ATTR_OPEN_DURATION = "open_duration"
+ATTR_SECONDS_SINCE_MOTION = "seconds_since_motion"
+ATTR_SUPPRESSED_EVENTS = "suppressed_events"
+ATTR_WATCH_LOOP_RATE = "watch_loop_rate"
+
+"""sensor filter configuration schema"""
+FILTER_SCHEMA = vol.Schema({
+    vol.Optional(CONF_MIN_HOLD, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_RELEASE_DELAY, default=0): vol.All(vol.Coerce(float), vol.Range(min=0))
+})
+
 """platform configuration schema"""
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Required(CONF_IP_ADDRESS): cv.string,
     vol.Required(CONF_MAC): cv.string,
-    vol.Optional(CONF_TIMEOUT, default=DEFAULT_TIMEOUT): cv.positive_int
+    vol.Optional(CONF_TIMEOUT, default=DEFAULT_TIMEOUT): cv.positive_int,
+    vol.Optional(CONF_WATCH_INTERVAL, default=DEFAULT_WATCH_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_FAST_WATCH_INTERVAL, default=DEFAULT_FAST_WATCH_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_QUIET_WATCH_INTERVAL, default=DEFAULT_QUIET_WATCH_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_FIRE_EVENTS, default=True): cv.boolean,
+    vol.Optional(CONF_POLL_WORKERS, default=DEFAULT_POLL_WORKERS): cv.positive_int,
+    vol.Optional(CONF_FILTERS, default={}): vol.Schema({vol.Optional(key): FILTER_SCHEMA for key in FILTER_SENSOR_TYPES})
 })
 
 """set up broadlink s1c platform"""
@@ -88,20 +168,79 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
     mac = config.get(CONF_MAC).encode().replace(b':', b'')
     mac_addr = binascii.unhexlify(mac)
     timeout = config.get(CONF_TIMEOUT)
+    cadence = S1CWatchCadence(config.get(CONF_WATCH_INTERVAL), config.get(CONF_FAST_WATCH_INTERVAL), config.get(CONF_QUIET_WATCH_INTERVAL))
+    filters = {}
+    for key, filter_config in config.get(CONF_FILTERS).items():
+        sensor_type = FILTER_SENSOR_TYPES[key]
+        filters[sensor_type] = {
+            "min_hold": filter_config.get(CONF_MIN_HOLD),
+            "release_states": SENSOR_RELEASE_STATES.get(sensor_type, ()),
+            "release_delay": filter_config.get(CONF_RELEASE_DELAY)
+        }
+
+    stopping = []
 
-    """initiate connection to s1c hub"""
-    conn_obj = HubConnection(ip_address, mac_addr, timeout)
+    @callback
+    def async_stop_connecting(event):
+        """stop retrying the connection when home assistant stops"""
+        stopping.append(event)
 
-    """discovering the sensors and initiating entities"""
-    raw_data = conn_obj.get_initial_data()
-    sensors = []
-    for i, sensor in enumerate(raw_data["sensors"]):
-        sensors.append(S1C_SENSOR(hass, sensor["name"], sensor["type"], conn_obj.parse_status(sensor["type"], str(sensor["status"])), now()))
-    if sensors:
-        async_add_devices(sensors, True)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_connecting)
 
-    """starting the sensors status change watcher"""
-    WatchSensors(hass, conn_obj).start()
+    """all the hubs are polled by one poller with a fixed number of threads"""
+    if not DATA_POLLER in hass.data:
+        hass.data[DATA_POLLER] = S1CHubsPoller(config.get(CONF_POLL_WORKERS))
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, hass.data[DATA_POLLER].stop)
+    poller = hass.data[DATA_POLLER]
+
+    @asyncio.coroutine
+    def async_connect_hub():
+        """connect the s1c hub in the executor, retrying with backoff until the hub answers"""
+        start = time.monotonic()
+        backoff = S1CBackoff()
+        while not stopping:
+            """initiate connection to s1c hub"""
+            try:
+                conn_obj = yield from hass.async_add_job(HubConnection, ip_address, mac_addr, timeout)
+                if conn_obj._authorized and not conn_obj.get_initial_data() is None:
+                    break
+            except Exception:
+                _LOGGER.warning("exception while connecting s1c hub: " + traceback.format_exc())
+            delay = backoff.next_delay()
+            _LOGGER.warning("s1c hub at " + ip_address + " is not answering, retrying in " + str(delay) + " seconds")
+            yield from asyncio.sleep(delay, loop=hass.loop)
+        else:
+            return
+
+        """discovering the sensors and initiating entities"""
+        raw_data = conn_obj.get_initial_data()
+        sensors = []
+        for i, sensor in enumerate(raw_data["sensors"]):
+            sensors.append(S1C_SENSOR(hass, sensor["name"], sensor["type"], conn_obj.parse_status(sensor["type"], str(sensor["status"])), now()))
+        if sensors:
+            async_add_devices(sensors, True)
+        _LOGGER.info("s1c hub at " + ip_address + " connected with " + str(len(sensors)) + " sensors in " + str(round(time.monotonic() - start, 3))
+                     + " seconds after " + str(backoff.retries) + " retries")
+
+        """index the entities by sensor name for delivering the changes directly to the owning entity"""
+        sensors_by_name = {sensor.name: sensor for sensor in sensors}
+
+        """starting the sensors status change watcher"""
+        watcher = WatchSensors(hass, conn_obj, sensors_by_name, cadence, config.get(CONF_FIRE_EVENTS), filters)
+        for sensor in sensors:
+            sensor.set_watcher(watcher)
+        poller.add_watcher(watcher)
+
+        @callback
+        def async_refresh_metrics(now):
+            """the history metrics change with time, refresh the sensors whose metrics are changing"""
+            for sensor in sensors:
+                sensor.async_refresh_metrics()
+
+        async_track_time_interval(hass, async_refresh_metrics, datetime.timedelta(seconds=METRICS_REFRESH_INTERVAL))
+
+    """connecting the hub in the background, the sensors are added once the hub answers"""
+    hass.async_add_job(async_connect_hub())
 
     return True
 
@@ -116,8 +255,10 @@ class S1C_SENSOR(Entity):
         self._sensor_type = sensor_type
         self._state = status
         self._last_changed = last_changed
-        """registering entity for event listenting"""
-        hass.bus.async_listen(UPDATE_EVENT, self.async_event_listener)
+        self._history = S1CSensorHistory(SENSOR_ACTIVE_STATES.get(sensor_type))
+        self._history.reset(status)
+        self._suppressed_events = 0
+        self._watcher = None
         _LOGGER.debug(self._name + " initiated")
 
     @property
@@ -151,19 +292,44 @@ class S1C_SENSOR(Entity):
     @property
     def device_state_attributes(self):
         """sensor state attributes"""
-        return {
+        attributes = {
             "sensor_type": self._sensor_type,
-            "last_changed": self._last_changed
+            "last_changed": self._last_changed,
+            ATTR_EVENTS_LAST_HOUR: self._history.activations_last_hour(),
+            ATTR_SUPPRESSED_EVENTS: self._suppressed_events,
+            ATTR_WATCH_LOOP_RATE: None if self._watcher is None or self._watcher.loop_rate is None else round(self._watcher.loop_rate, 2)
         }
+        if self._sensor_type == SENSOR_TYPE_DOOR_SENSOR:
+            attributes[ATTR_OPEN_DURATION] = int(self._history.active_duration())
+        elif self._sensor_type == SENSOR_TYPE_MOTION_SENSOR:
+            seconds_since_motion = self._history.seconds_since_activation()
+            attributes[ATTR_SECONDS_SINCE_MOTION] = None if seconds_since_motion is None else int(seconds_since_motion)
+        return attributes
+
+    def set_watcher(self, watcher):
+        """set the sensors watcher of the sensor's hub"""
+        self._watcher = watcher
+
+    @callback
+    def async_update_state(self, status, last_changed):
+        """handling state changes delivered by the watcher and update ha state"""
+        _LOGGER.debug(self._name + " received state " + status)
+        self._state = status
+        self._last_changed = last_changed
+        self._history.record(status)
+        self.async_schedule_update_ha_state()
 
-    @asyncio.coroutine
-    def async_event_listener(self, event):
-        """handling incoming events and update ha state"""
-        if (event.data.get(EVENT_PROPERTY_NAME) == self._name):
-            _LOGGER.debug(self._name + " received " + UPDATE_EVENT)
-            self._state = event.data.get(EVENT_PROPERTY_STATE)
-            self._last_changed = event.time_fired
-            yield from self.async_update_ha_state()
+    @callback
+    def async_refresh_metrics(self):
+        """update ha state while the time based attributes are changing without a transition"""
+        if self._history.refresh_due(self._sensor_type == SENSOR_TYPE_MOTION_SENSOR):
+            self.async_schedule_update_ha_state()
+
+    @callback
+    def async_update_suppressed(self, suppressed_events):
+        """handling the suppressed changes count pushed by the watcher and update ha state"""
+        self._suppressed_events = suppressed_events
+        self.async_schedule_update_ha_state()
 
 
 class HubConnection(object):
@@ -174,11 +340,12 @@ class HubConnection(object):
         self._hub = broadlink.S1C((ip_addr, 80), mac_addr, None)
         self._hub.timeout = timeout
         self._authorized = self.authorize()
+        self._session = S1CHubSession(self._hub, self.authorize)
         if (self._authorized):
             _LOGGER.info("succesfully connected to s1c hub")
             self._initial_data = self._hub.get_sensors_status()
         else:
-            _LOGGER.error("failed to connect s1c hub, not authorized. please fix the problem and restart the system")
+            _LOGGER.error("failed to connect s1c hub, not authorized")
             self._initial_data = None
 
     def authorize(self, retry=3):
@@ -196,80 +363,31 @@ class HubConnection(object):
         return self._initial_data
 
     def get_hub_connection(self):
-        """return the connection object"""
-        return self._hub
+        """return the connection object, authorizing the hub again when the session goes down"""
+        return self._session
 
     def parse_status(self, sensor_type, sensor_status):
         """parse sensors status"""
-        if sensor_type == SENSOR_TYPE_DOOR_SENSOR and sensor_status in ("0", "128"):
-            return STATE_CLOSED
-        elif sensor_type == SENSOR_TYPE_DOOR_SENSOR and sensor_status in ("16", "144"):
-            return STATE_OPEN
-        elif sensor_type == SENSOR_TYPE_DOOR_SENSOR and sensor_status == "48":
-            return STATE_TAMPERED
-        elif sensor_type == SENSOR_TYPE_MOTION_SENSOR and sensor_status in ("0", "128"):
-            return STATE_NO_MOTION
-        elif sensor_type == SENSOR_TYPE_MOTION_SENSOR and sensor_status == "16":
-            return STATE_MOTION_DETECTED
-        elif sensor_type == SENSOR_TYPE_MOTION_SENSOR and sensor_status == "32":
-            return STATE_TAMPERED
-        elif sensor_type == SENSOR_TYPE_KEY_FOB and sensor_status == "16":
-            return STATE_ALARM_DISARMED
-        elif sensor_type == SENSOR_TYPE_KEY_FOB and sensor_status == "32":
-            return STATE_ALARM_ARMED_AWAY
-        elif sensor_type == SENSOR_TYPE_KEY_FOB and sensor_status == "64":
-            return STATE_ALARM_ARMED_HOME
-        elif sensor_type == SENSOR_TYPE_KEY_FOB and sensor_status in ("0", "128"):
-            return STATE_ALARM_SOS
-        else:
+        state = SENSOR_STATES.get((sensor_type, sensor_status))
+        if state is None:
             _LOGGER.debug("unknow status " + sensor_status + "for type " + sensor_type)
             return STATE_UNKNOWN
+        return state
 
 
-class WatchSensors(threading.Thread):
+
+class WatchSensors(S1CSensorsWatcher):
     """sensor status change watcher class"""
-    def __init__(self, hass, conn_obj):
-        
-        threading.Thread.__init__(self)
-        
-        """initialize the watcher"""
+    def __init__(self, hass, conn_obj, sensors_by_name, cadence=None, fire_events=True, filters=None):
+        """initialize the watcher, the changes are dispatched directly to the owning entities"""
         self._hass = hass
-        self._ok_to_run = False
+        self._dispatcher = S1CSensorsDispatcher(sensors_by_name, self.deliver_state, self.fire_event if fire_events else None, self.deliver_suppressed)
+        S1CSensorsWatcher.__init__(self, conn_obj.get_hub_connection(), conn_obj.parse_status, cadence, conn_obj.get_initial_data(), filters,
+                                   self._dispatcher.state_changed, self._dispatcher.suppressed_changed)
         self._conn_obj = conn_obj
         self._last_exception_dt = None
         self._exception_count = 0
-        if (self._conn_obj._authorized):
-            self._ok_to_run = True
-            self._hub = self._conn_obj.get_hub_connection()
-
-    def run(self):
-        """register stop function for event listening"""
-        self._hass.bus.listen_once(EVENT_HOMEASSISTANT_STOP, self.stop)
-        
-        """get initial sensors data"""
-        if not (self._conn_obj.get_initial_data() is None):
-            old_status = self._conn_obj.get_initial_data()
-        else:
-            old_status = self._hub.get_sensors_status()
-        
-        """start watcher loop"""
-        _LOGGER.info("starting sensors watch")
-        while self._ok_to_run:
-            try:
-                current_status = self._hub.get_sensors_status()
-                for i, sensor in enumerate(current_status["sensors"]):
-                    current_fixed_status = self._conn_obj.parse_status(sensor["type"], str(sensor["status"]))
-                    previous_fixed_status = self._conn_obj.parse_status(old_status["sensors"][i]["type"], str(old_status["sensors"][i]["status"]))
-                    if not (current_fixed_status == previous_fixed_status):
-                        _LOGGER.debug("status change tracked from: " + json.dumps(old_status["sensors"][i]))
-                        _LOGGER.debug("status change tracked to: " + json.dumps(sensor))
-                        self.launch_state_change_event(sensor["name"], current_fixed_status)
-                        old_status = current_status
-            except:
-                _LOGGER.warning("exception while getting sensors status: " + traceback.format_exc())
-                self.check_loop_run()
-                continue
-        _LOGGER.info("sensors watch done")
+        self._ok_to_run = self._conn_obj._authorized
 
     def check_loop_run(self):
         """max exceptions allowed in loop before exiting"""
@@ -293,18 +411,26 @@ class WatchSensors(threading.Thread):
 
         if not (max_exceptions_before_stop > self._exception_count):
             _LOGGER.error("max exceptions allowed in watch loop exceeded, stoping watch loop")
-            self._ok_to_run = False
+            self.stop()
 
         self._last_exception_dt = current_dt
 
-    def stop(self, event):
+    def stop(self, event=None):
         """handle stop request for events"""
-        _LOGGER.debug("received :" + event.event_type)
-        self._ok_to_run = False
+        if not event is None:
+            _LOGGER.debug("received :" + event.event_type)
+        S1CSensorsWatcher.stop(self)
+
+    def deliver_state(self, sensor, status):
+        """hand a state change to the owning entity in the event loop"""
+        self._hass.add_job(sensor.async_update_state, status, now())
+
+    def deliver_suppressed(self, sensor, count):
+        """hand a suppressed changes count to the owning entity in the event loop"""
+        self._hass.add_job(sensor.async_update_suppressed, count)
 
-    def launch_state_change_event(self, name, status):
-        """launch events for state changes"""
-        _LOGGER.debug("launching event for " + name + "for state changed to " + status)
+    def fire_event(self, name, status):
+        """launch events for automations"""
         self._hass.bus.fire(UPDATE_EVENT,
             {
                 EVENT_PROPERTY_NAME: name,
@@ -0,0 +1,202 @@
+"""
+Fake S1C hub and detection latency benchmark for the broadlink_s1c sensors watch, Home Assistant free.
+
+The fake hub stands in for broadlink.S1C, emulating door, motion and key fob sensors whose raw statuses are flipped
+on a scripted or random timeline, with a tunable response latency and error rate. The benchmark drives the sensors
+watch through the hubs poller and reports the latency from a status flip to the state change event, the process cpu
+seconds per second and the hub requests per second.
+
+usage, from the custom_components/sensor directory:
+    python broadlink_s1c_bench.py --doors 6 --motions 6 --fobs 4 --duration 30 --changes-per-second 2
+    python broadlink_s1c_bench.py --interval 0 --fast-interval 0 --quiet-interval 0  # back to back, as a baseline
+"""
+import argparse
+import random
+import socket
+import threading
+import time
+
+from broadlink_s1c_util import (DEFAULT_WATCH_INTERVAL, DEFAULT_FAST_WATCH_INTERVAL, DEFAULT_QUIET_WATCH_INTERVAL, DEFAULT_POLL_WORKERS,
+    S1CWatchCadence, S1CSensorsWatcher, S1CHubsPoller)
+
+"""###############################
+######## Fake Sensors ############
+###############################"""
+SENSOR_TYPE_DOOR_SENSOR = "Door Sensor"
+SENSOR_TYPE_MOTION_SENSOR = "Motion Sensor"
+SENSOR_TYPE_KEY_FOB = "Key Fob"
+
+"""the raw statuses each sensor type cycles through"""
+SENSOR_STATUS_CYCLES = {
+    SENSOR_TYPE_DOOR_SENSOR: (0, 16),
+    SENSOR_TYPE_MOTION_SENSOR: (0, 16),
+    SENSOR_TYPE_KEY_FOB: (16, 32, 64)
+}
+
+"""###########################
+########## Fake Hub ##########
+###########################"""
+class FakeS1CHub(object):
+    """stand-in for broadlink.S1C with emulated sensors"""
+    def __init__(self, doors=4, motions=4, fobs=2, latency=0.0, error_rate=0.0, seed=None):
+        """initialize the hub, error_rate is the part of the requests failing with a socket timeout"""
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.sensors = []
+        for sensor_type, count in ((SENSOR_TYPE_DOOR_SENSOR, doors), (SENSOR_TYPE_MOTION_SENSOR, motions), (SENSOR_TYPE_KEY_FOB, fobs)):
+            for number in range(count):
+                self.sensors.append({"name": sensor_type + " " + str(number + 1), "type": sensor_type, "status": SENSOR_STATUS_CYCLES[sensor_type][0]})
+        self.flipped_at = [None] * len(self.sensors)
+        self.requests = 0
+        self.errors = 0
+        self.flips = 0
+
+    def auth(self):
+        """authorize the hub"""
+        return True
+
+    def get_sensors_status(self):
+        """blocking, return the sensors status after the latency, raise socket.timeout at the error rate"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                raise socket.timeout("timed out")
+            return {"sensors": [dict(sensor) for sensor in self.sensors]}
+
+    def next_status(self, index):
+        """return the status following the sensor's current status in its cycle"""
+        sensor = self.sensors[index]
+        cycle = SENSOR_STATUS_CYCLES[sensor["type"]]
+        return cycle[(cycle.index(sensor["status"]) + 1) % len(cycle)]
+
+    def flip(self, index, status=None):
+        """set the raw status of a sensor, the next status in its cycle by default"""
+        with self._lock:
+            self.sensors[index]["status"] = self.next_status(index) if status is None else status
+            self.flipped_at[index] = time.monotonic()
+            self.flips += 1
+
+    def play(self, timeline, stop_event=None):
+        """blocking, flip the sensors on a timeline of (seconds from start, sensor index, status or None)"""
+        start = time.monotonic()
+        for at, index, status in timeline:
+            delay = start + at - time.monotonic()
+            if delay > 0 and not stop_event is None and stop_event.wait(delay):
+                return
+            elif delay > 0 and stop_event is None:
+                time.sleep(delay)
+            self.flip(index, status)
+
+
+def random_timeline(sensors_count, duration, changes_per_second, seed=None):
+    """return a timeline of random flips, a sensor isn't flipped again within a second so every flip is detectable"""
+    generator = random.Random(seed)
+    timeline = []
+    last_flips = {}
+    at = 0.0
+    while True:
+        at += generator.expovariate(changes_per_second)
+        if at >= duration:
+            return timeline
+        index = generator.randrange(sensors_count)
+        if at - last_flips.get(index, -1.0) < 1.0:
+            continue
+        last_flips[index] = at
+        timeline.append((at, index, None))
+
+"""###########################
+######### Benchmark ##########
+###########################"""
+class BenchWatcher(S1CSensorsWatcher):
+    """sensors watcher recording the latency from the hub's status flip to the state change event"""
+    def __init__(self, hub, cadence):
+        """initialize the watcher, the raw statuses are used as the states"""
+        S1CSensorsWatcher.__init__(self, hub, lambda sensor_type, sensor_status: sensor_status, cadence, hub.get_sensors_status())
+        self._indexes = {sensor["name"]: index for index, sensor in enumerate(hub.sensors)}
+        self.latencies = []
+
+    def launch_state_change_event(self, name, status):
+        """record the detection latency"""
+        flipped_at = self._hub.flipped_at[self._indexes[name]]
+        if not flipped_at is None:
+            self.latencies.append(time.monotonic() - flipped_at)
+
+
+def percentile(values, percent):
+    """return the nearest rank percentile of the values or None"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(percent / 100.0 * len(values))) - 1))]
+
+
+def run_benchmark(hub, cadence, timeline, duration, workers=DEFAULT_POLL_WORKERS):
+    """drive the sensors watch of the hub while playing the timeline, return the benchmark results"""
+    watcher = BenchWatcher(hub, cadence)
+    poller = S1CHubsPoller(workers)
+    stop_event = threading.Event()
+    player = threading.Thread(target=hub.play, args=(timeline, stop_event), daemon=True)
+    requests = hub.requests
+
+    start = time.monotonic()
+    cpu_start = time.process_time()
+    poller.add_watcher(watcher)
+    player.start()
+    stop_event.wait(duration)
+    stop_event.set()
+    """leave the watch a quiet interval for detecting the last flips"""
+    time.sleep(min(1.0, duration))
+    poller.stop()
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpu_start
+
+    latencies = watcher.latencies
+    return {
+        "flips": hub.flips,
+        "detected": len(latencies),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies) if latencies else None,
+        "cpu_per_second": cpu / elapsed,
+        "requests_per_second": (hub.requests - requests) / elapsed,
+        "errors": hub.errors,
+        "loops": watcher.loops
+    }
+
+
+def main():
+    """run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description="benchmark the broadlink s1c sensors watch against a fake hub")
+    parser.add_argument("--doors", type=int, default=4, help="number of door sensors")
+    parser.add_argument("--motions", type=int, default=4, help="number of motion sensors")
+    parser.add_argument("--fobs", type=int, default=2, help="number of key fobs")
+    parser.add_argument("--latency", type=float, default=0.02, help="hub response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part of the hub requests timing out")
+    parser.add_argument("--duration", type=float, default=20.0, help="benchmark seconds")
+    parser.add_argument("--changes-per-second", type=float, default=1.0, help="average sensor flips per second")
+    parser.add_argument("--interval", type=float, default=DEFAULT_WATCH_INTERVAL, help="target watch interval")
+    parser.add_argument("--fast-interval", type=float, default=DEFAULT_FAST_WATCH_INTERVAL, help="watch interval after changes")
+    parser.add_argument("--quiet-interval", type=float, default=DEFAULT_QUIET_WATCH_INTERVAL, help="watch interval while quiet")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the timeline and the errors")
+    args = parser.parse_args()
+
+    hub = FakeS1CHub(args.doors, args.motions, args.fobs, args.latency, args.error_rate, args.seed)
+    timeline = random_timeline(len(hub.sensors), args.duration, args.changes_per_second, args.seed)
+    cadence = S1CWatchCadence(args.interval, args.fast_interval, args.quiet_interval)
+    results = run_benchmark(hub, cadence, timeline, args.duration)
+
+    print("%-20s %d of %d flips" % ("detected", results["detected"], results["flips"]))
+    for key in ("latency_p50", "latency_p90", "latency_p99", "latency_max"):
+        print("%-20s %s" % (key, "-" if results[key] is None else "%.1f ms" % (results[key] * 1000)))
+    print("%-20s %.3f" % ("cpu_per_second", results["cpu_per_second"]))
+    print("%-20s %.1f (%d errors)" % ("requests_per_second", results["requests_per_second"], results["errors"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,665 @@
+"""
+Home Assistant free tools for the broadlink_s1c platform.
+
+The sensors watcher polls the hub's sensors status on an adaptive cadence instead of back to back, polling fast
+for a few loops after a change and backing off towards the quiet interval while nothing changes. The time spent
+waiting for the hub is deducted from the sleep, so the loop keeps its target cadence regardless of the hub latency.
+
+A watched hub is any object providing:
+- get_sensors_status(): blocking, returns a dict with a "sensors" list of dicts with "name", "type" and "status".
+
+The hubs poller runs the watch loops of all the hubs on one scheduler thread handing the due loops to a bounded pool
+of workers, a hub is not scheduled again before its current loop is done so a slow hub holds a single worker and the
+number of threads doesn't grow with the number of hubs.
+
+The hub session counts the consecutive failures of the hub, after a few failures the hub is authorized again in place,
+retrying with backoff, and the watch resumes once the hub answers. While waiting for the next authorization the
+session fails fast with S1CSessionError without dialing the hub, the watcher doesn't count these as loop exceptions.
+
+The backoff doubles the delay between retries of a failing hub connection up to a maximum.
+
+The sensor history keeps the last transitions of a sensor in fixed size arrays and counts the activations of the
+last hour in per minute buckets, so its memory is fixed regardless of the uptime and its metrics are O(1). The metrics
+change with time without a transition, the sensors are refreshed every METRICS_REFRESH_INTERVAL while they do.
+
+The sensors diff keeps the last raw type and status of every sensor index and compares the raw codes, only the
+sensors whose raw status changed are decoded.
+
+The sensor filter debounces the decoded changes before their events. A change arriving after the minimum hold time
+of the last event passes at once, changes within the hold time are held and only the last one is launched when the
+hold time ends. Changes to a release state (e.g. no motion) must persist for the release delay before being launched,
+so a sensor flapping back within the delay never leaves its active state. The first change of a sensor is never
+delayed. Held changes that are replaced or undone are counted as suppressed, the counts are pushed as they change.
+
+The sensors dispatcher hands the launched changes straight to the owning entities by sensor name, without a round
+trip through the event bus, the change events for automations are fired only when enabled.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+import traceback
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+_LOGGER = logging.getLogger(__name__)
+
+"""###############################
+######## Default Values ##########
+###############################"""
+DEFAULT_WATCH_INTERVAL = 0.5
+DEFAULT_FAST_WATCH_INTERVAL = 0.1
+DEFAULT_QUIET_WATCH_INTERVAL = 1.0
+FAST_LOOPS_AFTER_CHANGE = 20
+QUIET_BACKOFF = 1.1
+LOOP_RATE_WINDOW = 60
+DEFAULT_POLL_WORKERS = 3
+DEFAULT_HISTORY_SIZE = 128
+HISTORY_WINDOW_MINUTES = 60
+METRICS_REFRESH_INTERVAL = 30
+DEFAULT_SESSION_FAILURES = 3
+DEFAULT_REAUTH_DELAY = 2
+DEFAULT_MAX_REAUTH_DELAY = 60
+DEFAULT_RETRY_DELAY = 10
+DEFAULT_MAX_RETRY_DELAY = 300
+
+"""###########################
+######## Watch Cadence #######
+###########################"""
+class S1CWatchCadence(object):
+    """the watch loop sleep policy: fast after changes, target interval and slow backoff while quiet"""
+    def __init__(self, interval=DEFAULT_WATCH_INTERVAL, fast_interval=DEFAULT_FAST_WATCH_INTERVAL, quiet_interval=DEFAULT_QUIET_WATCH_INTERVAL,
+                 fast_loops=FAST_LOOPS_AFTER_CHANGE, rate_window=LOOP_RATE_WINDOW):
+        """initialize the cadence"""
+        self._target_interval = interval
+        self._fast_interval = min(fast_interval, interval)
+        self._quiet_interval = max(quiet_interval, interval)
+        self._fast_loops = fast_loops
+        self._fast_loops_left = 0
+        self._interval = interval
+        self._rate_window = rate_window
+        self._window_start = None
+        self._window_loops = 0
+        self._loop_rate = None
+
+    @property
+    def interval(self):
+        """return the current loop interval in seconds"""
+        return self._interval
+
+    @property
+    def loop_rate(self):
+        """return the loops per second measured over the last rate window, None before the first window ends"""
+        return self._loop_rate
+
+    def loop_done(self, changed, elapsed, now=None):
+        """set the next interval after a loop that took elapsed seconds, return the seconds to sleep"""
+        if changed:
+            self._fast_loops_left = self._fast_loops
+            self._interval = self._fast_interval
+        elif self._fast_loops_left > 0:
+            self._fast_loops_left -= 1
+            self._interval = self._fast_interval
+        elif self._interval < self._target_interval:
+            self._interval = self._target_interval
+        else:
+            self._interval = min(self._interval * QUIET_BACKOFF, self._quiet_interval)
+
+        self._measure(time.monotonic() if now is None else now)
+        return max(0.0, self._interval - elapsed)
+
+    def _measure(self, now):
+        """count the loop in the current rate window"""
+        if self._window_start is None:
+            self._window_start = now
+            return
+        self._window_loops += 1
+        if now - self._window_start >= self._rate_window:
+            self._loop_rate = self._window_loops / (now - self._window_start)
+            _LOGGER.debug('sensors watch loop rate is ' + str(round(self._loop_rate, 2)) + ' loops per second')
+            self._window_start = now
+            self._window_loops = 0
+
+"""###########################
+########## Backoff ###########
+###########################"""
+class S1CBackoff(object):
+    """exponential delay between retries"""
+    def __init__(self, delay=DEFAULT_RETRY_DELAY, max_delay=DEFAULT_MAX_RETRY_DELAY):
+        """initialize the backoff"""
+        self._initial_delay = delay
+        self._max_delay = max(max_delay, delay)
+        self._delay = delay
+        self._retries = 0
+
+    @property
+    def retries(self):
+        """return the number of retries since the last reset"""
+        return self._retries
+
+    def next_delay(self):
+        """return the seconds to wait before the next retry and double the delay"""
+        delay = self._delay
+        self._delay = min(self._delay * 2, self._max_delay)
+        self._retries += 1
+        return delay
+
+    def reset(self):
+        """start over from the initial delay after a success"""
+        self._delay = self._initial_delay
+        self._retries = 0
+
+"""###########################
+######## Hub Session #########
+###########################"""
+class S1CSessionError(Exception):
+    """the hub session is down and waiting to be authorized again"""
+    pass
+
+
+class S1CHubSession(object):
+    """health tracking of a hub session, authorizing the hub again after consecutive failures"""
+    def __init__(self, hub, authorize=None, failures=DEFAULT_SESSION_FAILURES, backoff=None):
+        """initialize the session of an authorized hub, authorize() returns true if the hub authorized, hub.auth by default"""
+        self._hub = hub
+        self._authorize = hub.auth if authorize is None else authorize
+        self._failure_threshold = failures
+        self._backoff = S1CBackoff(DEFAULT_REAUTH_DELAY, DEFAULT_MAX_REAUTH_DELAY) if backoff is None else backoff
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._healthy = True
+        self._next_auth = None
+        self._reauths = 0
+
+    @property
+    def healthy(self):
+        """return false while the session is down"""
+        return self._healthy
+
+    @property
+    def reauths(self):
+        """return the number of successful authorizations after the session went down"""
+        return self._reauths
+
+    def get_sensors_status(self):
+        """blocking, return the hub's sensors status, authorizing the hub first if the session is down"""
+        with self._lock:
+            if not self._healthy:
+                self._reauthorize()
+            try:
+                status = self._hub.get_sensors_status()
+                if not isinstance(status, dict) or not "sensors" in status:
+                    raise S1CSessionError("unexpected sensors status " + str(status))
+            except Exception:
+                self._failures += 1
+                if self._failures >= self._failure_threshold:
+                    _LOGGER.warning("hub session is down after " + str(self._failures) + " consecutive failures")
+                    self._healthy = False
+                    self._next_auth = time.monotonic()
+                raise
+            self._failures = 0
+            return status
+
+    def _reauthorize(self):
+        """authorize the hub if the backoff has passed, raise S1CSessionError if the session is still down"""
+        now = time.monotonic()
+        if now < self._next_auth:
+            raise S1CSessionError("hub session is down, authorizing again in " + str(round(self._next_auth - now, 1)) + " seconds")
+        try:
+            authorized = self._authorize()
+        except Exception:
+            _LOGGER.debug("exception while authorizing hub: " + traceback.format_exc())
+            authorized = False
+        if not authorized:
+            self._next_auth = time.monotonic() + self._backoff.next_delay()
+            raise S1CSessionError("failed to authorize hub, " + str(self._backoff.retries) + " attempts")
+        _LOGGER.info("hub authorized again after " + str(self._backoff.retries + 1) + " attempts, resuming")
+        self._backoff.reset()
+        self._healthy = True
+        self._failures = 0
+        self._reauths += 1
+
+"""###########################
+####### Sensor History #######
+###########################"""
+class S1CSensorHistory(object):
+    """bounded transition log of a sensor with the rolling activity metrics"""
+    def __init__(self, active_states=None, size=DEFAULT_HISTORY_SIZE):
+        """initialize the history, transitions into active_states are counted as activations, all transitions if None"""
+        self._active_states = None if active_states is None else frozenset(active_states)
+        self._size = size
+        self._times = array('d', [0.0] * size)
+        self._codes = array('B', [0] * size)
+        self._states = []
+        self._transitions = 0
+        self._state = None
+        self._changed_at = None
+        self._last_activation = None
+        self._buckets = array('L', [0] * HISTORY_WINDOW_MINUTES)
+        self._minute = 0
+        self._activations_last_hour = 0
+        self._changing = False
+
+    @property
+    def transitions(self):
+        """return the number of transitions recorded since startup"""
+        return self._transitions
+
+    @property
+    def last_activation(self):
+        """return the timestamp of the last activation or None"""
+        return self._last_activation
+
+    def reset(self, state, now=None):
+        """set the current state without recording a transition"""
+        self._state = state
+        self._changed_at = time.time() if now is None else now
+
+    def record(self, state, now=None):
+        """record a transition to state"""
+        now = time.time() if now is None else now
+        index = self._transitions % self._size
+        self._times[index] = now
+        self._codes[index] = self._code(state)
+        self._transitions += 1
+        self._state = state
+        self._changed_at = now
+        if self._active_states is None or state in self._active_states:
+            self._last_activation = now
+            minute = self._expire(now)
+            self._buckets[minute % HISTORY_WINDOW_MINUTES] += 1
+            self._activations_last_hour += 1
+
+    def last_transitions(self, count=None):
+        """return up to count of the last (timestamp, state) transitions, oldest first"""
+        recorded = min(self._transitions, self._size)
+        count = recorded if count is None else min(count, recorded)
+        return [(self._times[index % self._size], self._states[self._codes[index % self._size]])
+                for index in range(self._transitions - count, self._transitions)]
+
+    def activations_last_hour(self, now=None):
+        """return the number of activations in the last hour"""
+        self._expire(time.time() if now is None else now)
+        return self._activations_last_hour
+
+    def active_duration(self, now=None):
+        """return the seconds since the sensor entered its current active state, 0 while not active"""
+        if self._changed_at is None or self._active_states is None or not self._state in self._active_states:
+            return 0.0
+        return max(0.0, (time.time() if now is None else now) - self._changed_at)
+
+    def seconds_since_activation(self, now=None):
+        """return the seconds since the last activation or None"""
+        if self._last_activation is None:
+            return None
+        return max(0.0, (time.time() if now is None else now) - self._last_activation)
+
+    def is_changing(self, since_activation=False, now=None):
+        """return true while the metrics change with time: while active, while the last hour has activations or
+        since the first activation if since_activation is tracked"""
+        if not self._active_states is None and self._state in self._active_states:
+            return True
+        if since_activation and not self._last_activation is None:
+            return True
+        return self.activations_last_hour(now) > 0
+
+    def refresh_due(self, since_activation=False, now=None):
+        """return true if the metrics should be refreshed, once more after they stopped changing for publishing their final values"""
+        changing = self.is_changing(since_activation, now)
+        due = changing or self._changing
+        self._changing = changing
+        return due
+
+    def _code(self, state):
+        """return the small code of a state for the codes array"""
+        try:
+            return self._states.index(state)
+        except ValueError:
+            self._states.append(state)
+            return len(self._states) - 1
+
+    def _expire(self, now):
+        """zero the buckets of the minutes that left the window, return the current minute"""
+        minute = int(now // 60)
+        if minute - self._minute >= HISTORY_WINDOW_MINUTES:
+            for bucket in range(HISTORY_WINDOW_MINUTES):
+                self._buckets[bucket] = 0
+            self._activations_last_hour = 0
+        else:
+            for passed in range(self._minute + 1, minute + 1):
+                bucket = passed % HISTORY_WINDOW_MINUTES
+                self._activations_last_hour -= self._buckets[bucket]
+                self._buckets[bucket] = 0
+        self._minute = max(self._minute, minute)
+        return self._minute
+
+"""###########################
+######## Sensors Diff ########
+###########################"""
+class S1CSensorsDiff(object):
+    """the last raw status and decoded state of every sensor index"""
+    def __init__(self, parse_status):
+        """initialize the diff, parse_status(sensor_type, sensor_status) decodes a raw status to a state"""
+        self._parse_status = parse_status
+        self._types = []
+        self._statuses = []
+        self._states = []
+
+    @property
+    def states(self):
+        """return the decoded states by sensor index"""
+        return list(self._states)
+
+    def reset(self, sensors_status):
+        """record a full status snapshot without reporting changes"""
+        sensors = sensors_status["sensors"]
+        self._types = [sensor["type"] for sensor in sensors]
+        self._statuses = [sensor["status"] for sensor in sensors]
+        self._states = [self._parse_status(sensor["type"], str(sensor["status"])) for sensor in sensors]
+
+    def diff(self, sensors_status):
+        """record a status snapshot, return a list of (index, sensor, previous state, state) for the sensors whose state changed"""
+        changes = []
+        types = self._types
+        statuses = self._statuses
+        known = len(statuses)
+        for i, sensor in enumerate(sensors_status["sensors"]):
+            status = sensor["status"]
+            if i < known and status == statuses[i] and sensor["type"] == types[i]:
+                continue
+            sensor_type = sensor["type"]
+            state = self._parse_status(sensor_type, str(status))
+            if i >= known:
+                """a sensor paired after the discovery has no entity to update"""
+                types.append(sensor_type)
+                statuses.append(status)
+                self._states.append(state)
+                continue
+            types[i] = sensor_type
+            statuses[i] = status
+            previous_state = self._states[i]
+            if not state == previous_state:
+                self._states[i] = state
+                changes.append((i, sensor, previous_state, state))
+        return changes
+
+"""###########################
+####### Sensor Filter ########
+###########################"""
+class S1CSensorFilter(object):
+    """glitch filter of a sensor's decoded state changes with minimum hold time and release hysteresis"""
+    def __init__(self, state, min_hold=0.0, release_states=(), release_delay=0.0):
+        """initialize the filter with the sensor's current state"""
+        self._min_hold = min_hold
+        self._release_states = frozenset(release_states)
+        self._release_delay = release_delay
+        self._state = state
+        self._state_at = None
+        self._pending = None
+        self._pending_since = None
+        self._suppressed = 0
+
+    @property
+    def state(self):
+        """return the last state passed by the filter"""
+        return self._state
+
+    @property
+    def pending(self):
+        """return true if a change is held"""
+        return not self._pending is None
+
+    @property
+    def suppressed(self):
+        """return the number of changes suppressed"""
+        return self._suppressed
+
+    def update(self, state, now=None):
+        """filter a state change, return the state to launch or None if the change is held or suppressed"""
+        now = time.monotonic() if now is None else now
+        if not self._pending is None:
+            """a held change replaced by another change or undone before it was launched"""
+            self._suppressed += 1
+            self._pending = None
+        if state == self._state:
+            return None
+        self._pending = state
+        self._pending_since = now
+        return self.flush(now)
+
+    def flush(self, now=None):
+        """return the held state if it is due, None otherwise"""
+        if self._pending is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if not self._state_at is None and now - self._state_at < self._min_hold:
+            return None
+        if self._pending in self._release_states and not self._state_at is None and now - self._pending_since < self._release_delay:
+            return None
+        self._state = self._pending
+        self._state_at = now
+        self._pending = None
+        return self._state
+
+"""###########################
+####### Sensors Watcher ######
+###########################"""
+class S1CSensorsWatcher(object):
+    """sensors status change watcher, the changes go to the on_change callback, subclasses may override
+    launch_state_change_event and check_loop_run"""
+    def __init__(self, hub, parse_status, cadence=None, initial_status=None, filters=None, on_change=None, on_suppressed=None):
+        """initialize the watcher, parse_status(sensor_type, sensor_status) decodes the raw status to a state,
+        filters is a dict of sensor type to S1CSensorFilter keyword arguments, on_change(name, state) is called
+        from the watch loop for every launched change and on_suppressed(name, count) when a filter suppresses a change"""
+        self._hub = hub
+        self._on_change = on_change
+        self._on_suppressed = on_suppressed
+        self._diff = S1CSensorsDiff(parse_status)
+        self._filter_config = {} if filters is None else filters
+        self._filters = {}
+        self._held = {}
+        self._cadence = S1CWatchCadence() if cadence is None else cadence
+        self._initialized = not initial_status is None
+        if self._initialized:
+            self._diff.reset(initial_status)
+        self._ok_to_run = True
+        self._loops = 0
+
+    @property
+    def running(self):
+        """return true until the watcher is stopped"""
+        return self._ok_to_run
+
+    @property
+    def loop_rate(self):
+        """return the measured loops per second"""
+        return self._cadence.loop_rate
+
+    @property
+    def loops(self):
+        """return the number of loops run"""
+        return self._loops
+
+    @property
+    def suppressed(self):
+        """return the number of changes suppressed by the filters"""
+        return sum(sensor_filter.suppressed for sensor_filter in self._filters.values())
+
+    def suppressed_count(self, name):
+        """return the number of changes of a sensor suppressed by its filter"""
+        sensor_filter = self._filters.get(name)
+        return 0 if sensor_filter is None else sensor_filter.suppressed
+
+    def loop_once(self):
+        """blocking, run one loop of the watch and return the seconds to sleep before the next one"""
+        start = time.monotonic()
+        changed = False
+        try:
+            if not self._initialized:
+                self._diff.reset(self._hub.get_sensors_status())
+                self._initialized = True
+            else:
+                changed = self.check_sensors()
+        except S1CSessionError as ex:
+            _LOGGER.debug(str(ex))
+        except Exception:
+            _LOGGER.warning("exception while getting sensors status: " + traceback.format_exc())
+            self.check_loop_run()
+        if self._held:
+            changed = self.flush_held() or changed
+        self._loops += 1
+        return self._cadence.loop_done(changed, time.monotonic() - start)
+
+    def check_sensors(self):
+        """get the sensors status and launch events for the changed sensors, return true if any sensor changed"""
+        changes = self._diff.diff(self._hub.get_sensors_status())
+        for i, sensor, previous_state, state in changes:
+            _LOGGER.debug("status change tracked from: " + str(previous_state) + " to: " + str(sensor))
+            name = sensor["name"]
+            sensor_filter = self._filters.get(name)
+            if sensor_filter is None and sensor["type"] in self._filter_config:
+                sensor_filter = self._filters[name] = S1CSensorFilter(previous_state, **self._filter_config[sensor["type"]])
+            if not sensor_filter is None:
+                suppressed = sensor_filter.suppressed
+                state = sensor_filter.update(state)
+                if sensor_filter.suppressed != suppressed:
+                    self.launch_suppressed_change(name, sensor_filter.suppressed)
+                if sensor_filter.pending:
+                    self._held[name] = sensor_filter
+                else:
+                    self._held.pop(name, None)
+                if state is None:
+                    _LOGGER.debug("status change of " + name + " held by its filter")
+                    continue
+            self.launch_state_change_event(name, state)
+        return bool(changes)
+
+    def flush_held(self):
+        """launch events for the held changes that are due, return true if any was launched"""
+        launched = False
+        for name, sensor_filter in list(self._held.items()):
+            state = sensor_filter.flush()
+            if not state is None:
+                del self._held[name]
+                self.launch_state_change_event(name, state)
+                launched = True
+        return launched
+
+    def check_loop_run(self):
+        """called after an exception in the loop, may stop the loop"""
+        pass
+
+    def launch_state_change_event(self, name, status):
+        """launch events for state changes, calls on_change if given"""
+        if not self._on_change is None:
+            self._on_change(name, status)
+
+    def launch_suppressed_change(self, name, count):
+        """report a sensor's suppressed changes count, calls on_suppressed if given"""
+        if not self._on_suppressed is None:
+            self._on_suppressed(name, count)
+
+    def stop(self, event=None):
+        """stop the watch, the poller drops the watcher when its next loop is due"""
+        self._ok_to_run = False
+
+"""###########################
+###### Sensors Dispatcher ####
+###########################"""
+class S1CSensorsDispatcher(object):
+    """delivers the sensors changes directly to the owning entities and fires the change events only when enabled"""
+    def __init__(self, sensors_by_name, deliver, fire_event=None, deliver_suppressed=None):
+        """initialize the dispatcher, deliver(sensor, state) hands a change to its entity, fire_event(name, state)
+        fires the change event, None for no events, and deliver_suppressed(sensor, count) hands a suppressed count"""
+        self._sensors_by_name = sensors_by_name
+        self._deliver = deliver
+        self._fire_event = fire_event
+        self._deliver_suppressed = deliver_suppressed
+
+    def state_changed(self, name, state):
+        """dispatch a sensor's state change, used as the watcher's on_change"""
+        sensor = self._sensors_by_name.get(name)
+        if not sensor is None:
+            self._deliver(sensor, state)
+        else:
+            _LOGGER.debug("no entity for sensor " + name)
+        if not self._fire_event is None:
+            _LOGGER.debug("launching event for " + name + " for state changed to " + str(state))
+            self._fire_event(name, state)
+
+    def suppressed_changed(self, name, count):
+        """dispatch a sensor's suppressed changes count, used as the watcher's on_suppressed"""
+        sensor = self._sensors_by_name.get(name)
+        if not sensor is None and not self._deliver_suppressed is None:
+            self._deliver_suppressed(sensor, count)
+
+"""###########################
+######## Hubs Poller #########
+###########################"""
+class S1CHubsPoller(object):
+    """runs the loops of the watchers of all the hubs on one scheduler thread and a bounded pool of workers"""
+    def __init__(self, workers=DEFAULT_POLL_WORKERS):
+        """initialize the poller, the threads are started with the first watcher"""
+        self._workers = max(1, workers)
+        self._executor = None
+        self._thread = None
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._ok_to_run = True
+
+    @property
+    def max_threads(self):
+        """return the number of threads the poller may run, regardless of the number of hubs"""
+        return self._workers + 1
+
+    def add_watcher(self, watcher):
+        """schedule the first loop of a watcher"""
+        with self._condition:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers)
+                self._thread = threading.Thread(target=self._run, name="S1CHubsPoller", daemon=True)
+                self._thread.start()
+            self._schedule(watcher, time.monotonic())
+
+    def stop(self, event=None):
+        """stop the poller and all its watchers"""
+        with self._condition:
+            self._ok_to_run = False
+            for _, _, watcher in self._queue:
+                watcher.stop()
+            self._queue = []
+            self._condition.notify()
+        if not self._executor is None:
+            self._executor.shutdown(wait=False)
+
+    def _schedule(self, watcher, due):
+        """queue a watcher's next loop, must be called holding the condition"""
+        heapq.heappush(self._queue, (due, next(self._sequence), watcher))
+        self._condition.notify()
+
+    def _run(self):
+        """hand the due loops to the workers, a hub's next loop is scheduled only after its current loop is done"""
+        _LOGGER.info("starting hubs poller")
+        while True:
+            with self._condition:
+                while self._ok_to_run and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    self._condition.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                if not self._ok_to_run:
+                    break
+                _, _, watcher = heapq.heappop(self._queue)
+                if watcher.running:
+                    self._executor.submit(self._run_watcher, watcher)
+        _LOGGER.info("hubs poller done")
+
+    def _run_watcher(self, watcher):
+        """run one loop of a watcher in a worker and schedule its next loop"""
+        try:
+            delay = watcher.loop_once()
+        except Exception:
+            _LOGGER.error("failed to run sensors watch loop " + traceback.format_exc())
+            delay = DEFAULT_WATCH_INTERVAL
+        with self._condition:
+            if self._ok_to_run and watcher.running:
+                self._schedule(watcher, time.monotonic() + delay)
@@ -0,0 +1,381 @@
+import threading
+import time
+
+import broadlink_s1c_bench
+import broadlink_s1c_util
+
+
+class FakeHub(object):
+  """stand-in for broadlink.S1C answering from a mutable list of sensors"""
+  def __init__(self, statuses, latency=0.0):
+    self.sensors = [{"name": "Sensor %d" % index, "type": "Door Sensor", "status": status} for index, status in enumerate(statuses)]
+    self.latency = latency
+    self.lock = threading.Lock()
+    self.requests = 0
+    self.authorized = True
+    self.rebooting = False
+    self.auths = 0
+
+  def auth(self):
+    self.auths += 1
+    self.authorized = not self.rebooting
+    return self.authorized
+
+  def get_sensors_status(self):
+    time.sleep(self.latency)
+    with self.lock:
+      self.requests += 1
+      if not self.authorized:
+        raise OSError("session dropped")
+      return {"sensors": [dict(sensor) for sensor in self.sensors]}
+
+  def set_status(self, index, status):
+    with self.lock:
+      self.sensors[index]["status"] = status
+
+
+def parse_status(sensor_type, sensor_status):
+  return {"0": "closed", "128": "closed", "16": "open", "144": "open"}.get(sensor_status, "unknown")
+
+
+class RecordingWatcher(broadlink_s1c_util.S1CSensorsWatcher):
+  def __init__(self, hub, cadence, filters=None):
+    broadlink_s1c_util.S1CSensorsWatcher.__init__(self, hub, parse_status, cadence, hub.get_sensors_status(), filters,
+      on_suppressed=lambda name, count: self.suppressed_counts.append((name, count)))
+    self.events = []
+    self.suppressed_counts = []
+
+  def launch_state_change_event(self, name, status):
+    self.events.append((time.monotonic(), name, status))
+
+
+def test_watch_cadence():
+  cadence = broadlink_s1c_util.S1CWatchCadence(0.5, 0.1, 1.0, fast_loops=2)
+  # backing off slowly while quiet
+  sleeps = [cadence.loop_done(False, 0.0, now=0) for _ in range(9)]
+  assert sleeps[0] == 0.5 * broadlink_s1c_util.QUIET_BACKOFF
+  assert sleeps == sorted(sleeps) and sleeps[-1] == 1.0
+  # fast right after a change, back to the target interval after the fast loops
+  assert [cadence.loop_done(changed, 0.0, now=0) for changed in (True, False, False, False)] == [0.1, 0.1, 0.1, 0.5]
+  # the time spent waiting for the hub is deducted from the sleep
+  assert cadence.loop_done(True, 0.04, now=0) == 0.1 - 0.04
+  assert cadence.loop_done(False, 0.3, now=0) == 0.0
+  assert broadlink_s1c_util.S1CWatchCadence(0.5, 2.0, 0.1).interval == 0.5
+
+
+def test_loop_rate():
+  cadence = broadlink_s1c_util.S1CWatchCadence(0.5, rate_window=10)
+  assert cadence.loop_rate is None
+  for second in range(21):
+    cadence.loop_done(False, 0.0, now=float(second))
+  assert cadence.loop_rate == 1.0
+
+
+def test_backoff():
+  backoff = broadlink_s1c_util.S1CBackoff(10, 60)
+  assert [backoff.next_delay() for _ in range(5)] == [10, 20, 40, 60, 60]
+  assert backoff.retries == 5
+  backoff.reset()
+  assert backoff.retries == 0 and backoff.next_delay() == 10
+
+
+def test_hub_session_recovery():
+  hub = FakeHub(["0"] * 4)
+  session = broadlink_s1c_util.S1CHubSession(hub, failures=3, backoff=broadlink_s1c_util.S1CBackoff(0.2, 1))
+  assert session.get_sensors_status()["sensors"][0]["status"] == "0"
+  # the hub reboots and drops the session
+  hub.authorized = False
+  hub.rebooting = True
+  for _ in range(3):
+    try:
+      session.get_sensors_status()
+      assert False, "expected OSError"
+    except OSError:
+      pass
+  assert not session.healthy
+  # the failed authorization backs off without dialing the hub
+  requests = hub.requests
+  for _ in range(3):
+    try:
+      session.get_sensors_status()
+      assert False, "expected S1CSessionError"
+    except broadlink_s1c_util.S1CSessionError:
+      pass
+  assert hub.auths == 1 and hub.requests == requests
+  # the hub is back, the session is authorized again in place once the backoff passes
+  hub.rebooting = False
+  time.sleep(0.25)
+  assert session.get_sensors_status()["sensors"]
+  assert session.healthy and session.reauths == 1 and hub.auths == 2
+
+
+def test_watcher_resumes_after_session_loss():
+  hub = FakeHub(["0"] * 4)
+  session = broadlink_s1c_util.S1CHubSession(hub, failures=2, backoff=broadlink_s1c_util.S1CBackoff(0.05, 0.2))
+  exceptions = []
+
+  class BudgetWatcher(RecordingWatcher):
+    def check_loop_run(self):
+      exceptions.append(None)
+
+  watcher = BudgetWatcher(session, broadlink_s1c_util.S1CWatchCadence(0.02, 0.02, 0.02))
+  hub.authorized = False
+  hub.rebooting = True
+  for _ in range(20):
+    watcher.loop_once()
+  # only the failures before the session went down count against the exceptions budget
+  assert len(exceptions) == 2 and not session.healthy
+  hub.rebooting = False
+  hub.set_status(0, "16")
+  time.sleep(0.25)
+  watcher.loop_once()
+  assert session.healthy and [event[1:] for event in watcher.events] == [("Sensor 0", "open")]
+
+
+def test_sensor_history():
+  history = broadlink_s1c_util.S1CSensorHistory(("open",), size=4)
+  history.reset("closed", now=1000.0)
+  assert history.activations_last_hour(now=1000.0) == 0 and history.seconds_since_activation() is None
+  for second, state in ((1010.0, "open"), (1020.0, "closed"), (1500.0, "open")):
+    history.record(state, now=second)
+  assert history.activations_last_hour(now=1500.0) == 2
+  assert history.active_duration(now=1530.0) == 30 and history.seconds_since_activation(now=1530.0) == 30
+  history.record("closed", now=1600.0)
+  assert history.active_duration(now=1630.0) == 0
+  # the first activation leaves the window an hour later, the whole window expires after a quiet hour
+  assert history.activations_last_hour(now=1010.0 + 3600) == 1
+  assert history.activations_last_hour(now=1500.0 + 3600) == 0
+  # the log keeps the last transitions only
+  history.record("open", now=9000.0)
+  assert history.transitions == 5
+  assert history.last_transitions() == [(1020.0, "closed"), (1500.0, "open"), (1600.0, "closed"), (9000.0, "open")]
+  assert history.last_transitions(1) == [(9000.0, "open")]
+  # without active states every transition counts
+  fob = broadlink_s1c_util.S1CSensorHistory()
+  fob.record("armed_away", now=0.0)
+  fob.record("disarmed", now=1.0)
+  assert fob.activations_last_hour(now=2.0) == 2 and fob.active_duration(now=2.0) == 0
+
+
+def test_metrics_refresh():
+  door = broadlink_s1c_util.S1CSensorHistory(("open",))
+  door.reset("closed", now=1000.0)
+  assert not door.refresh_due(now=1000.0)
+  door.record("open", now=1000.0)
+  # the door stays open without a transition, its metrics keep changing and are refreshed
+  assert door.refresh_due(now=1000.0 + broadlink_s1c_util.METRICS_REFRESH_INTERVAL)
+  assert door.active_duration(now=1120.0) == 120 and door.activations_last_hour(now=1120.0) == 1
+  assert door.refresh_due(now=1120.0)
+  door.record("closed", now=1200.0)
+  # closed, the events of the last hour still decay
+  assert door.refresh_due(now=1230.0) and door.activations_last_hour(now=1230.0) == 1
+  assert door.active_duration(now=1230.0) == 0
+  # once the hour passed one last refresh publishes 0, then the refreshes stop
+  assert door.refresh_due(now=1000.0 + 3660) and door.activations_last_hour(now=1000.0 + 3660) == 0
+  assert not door.refresh_due(now=1000.0 + 3690)
+
+  motion = broadlink_s1c_util.S1CSensorHistory(("motion_detected",))
+  motion.reset("no_motion", now=1000.0)
+  assert not motion.refresh_due(True, now=1000.0)
+  motion.record("motion_detected", now=1000.0)
+  motion.record("no_motion", now=1010.0)
+  # the seconds since motion keep growing after the last hour has passed
+  assert motion.refresh_due(True, now=1000.0 + 7200) and motion.seconds_since_activation(now=1000.0 + 7200) == 7200
+  assert not motion.is_changing(now=1000.0 + 7200)
+
+
+def test_sensor_filter():
+  sensor_filter = broadlink_s1c_util.S1CSensorFilter("no_motion", min_hold=1.0, release_states=("no_motion",), release_delay=5.0)
+  # the first transition is never delayed
+  assert sensor_filter.update("motion_detected", now=100.0) == "motion_detected"
+  # flapping back within the release delay is suppressed
+  assert sensor_filter.update("no_motion", now=101.0) is None and sensor_filter.pending
+  assert sensor_filter.flush(now=103.0) is None
+  assert sensor_filter.update("motion_detected", now=104.0) is None and not sensor_filter.pending
+  assert sensor_filter.suppressed == 1 and sensor_filter.state == "motion_detected"
+  # a release persisting for the delay passes
+  assert sensor_filter.update("no_motion", now=110.0) is None
+  assert sensor_filter.flush(now=115.0) == "no_motion"
+  # changes within the minimum hold are held, the last one passes when the hold ends
+  door = broadlink_s1c_util.S1CSensorFilter("closed", min_hold=2.0)
+  assert door.update("open", now=0.0) == "open"
+  assert door.update("closed", now=0.5) is None
+  assert door.update("tampered", now=1.0) is None and door.suppressed == 1
+  assert door.flush(now=1.5) is None and door.flush(now=2.0) == "tampered"
+  assert door.update("closed", now=10.0) == "closed"
+  # the first change isn't delayed by the release delay either
+  window = broadlink_s1c_util.S1CSensorFilter("open", release_states=("closed",), release_delay=5.0)
+  assert window.update("closed", now=0.0) == "closed"
+  assert window.update("open", now=1.0) == "open" and window.update("closed", now=2.0) is None
+
+
+def test_watcher_filters():
+  hub = FakeHub(["0"] * 2)
+  watcher = RecordingWatcher(hub, broadlink_s1c_util.S1CWatchCadence(0.01, 0.01, 0.01), {"Door Sensor": {"release_states": ("closed",), "release_delay": 0.2}})
+  hub.set_status(0, "16")
+  watcher.loop_once()
+  # closing and opening again within the release delay is a glitch
+  for status in ("0", "16", "0", "16"):
+    hub.set_status(0, status)
+    watcher.loop_once()
+  hub.set_status(0, "0")
+  watcher.loop_once()
+  assert [event[1:] for event in watcher.events] == [("Sensor 0", "open")]
+  time.sleep(0.25)
+  watcher.loop_once()
+  assert [event[1:] for event in watcher.events] == [("Sensor 0", "open"), ("Sensor 0", "closed")]
+  assert watcher.suppressed == 2 and watcher.suppressed_count("Sensor 0") == 2 and watcher.suppressed_count("Sensor 1") == 0
+  # the suppressed counts are pushed as they change, not with the next event
+  assert watcher.suppressed_counts == [("Sensor 0", 1), ("Sensor 0", 2)]
+
+
+def test_watcher_on_change():
+  hub = FakeHub(["0"] * 2)
+  changes = []
+  watcher = broadlink_s1c_util.S1CSensorsWatcher(hub, parse_status, broadlink_s1c_util.S1CWatchCadence(0.01, 0.01, 0.01), hub.get_sensors_status(),
+    on_change=lambda name, status: changes.append((name, status)))
+  hub.set_status(1, "16")
+  watcher.loop_once()
+  assert changes == [("Sensor 1", "open")]
+  # without a callback the changes are dropped
+  watcher = broadlink_s1c_util.S1CSensorsWatcher(hub, parse_status, broadlink_s1c_util.S1CWatchCadence(0.01, 0.01, 0.01), hub.get_sensors_status())
+  hub.set_status(1, "0")
+  watcher.loop_once()
+  assert watcher.loops == 1 and changes == [("Sensor 1", "open")]
+
+
+class FakeEntity(object):
+  def __init__(self, name):
+    self.name = name
+    self.states = []
+
+
+def test_direct_dispatch():
+  hub = FakeHub(["0"] * 3)
+  entities = {"Sensor %d" % index: FakeEntity("Sensor %d" % index) for index in range(2)}
+  dispatcher = broadlink_s1c_util.S1CSensorsDispatcher(entities, None, None, lambda sensor, count: sensor.states.append(count))
+  dispatcher.suppressed_changed("Sensor 0", 3)
+  dispatcher.suppressed_changed("Sensor 2", 3)
+  assert entities["Sensor 0"].states == [3]
+  entities["Sensor 0"].states = []
+  for fire_events in (False, True):
+    bus = []
+    dispatcher = broadlink_s1c_util.S1CSensorsDispatcher(entities, lambda sensor, state: sensor.states.append(state),
+      (lambda name, state: bus.append((name, state))) if fire_events else None)
+    watcher = broadlink_s1c_util.S1CSensorsWatcher(hub, parse_status, broadlink_s1c_util.S1CWatchCadence(0.01, 0.01, 0.01), hub.get_sensors_status(),
+      on_change=dispatcher.state_changed)
+    hub.set_status(1, "0" if fire_events else "16")
+    hub.set_status(2, "0" if fire_events else "16")
+    watcher.loop_once()
+    if not fire_events:
+      # the change reaches the owning entity without a bus event, a sensor without an entity is skipped
+      assert entities["Sensor 1"].states == ["open"] and entities["Sensor 0"].states == [] and bus == []
+    else:
+      assert entities["Sensor 1"].states == ["open", "closed"] and bus == [("Sensor 1", "closed"), ("Sensor 2", "closed")]
+
+
+def test_sensors_diff():
+  decoded = []
+
+  def counting_parse_status(sensor_type, sensor_status):
+    decoded.append(sensor_status)
+    return parse_status(sensor_type, sensor_status)
+
+  hub = FakeHub(["0"] * 16)
+  diff = broadlink_s1c_util.S1CSensorsDiff(counting_parse_status)
+  diff.reset(hub.get_sensors_status())
+  del decoded[:]
+  # nothing is decoded while the raw statuses are unchanged
+  assert diff.diff(hub.get_sensors_status()) == [] and decoded == []
+  hub.set_status(3, "16")
+  hub.set_status(7, "16")
+  changes = diff.diff(hub.get_sensors_status())
+  assert [(i, previous, state) for i, _, previous, state in changes] == [(3, "closed", "open"), (7, "closed", "open")]
+  assert decoded == ["16", "16"]
+  # a raw change decoding to the same state is recorded without reporting a change
+  hub.set_status(3, "144")
+  assert diff.diff(hub.get_sensors_status()) == [] and diff.states[3] == "open"
+  hub.set_status(3, "128")
+  assert len(diff.diff(hub.get_sensors_status())) == 1
+  hub.sensors.append({"name": "New Sensor", "type": "Door Sensor", "status": "16"})
+  assert diff.diff(hub.get_sensors_status()) == [] and diff.states[16] == "open"
+
+
+def test_watcher_detects_changes_and_stops():
+  hub = FakeHub(["0"] * 4, latency=0.002)
+  watcher = RecordingWatcher(hub, broadlink_s1c_util.S1CWatchCadence(0.1, 0.02, 0.2))
+  poller = broadlink_s1c_util.S1CHubsPoller(2)
+  poller.add_watcher(watcher)
+  try:
+    time.sleep(0.5)
+    changed_at = time.monotonic()
+    hub.set_status(2, "16")
+    time.sleep(0.5)
+    hub.set_status(2, "0")
+    time.sleep(0.3)
+  finally:
+    watcher.stop()
+    requests = hub.requests
+    time.sleep(0.3)
+    poller.stop()
+  # no more loops once stopped
+  assert hub.requests <= requests + 1 and not watcher.running
+  assert [event[1:] for event in watcher.events] == [("Sensor 2", "open"), ("Sensor 2", "closed")]
+  assert watcher.events[0][0] - changed_at <= 0.2 + 0.05
+  # sleeping between loops instead of spinning
+  print('%d hub requests in 1.3 seconds' % requests)
+  assert requests < 1.3 / 0.02
+
+
+def test_hubs_poller_isolation():
+  threads = threading.active_count()
+  slow_hub = FakeHub(["0"] * 4)
+  hubs = [FakeHub(["0"] * 4, latency=0.002) for _ in range(10)]
+  poller = broadlink_s1c_util.S1CHubsPoller(3)
+  watchers = [RecordingWatcher(hub, broadlink_s1c_util.S1CWatchCadence(0.1, 0.02, 0.2)) for hub in hubs]
+  slow_watcher = RecordingWatcher(slow_hub, broadlink_s1c_util.S1CWatchCadence(0.1, 0.02, 0.2))
+  slow_hub.latency = 1.0
+  try:
+    poller.add_watcher(slow_watcher)
+    for watcher in watchers:
+      poller.add_watcher(watcher)
+    time.sleep(0.3)
+    changed_at = time.monotonic()
+    for hub in hubs:
+      hub.set_status(1, "16")
+    time.sleep(0.5)
+    # the thread count doesn't grow with the number of hubs
+    assert threading.active_count() - threads <= poller.max_threads
+  finally:
+    poller.stop()
+  # the slow hub holds one worker while the others keep their cadence
+  for watcher in watchers:
+    assert [event[1:] for event in watcher.events] == [("Sensor 1", "open")]
+    assert watcher.events[0][0] - changed_at <= 0.2 + 0.05
+  assert slow_watcher.loops <= 1
+
+
+def test_fake_hub_benchmark():
+  hub = broadlink_s1c_bench.FakeS1CHub(doors=2, motions=2, fobs=1, latency=0.002, error_rate=0.1, seed=7)
+  assert [sensor["type"] for sensor in hub.sensors].count(broadlink_s1c_bench.SENSOR_TYPE_MOTION_SENSOR) == 2
+  assert hub.next_status(4) == 32
+  timeline = [(0.1, 0, None), (0.3, 2, None), (0.5, 4, None), (0.7, 4, None)]
+  cadence = broadlink_s1c_util.S1CWatchCadence(0.1, 0.02, 0.2)
+  results = broadlink_s1c_bench.run_benchmark(hub, cadence, timeline, 1.0)
+  print(results)
+  assert results["flips"] == 4 and results["detected"] == 4 and hub.sensors[4]["status"] == 64
+  assert results["latency_max"] < 0.2 + 0.1
+  assert results["requests_per_second"] < 1 / 0.02
+  assert len(broadlink_s1c_bench.random_timeline(10, 60, 2, seed=1)) > 60
+  assert broadlink_s1c_bench.percentile([3, 1, 2, 4], 50) == 2 and broadlink_s1c_bench.percentile([], 50) is None
+
+
+def main():
+  for name, test in sorted(globals().items()):
+    if name.startswith('test_') and callable(test):
+      test()
+      print(name, 'OK')
+
+
+if __name__ == '__main__':
+  main()
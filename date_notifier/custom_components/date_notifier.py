@@ -4,7 +4,7 @@ Build by TomerFi
 Please visit https://github.com/TomerFi/home-assistant-custom-components for more custom components
 
 installation notes:
-place this file in the following folder and restart home assistant:
+place this file and date_notifier_util.py in the following folder and restart home assistant:
 /config/custom_components
 
 yaml configuration examples:
@@ -44,12 +44,20 @@ date_notifier:
     notifier: "ios_tomers_iphone6s"
 
     you can add countdown: true to non-daily reminders for getting a notification for each day from the max days_notice to the current day.
+    reminders due at the same time for the same notifier are send as one message, you can add batch_limit: 10 under date_notifier
+    for the number of reminders listed in a message, the rest are summarized.
+
+services:
+    date_notifier.add_reminder: adds a reminder, takes a slug and the same keys as a reminder in the configuration.
+    date_notifier.update_reminder: takes a slug and the keys to change in the reminder.
+    date_notifier.remove_reminder: takes the slug of the reminder to remove.
+    reminders added or changed by the services are kept until home assistant restarts, add them to the configuration to keep them.
 
 ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////"""
 import asyncio
 import logging
 import json
-import datetime
+from collections import OrderedDict
 
 import voluptuous as vol
 
@@ -57,15 +65,20 @@ from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.entity import Entity, async_generate_entity_id
 from homeassistant.helpers.entity_component import EntityComponent
 from homeassistant.core import callback
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.event import async_track_point_in_time
+import homeassistant.util.dt as dt_util
 from homeassistant.components.notify import DOMAIN as NOTIFY_DOMAIN
 
+from custom_components.date_notifier_util import (RECURRENCE_DAILY, RECURRENCE_MONTHLY, RECURRENCE_YEARLY, RECURRENCE_ON_DATE,
+    DateNotifierRecurrence, DateNotifierStateStore, DateNotifierReminders, DateNotifierError, batch_by_notifier, check_reminder_time)
+
 _LOGGER = logging.getLogger(__name__)
 
 DEPENDENCIES = [NOTIFY_DOMAIN]
 
 DOMAIN = 'date_notifier'
 ENTITY_ID_FORMAT = DOMAIN + '.{}'
+STATE_FILE = '.' + DOMAIN + '.json'
 
 NAME = 'name'
 HOUR = 'hour'
@@ -80,94 +93,226 @@ DAYS_NOTICE_DEFAULT = 0
 NOTIFIER = 'notifier'
 COUNTDOWN = 'countdown'
 COUNTDOWN_DEFAULT = False
+BATCH_LIMIT = 'batch_limit'
+BATCH_LIMIT_DEFAULT = 10
+SLUG = 'slug'
+
+SERVICE_ADD_REMINDER = 'add_reminder'
+SERVICE_UPDATE_REMINDER = 'update_reminder'
+SERVICE_REMOVE_REMINDER = 'remove_reminder'
 
 ATTR_PAST_DUE = "past_due"
-ATTR_DAILY = "daily"
-ATTR_MONTHLY = "monthly"
-ATTR_YEARLY = "yearly"
-ATTR_ON_DATE = "on_date"
+ATTR_DAILY = RECURRENCE_DAILY
+ATTR_MONTHLY = RECURRENCE_MONTHLY
+ATTR_YEARLY = RECURRENCE_YEARLY
+ATTR_ON_DATE = RECURRENCE_ON_DATE
 
 RECURRENCE = 'recurrence'
-INTERVAL = datetime.timedelta(minutes=1)
-SERVICE_SCAN_DATES = "scan_dates"
+
+def has_date_parts(config):
+    """A yearly reminder needs a day, a one time reminder needs a day and a month"""
+    try:
+        check_reminder_time(config.get(HOUR), config.get(MINUTE), config.get(DAY), config.get(MONTH), config.get(YEAR))
+    except DateNotifierError as ex:
+        raise vol.Invalid(str(ex))
+    return config
+
+REMINDER_FIELDS = {
+    vol.Required(NAME): cv.string,
+    vol.Required(HOUR): vol.All(vol.Coerce(int), vol.Range(min=0, max=23)),
+    vol.Required(MESSAGE): cv.string,
+    vol.Required(NOTIFIER): cv.string,
+    vol.Optional(DAYS_NOTICE, default=DAYS_NOTICE_DEFAULT): cv.positive_int,
+    vol.Optional(DAY): vol.All(vol.Coerce(int), vol.Range(min=1, max=31)),
+    vol.Optional(MINUTE, default=MINUTE_DEFAULT): vol.All(vol.Coerce(int), vol.Range(min=0, max=59)),
+    vol.Optional(MONTH): vol.All(vol.Coerce(int), vol.Range(min=1, max=12)),
+    vol.Optional(YEAR): vol.All(vol.Coerce(int), vol.Range(min=1000, max=9999)),
+    vol.Optional(COUNTDOWN, default=COUNTDOWN_DEFAULT): cv.boolean
+}
+
+REMINDER_SCHEMA = vol.All(vol.Schema(REMINDER_FIELDS), has_date_parts)
 
 CONFIG_SCHEMA = vol.Schema({
     DOMAIN: vol.Schema({
-        cv.slug: vol.All({
-            vol.Required(NAME): cv.string,
-            vol.Required(HOUR): cv.positive_int,
-            vol.Required(MESSAGE): cv.string,
-            vol.Required(NOTIFIER): cv.string,
-            vol.Optional(DAYS_NOTICE, default=DAYS_NOTICE_DEFAULT): cv.positive_int,
-            vol.Optional(DAY): cv.positive_int,
-            vol.Optional(MINUTE, default=MINUTE_DEFAULT): cv.positive_int,
-            vol.Optional(MONTH): cv.positive_int,
-            vol.Optional(YEAR): cv.positive_int,
-            vol.Optional(COUNTDOWN, default=COUNTDOWN_DEFAULT): cv.boolean
-        })
+        vol.Optional(BATCH_LIMIT, default=BATCH_LIMIT_DEFAULT): vol.All(cv.positive_int, vol.Range(min=1)),
+        cv.slug: REMINDER_SCHEMA
     })
 }, extra=vol.ALLOW_EXTRA)
 
+ADD_REMINDER_SCHEMA = vol.All(vol.Schema(REMINDER_FIELDS).extend({
+    vol.Required(SLUG): cv.slug
+}), has_date_parts)
+
+"""The updated keys are validated here, the merged reminder is validated with REMINDER_SCHEMA"""
+UPDATE_REMINDER_SCHEMA = vol.Schema({
+    vol.Required(SLUG): cv.slug,
+    vol.Optional(NAME): cv.string,
+    vol.Optional(HOUR): vol.All(vol.Coerce(int), vol.Range(min=0, max=23)),
+    vol.Optional(MESSAGE): cv.string,
+    vol.Optional(NOTIFIER): cv.string,
+    vol.Optional(DAYS_NOTICE): cv.positive_int,
+    vol.Optional(DAY): vol.All(vol.Coerce(int), vol.Range(min=1, max=31)),
+    vol.Optional(MINUTE): vol.All(vol.Coerce(int), vol.Range(min=0, max=59)),
+    vol.Optional(MONTH): vol.All(vol.Coerce(int), vol.Range(min=1, max=12)),
+    vol.Optional(YEAR): vol.All(vol.Coerce(int), vol.Range(min=1000, max=9999)),
+    vol.Optional(COUNTDOWN): cv.boolean
+})
+
+REMOVE_REMINDER_SCHEMA = vol.Schema({
+    vol.Required(SLUG): cv.slug
+})
+
 
 @asyncio.coroutine
 def async_setup(hass, config):
     component = EntityComponent(_LOGGER, DOMAIN, hass)
 
-    entities = []
+    batch_limit = config[DOMAIN][BATCH_LIMIT]
+    reminders_config = OrderedDict((slug, reminder_config) for slug, reminder_config in config[DOMAIN].items() if slug != BATCH_LIMIT)
+
+    """the configuration of the reminders by slug"""
+    configs = {}
+    timer = {}
+
+    """the fire times persisted across restarts, read once"""
+    store = DateNotifierStateStore(hass.config.path(STATE_FILE))
+    yield from hass.async_add_job(store.load)
+    for slug in store.slugs:
+        if slug not in reminders_config:
+            store.remove(slug)
+    reminders = DateNotifierReminders(store)
 
-    for slug, config in config[DOMAIN].items():
-        if not config:
-            config = {}
-
-        name = config.get(NAME)
-        hour = config.get(HOUR)
-        minute = config.get(MINUTE)
-        day = None
-        month = None
-        year = None
-        message = config.get(MESSAGE)
-        days_notice = config.get(DAYS_NOTICE)
-        notifier = config.get(NOTIFIER).replace(NOTIFY_DOMAIN + '.', '')
-        countdown = config.get(COUNTDOWN)
-        recurrence = ATTR_DAILY
-        if config.get(DAY):
-            day = config.get(DAY)
-            recurrence = ATTR_MONTHLY
-        if config.get(MONTH):
-            month = config.get(MONTH)
-            recurrence = ATTR_YEARLY
-        if config.get(YEAR):
-            year = config.get(YEAR)
-            calc_date = datetime.datetime.now().replace(second=0, microsecond=0)
-            reminder_set = datetime.datetime.strptime(str(year) + '-' + str(month) + '-' + str(day) + ' ' + str(hour) + ':' + str(minute), '%Y-%m-%d %H:%M') + datetime.timedelta(-days_notice)
-            if calc_date > reminder_set:
-                recurrence = ATTR_PAST_DUE
-            else:
-                recurrence = ATTR_ON_DATE
-
-        entities.append(DateNotifier(hass, slug, name, hour, minute, day, month, year, message, days_notice, notifier, recurrence, countdown))
+    @callback
+    def async_save_state():
+        """a single writer at a time, it picks up the latest queued state"""
+        if store.queue():
+            hass.async_add_job(store.write_queued)
+
+    """the fire times are naive times in home assistant's time zone, the timer reads them the same way"""
+    @callback
+    def async_arm_timer():
+        """one timer armed for the earliest fire time of all the reminders"""
+        if timer.get('unsub'):
+            timer.pop('unsub')()
+        fire_time = reminders.next_fire_time()
+        if fire_time is not None:
+            timer['unsub'] = async_track_point_in_time(hass, async_fire_due_reminders, fire_time)
+
+    @callback
+    def async_fire_due_reminders(now):
+        timer.pop('unsub', None)
+        due = reminders.fire_due(local_now())
+        """one message for all the reminders due for the same notifier"""
+        batches = batch_by_notifier([(entity.notifier, entity.async_notify(days_notice)) for entity, days_notice in due], batch_limit)
+        for notifier, message in batches.items():
+            service_data = {"title": "DateNotifier", "message": message}
+            hass.async_add_job(hass.services.async_call(NOTIFY_DOMAIN, notifier, service_data=service_data, blocking=False))
+        if due:
+            async_save_state()
+        async_arm_timer()
+
+    @asyncio.coroutine
+    def async_add_reminder(call):
+        slug = call.data[SLUG]
+        if slug in reminders:
+            _LOGGER.error("reminder " + slug + " already exists, use " + DOMAIN + "." + SERVICE_UPDATE_REMINDER + " for changing it")
+            return
+        reminder_config = {key: value for key, value in call.data.items() if key != SLUG}
+        entity = create_reminder(hass, slug, reminder_config)
+        reminders.add(entity, local_now().replace(second=0, microsecond=0))
+        configs[slug] = reminder_config
+        async_save_state()
+        async_arm_timer()
+        yield from component.async_add_entities([entity])
 
     @asyncio.coroutine
-    def async_scan_dates_service(call):
-        for entity in component.entities:
-            target_notifiers = [entity]
-            tasks = [notifier.scan_dates() for notifier in target_notifiers]
-            if tasks:
-                yield from asyncio.wait(tasks, loop=hass.loop)
-            else:
-                _LOGGER.error('no tasks initialized')
+    def async_update_reminder(call):
+        slug = call.data[SLUG]
+        if slug not in reminders:
+            _LOGGER.error("reminder " + slug + " doesn't exist")
+            return
+        reminder_config = dict(configs[slug])
+        reminder_config.update({key: value for key, value in call.data.items() if key != SLUG})
+        """the new reminder is built before the old one is swapped out, a failure leaves the old one in place"""
+        try:
+            reminder_config = REMINDER_SCHEMA(reminder_config)
+            old_entity, entity = reminders.update(slug, lambda old_entity: create_reminder(hass, slug, reminder_config, old_entity.entity_id),
+                                                  local_now().replace(second=0, microsecond=0))
+        except (vol.Invalid, DateNotifierError) as ex:
+            _LOGGER.error("failed to update reminder " + slug + ", " + str(ex))
+            return
+        configs[slug] = reminder_config
+        async_save_state()
+        async_arm_timer()
+        yield from old_entity.async_remove()
+        yield from component.async_add_entities([entity])
 
-    async_track_time_interval(hass, async_scan_dates_service, INTERVAL)
+    @asyncio.coroutine
+    def async_remove_reminder(call):
+        slug = call.data[SLUG]
+        try:
+            entity = reminders.remove(slug)
+        except DateNotifierError as ex:
+            _LOGGER.error(str(ex))
+            return
+        configs.pop(slug)
+        async_save_state()
+        async_arm_timer()
+        yield from entity.async_remove()
 
+    entities = []
+    calc_date = local_now().replace(second=0, microsecond=0)
+    for slug, reminder_config in reminders_config.items():
+        entity = create_reminder(hass, slug, reminder_config)
+        reminders.add(entity, calc_date)
+        configs[slug] = reminder_config
+        entities.append(entity)
+    async_save_state()
+    async_arm_timer()
     yield from component.async_add_entities(entities)
+
+    hass.services.async_register(DOMAIN, SERVICE_ADD_REMINDER, async_add_reminder, schema=ADD_REMINDER_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_UPDATE_REMINDER, async_update_reminder, schema=UPDATE_REMINDER_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_REMOVE_REMINDER, async_remove_reminder, schema=REMOVE_REMINDER_SCHEMA)
     return True
 
 
+def local_now():
+    """return the naive current time in home assistant's time zone"""
+    return dt_util.now().replace(tzinfo=None)
+
+
+def create_reminder(hass, slug, config, entity_id=None):
+    name = config.get(NAME)
+    hour = config.get(HOUR)
+    minute = config.get(MINUTE)
+    day = None
+    month = None
+    year = None
+    message = config.get(MESSAGE)
+    days_notice = config.get(DAYS_NOTICE)
+    notifier = config.get(NOTIFIER).replace(NOTIFY_DOMAIN + '.', '')
+    countdown = config.get(COUNTDOWN)
+    recurrence = ATTR_DAILY
+    if config.get(DAY):
+        day = config.get(DAY)
+        recurrence = ATTR_MONTHLY
+    if config.get(MONTH):
+        month = config.get(MONTH)
+        recurrence = ATTR_YEARLY
+    if config.get(YEAR):
+        year = config.get(YEAR)
+        recurrence = ATTR_ON_DATE
+
+    return DateNotifier(hass, slug, name, hour, minute, day, month, year, message, days_notice, notifier, recurrence, countdown, entity_id)
+
+
 class DateNotifier(Entity):
 
-    def __init__(self, hass, slug, name, hour, minute, day, month, year, message, days_notice, notifier, recurrence, countdown):
+    def __init__(self, hass, slug, name, hour, minute, day, month, year, message, days_notice, notifier, recurrence, countdown, entity_id=None):
         self.hass = hass
-        self.entity_id = async_generate_entity_id(ENTITY_ID_FORMAT, slug, hass=hass)
+        self.entity_id = entity_id if not entity_id is None else async_generate_entity_id(ENTITY_ID_FORMAT, slug, hass=hass)
+        self._slug = slug
         self._name = name
         self._hour = hour
         self._minute = minute
@@ -179,18 +324,34 @@ class DateNotifier(Entity):
         self._year = year
         self._recurrence = recurrence
         self._countdown = countdown
-        self._dates_list = []
-        if self._recurrence != ATTR_PAST_DUE:
-            if self._countdown and self._days_notice > 0:
-                for i in range(0, self._days_notice + 1):
-                    self._dates_list.append(self.create_due_date(i))
-            else:
-                self._dates_list.append(self.create_due_date(self._days_notice))
+        self._rule = DateNotifierRecurrence(recurrence, hour, minute, day, month, year)
+        if self._recurrence == ATTR_DAILY:
+            self._notices = [0]
+        elif self._countdown and self._days_notice > 0:
+            self._notices = list(range(self._days_notice, -1, -1))
+        else:
+            self._notices = [self._days_notice]
+        if self._recurrence == ATTR_ON_DATE:
+            calc_date = local_now().replace(second=0, microsecond=0)
+            if self._rule.fire_time_after(self._notices[-1], calc_date) is None:
+                self._recurrence = ATTR_PAST_DUE
 
     @property
     def should_poll(self):
         return False
 
+    @property
+    def slug(self):
+        return self._slug
+
+    @property
+    def notifier(self):
+        return self._notifier
+
+    @property
+    def notices(self):
+        return list(self._notices)
+
     @property
     def name(self):
         return self._name
@@ -223,41 +384,26 @@ class DateNotifier(Entity):
             attribs[DAYS_NOTICE] = self._days_notice
         return attribs
 
-    @callback
-    def create_due_date(self, days_notice):
-        calc_date = datetime.datetime.now()
-        reminder_set = None
-        _days_notice = days_notice
-        if self._recurrence == ATTR_ON_DATE:
-            reminder_set = datetime.datetime.strptime(str(self._year) + '-' + str(self._month) + '-' + str(self._day) + ' ' + str(self._hour) + ':' + str(self._minute), '%Y-%m-%d %H:%M') + datetime.timedelta(-days_notice)
-            if calc_date >= reminder_set:
-                self._recurrence = ATTR_PAST_DUE
-        elif self._recurrence == ATTR_YEARLY:
-            reminder_set = datetime.datetime.strptime(str(calc_date.year) + '-' + str(self._month) + '-' + str(self._day) + ' ' + str(self._hour) + ':' + str(self._minute), '%Y-%m-%d %H:%M') + datetime.timedelta(-days_notice)
-        elif self._recurrence == ATTR_MONTHLY:
-            reminder_set = datetime.datetime.strptime(str(calc_date.year) + '-' + str(calc_date.month) + '-' + str(self._day) + ' ' + str(self._hour) + ':' + str(self._minute), '%Y-%m-%d %H:%M') + datetime.timedelta(-days_notice)
-        elif self._recurrence == ATTR_DAILY:
-            reminder_set = datetime.datetime.strptime(str(calc_date.year) + '-' + str(calc_date.month) + '-' + str(calc_date.day) + ' ' + str(self._hour) + ':' + str(self._minute), '%Y-%m-%d %H:%M')
-            _days_notice = 0
+    def next_fire_time(self, days_notice, after):
+        if self._recurrence == ATTR_PAST_DUE:
+            return None
+        return self._rule.fire_time_after(days_notice, after)
 
-        return (reminder_set, _days_notice)
+    def fires_at(self, days_notice, fire_time):
+        if fire_time is None:
+            return False
+        return self._rule.fire_time_after(days_notice, fire_time) == fire_time
 
     @callback
-    def scan_dates(self):
-        calc_date = datetime.datetime.now().replace(second=0, microsecond=0)
-        if self._recurrence != ATTR_PAST_DUE:
-            for reminder_set, days_notice in self._dates_list:
-                if self._recurrence == ATTR_ON_DATE and calc_date >= reminder_set:
-                    self._recurrence = ATTR_PAST_DUE
-                if calc_date == reminder_set:
-                    message = self._message
-                    if days_notice == 0:
-                        message = message + ' is due today.'
-                    elif days_notice == 1:
-                        message = message + ' is due tommorow.'
-                    else:
-                        message = message + ' is due in ' + str(days_notice) + ' days.'
-                    service_data = {"title": "DateNotifier", "message": message}
-                    self.hass.async_add_job(self.hass.services.async_call(NOTIFY_DOMAIN, self._notifier, service_data=service_data, blocking=False))
-                    yield from self.async_update_ha_state()
-                    break
+    def async_notify(self, days_notice):
+        message = self._message
+        if days_notice == 0:
+            message = message + ' is due today.'
+        elif days_notice == 1:
+            message = message + ' is due tommorow.'
+        else:
+            message = message + ' is due in ' + str(days_notice) + ' days.'
+        if self._recurrence == ATTR_ON_DATE and days_notice == self._notices[-1]:
+            self._recurrence = ATTR_PAST_DUE
+        self.async_schedule_update_ha_state()
+        return message
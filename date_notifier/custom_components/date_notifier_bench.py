@@ -0,0 +1,115 @@
+"""
+Per tick cost benchmark for the date_notifier schedule, Home Assistant free.
+
+The benchmark creates random daily, monthly, yearly and one time reminders, with and without countdowns, and plays
+the ticks of every minute over a period the way the component does, popping the due reminders and rolling them
+forward to their next occurrence. It reports the cost per tick for each number of reminders and per fired reminder, with the
+fire minute index a tick costs only the reminders due in it, so the cost per fired reminder stays flat. The scan mode compares every reminder's fire time on every tick instead, as a baseline.
+
+usage, from the custom_components directory:
+    python date_notifier_bench.py --reminders 100 1000 10000 --days 7
+    python date_notifier_bench.py --reminders 100 1000 10000 --days 1 --scan  # scanning all the reminders, as a baseline
+"""
+import argparse
+import datetime
+import random
+import time
+
+from date_notifier_util import (RECURRENCE_DAILY, RECURRENCE_MONTHLY, RECURRENCE_YEARLY, RECURRENCE_ON_DATE,
+    DateNotifierRecurrence, DateNotifierScheduler)
+
+START = datetime.datetime(2018, 1, 1, 0, 0)
+
+"""###########################
+########## Reminders #########
+###########################"""
+def random_reminders(count, seed=None):
+    """return a list of (recurrence, notices) of random reminders"""
+    generator = random.Random(seed)
+    reminders = []
+    for _ in range(count):
+        recurrence = generator.choice((RECURRENCE_DAILY, RECURRENCE_MONTHLY, RECURRENCE_YEARLY, RECURRENCE_ON_DATE))
+        hour, minute = generator.randrange(24), generator.randrange(60)
+        day, month, year = generator.randint(1, 31), generator.randint(1, 12), generator.choice((2018, 2019))
+        if recurrence == RECURRENCE_DAILY:
+            rule = DateNotifierRecurrence(recurrence, hour, minute)
+            notices = [0]
+        else:
+            rule = DateNotifierRecurrence(recurrence, hour, minute, day, month, year)
+            days_notice = generator.randrange(8)
+            notices = list(range(days_notice, -1, -1)) if generator.random() < 0.5 else [days_notice]
+        reminders.append((rule, notices))
+    return reminders
+
+"""###########################
+######### Benchmark ##########
+###########################"""
+def percentile(values, percent):
+    """return the nearest rank percentile of the values or None"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(percent / 100.0 * len(values))) - 1))]
+
+
+def run_benchmark(reminders, minutes, scan=False):
+    """play a tick for every minute, return the benchmark results"""
+    scheduler = DateNotifierScheduler()
+    fire_times = {}
+    for index, (rule, notices) in enumerate(reminders):
+        for days_notice in notices:
+            fire_time = rule.fire_time_after(days_notice, START)
+            if fire_time is not None:
+                scheduler.add(fire_time, (index, days_notice))
+                fire_times[(index, days_notice)] = fire_time
+
+    ticks = []
+    fired = 0
+    for tick in range(minutes):
+        now = START + datetime.timedelta(minutes=tick)
+        started = time.perf_counter()
+        if scan:
+            due = [key for key, fire_time in fire_times.items() if fire_time == now]
+        else:
+            due = scheduler.pop_due(now)
+        for key in due:
+            """rolling the reminder forward to its next occurrence"""
+            fire_time = reminders[key[0]][0].fire_time_after(key[1], now + datetime.timedelta(minutes=1))
+            if fire_time is None:
+                fire_times.pop(key)
+            elif scan:
+                fire_times[key] = fire_time
+            else:
+                scheduler.add(fire_time, key)
+        ticks.append(time.perf_counter() - started)
+        fired += len(due)
+
+    return {
+        "fired": fired,
+        "tick_mean": sum(ticks) / len(ticks),
+        "tick_p50": percentile(ticks, 50),
+        "tick_p99": percentile(ticks, 99),
+        "tick_max": max(ticks),
+        "per_fired": sum(ticks) / fired if fired else None
+    }
+
+
+def main():
+    """run the benchmark for each number of reminders and print the results"""
+    parser = argparse.ArgumentParser(description="benchmark the date notifier schedule per tick cost")
+    parser.add_argument("--reminders", type=int, nargs="+", default=[100, 1000, 10000], help="numbers of reminders")
+    parser.add_argument("--days", type=float, default=7.0, help="days of ticks to play")
+    parser.add_argument("--scan", action="store_true", help="scan all the reminders on every tick")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the reminders")
+    args = parser.parse_args()
+
+    keys = ("tick_mean", "tick_p50", "tick_p99", "tick_max", "per_fired")
+    print("%-10s %-8s " % ("reminders", "fired") + " ".join("%-12s" % key for key in keys))
+    for count in args.reminders:
+        results = run_benchmark(random_reminders(count, args.seed), int(args.days * 24 * 60), args.scan)
+        print("%-10d %-8d " % (count, results["fired"]) + " ".join("%-12s" % ("-" if results[key] is None else "%.1f us" % (results[key] * 1000000))
+            for key in keys))
+
+
+if __name__ == "__main__":
+    main()
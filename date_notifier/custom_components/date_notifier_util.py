@@ -0,0 +1,445 @@
+"""
+Home Assistant free tools for the date_notifier component.
+
+The recurrence builds the reminders occurrences as datetime objects and rolls them forward lazily, one occurrence
+after the other. A day missing from a month (e.g. the 31st or February 29th) falls on the last day of that month.
+The reminder time is checked before a recurrence is built, a month requires a day and a year requires a month and a day.
+
+The scheduler indexes the reminders by their fire minute and keeps a min heap of the indexed minutes, so the component
+arms a single timer for the earliest minute and does no work between reminders. A tick pops the due minutes and only
+touches the reminders indexed under them, whatever the total number of reminders, and rolling a reminder forward or
+removing it moves only its own entry. Emptied minutes are dropped lazily when they reach the top of the heap.
+
+The state store persists the last fired time and the next fire time of each reminder notice in a small json file, read
+once at startup, so the component keeps the fire times across restarts and catches up on the reminders it missed
+while Home Assistant was down.
+
+The reminders registry keeps the reminders by slug and ties the scheduler and the state store together, adding,
+replacing or removing a reminder touches only its own notices.
+
+The reminders due in the same minute for the same notifier are batched into one message, up to a limit of lines
+followed by a summary of the rest.
+"""
+import calendar
+import datetime
+from collections import OrderedDict
+import heapq
+import json
+import logging
+import os
+import threading
+import traceback
+
+_LOGGER = logging.getLogger(__name__)
+
+"""###############################
+########## Recurrences ###########
+###############################"""
+RECURRENCE_DAILY = "daily"
+RECURRENCE_MONTHLY = "monthly"
+RECURRENCE_YEARLY = "yearly"
+RECURRENCE_ON_DATE = "on_date"
+
+"""###############################
+############ Batches #############
+###############################"""
+BATCH_OVERFLOW_FORMAT = "and {} more reminders."
+
+"""###############################
+########## State Store ###########
+###############################"""
+STATE_TIME_FORMAT = "%Y-%m-%dT%H:%M"
+STATE_LAST_FIRED = "last_fired"
+STATE_NEXT_FIRE = "next_fire"
+
+"""###########################
+######### Recurrence #########
+###########################"""
+def clamp_day(year, month, day):
+    """return the day or the last day of the month if the month is shorter"""
+    return min(day, calendar.monthrange(year, month)[1])
+
+
+def check_reminder_time(hour, minute, day=None, month=None, year=None):
+    """raise DateNotifierError if a part of the reminder time is out of range or a date part is missing"""
+    for part, value, low, high in (("hour", hour, 0, 23), ("minute", minute, 0, 59), ("day", day, 1, 31), ("month", month, 1, 12), ("year", year, 1000, 9999)):
+        if not value is None and not low <= value <= high:
+            raise DateNotifierError("the reminder " + part + " must be between " + str(low) + " and " + str(high))
+    if hour is None or minute is None:
+        raise DateNotifierError("a reminder requires an hour and a minute")
+    if not month is None and day is None:
+        raise DateNotifierError("a reminder with a month requires a day")
+    if not year is None and (month is None or day is None):
+        raise DateNotifierError("a reminder with a year requires a month and a day")
+
+
+class DateNotifierRecurrence(object):
+    """the occurrences of a daily, monthly, yearly or one time reminder"""
+    def __init__(self, recurrence, hour, minute, day=None, month=None, year=None):
+        """initialize the recurrence, day is required for monthly, day and month for yearly and all for on date"""
+        check_reminder_time(hour, minute, day, month, year)
+        self._recurrence = recurrence
+        self._hour = hour
+        self._minute = minute
+        self._day = day
+        self._month = month
+        self._year = year
+
+    @property
+    def recurrence(self):
+        """return the recurrence type"""
+        return self._recurrence
+
+    def occurrence_after(self, after):
+        """return the first occurrence at or after the given datetime, None if a one time reminder has passed"""
+        if self._recurrence == RECURRENCE_DAILY:
+            occurrence = after.replace(hour=self._hour, minute=self._minute, second=0, microsecond=0)
+            if occurrence < after:
+                occurrence += datetime.timedelta(days=1)
+            return occurrence
+
+        if self._recurrence == RECURRENCE_MONTHLY:
+            year, month = after.year, after.month
+            occurrence = self._build(year, month)
+            if occurrence < after:
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                occurrence = self._build(year, month)
+            return occurrence
+
+        if self._recurrence == RECURRENCE_YEARLY:
+            occurrence = self._build(after.year, self._month)
+            if occurrence < after:
+                occurrence = self._build(after.year + 1, self._month)
+            return occurrence
+
+        occurrence = self._build(self._year, self._month)
+        return occurrence if occurrence >= after else None
+
+    def fire_time_after(self, days_notice, after):
+        """return the first fire time at or after the given datetime of the notice sent days_notice days before an occurrence"""
+        notice = datetime.timedelta(days=days_notice)
+        occurrence = self.occurrence_after(after + notice)
+        return None if occurrence is None else occurrence - notice
+
+    def _build(self, year, month):
+        """return the occurrence in the month"""
+        return datetime.datetime(year, month, clamp_day(year, month, self._day), self._hour, self._minute)
+
+"""###########################
+########### Batch ############
+###########################"""
+def batch_messages(messages, limit):
+    """return the messages one per line, no more than limit of them followed by a summary of the rest"""
+    lines = list(messages[:limit])
+    if len(messages) > limit:
+        lines.append(BATCH_OVERFLOW_FORMAT.format(len(messages) - limit))
+    return "\n".join(lines)
+
+
+def batch_by_notifier(notices, limit):
+    """return the batched message of each notifier in the order the notifiers first appear, notices are (notifier, message) pairs"""
+    batches = OrderedDict()
+    for notifier, message in notices:
+        batches.setdefault(notifier, []).append(message)
+    return OrderedDict((notifier, batch_messages(messages, limit)) for notifier, messages in batches.items())
+
+"""###########################
+######### Scheduler ##########
+###########################"""
+class DateNotifierScheduler(object):
+    """index of the reminders by fire minute with a min heap of the minutes, a key is scheduled at most once"""
+    def __init__(self):
+        """initialize the scheduler"""
+        self._heap = []
+        self._minutes = {}
+        self._entries = {}
+
+    def __len__(self):
+        """return the number of scheduled keys"""
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """return true if the key is scheduled"""
+        return key in self._entries
+
+    def add(self, fire_time, key):
+        """schedule a key at the minute of fire_time, replacing its previous fire time"""
+        self.remove(key)
+        minute = fire_time.replace(second=0, microsecond=0)
+        keys = self._minutes.get(minute)
+        if keys is None:
+            """the keys of a minute are kept in the order they were added"""
+            keys = self._minutes[minute] = {}
+            heapq.heappush(self._heap, minute)
+            self._compact()
+        keys[key] = None
+        self._entries[key] = minute
+
+    def remove(self, key):
+        """unschedule a key, return true if it was scheduled"""
+        minute = self._entries.pop(key, None)
+        if minute is None:
+            return False
+        keys = self._minutes[minute]
+        del keys[key]
+        if not keys:
+            del self._minutes[minute]
+            self._compact()
+        return True
+
+    def fire_time(self, key):
+        """return the fire minute of a key or None"""
+        return self._entries.get(key)
+
+    def next_fire_time(self):
+        """return the earliest fire minute or None"""
+        self._drop_removed()
+        return self._heap[0] if self._heap else None
+
+    def pop_due(self, now):
+        """unschedule and return the keys due at now, earliest first"""
+        due = []
+        self._drop_removed()
+        while self._heap and self._heap[0] <= now:
+            keys = self._minutes.pop(heapq.heappop(self._heap), None)
+            if keys:
+                for key in keys:
+                    del self._entries[key]
+                due.extend(keys)
+            self._drop_removed()
+        return due
+
+    def _drop_removed(self):
+        """pop the emptied minutes off the top of the heap"""
+        while self._heap and not self._heap[0] in self._minutes:
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        """rebuild the heap once most of it is emptied minutes"""
+        if len(self._heap) > 2 * len(self._minutes) + 64:
+            self._heap = list(self._minutes)
+            heapq.heapify(self._heap)
+
+"""###########################
+######## State Store #########
+###########################"""
+class DateNotifierStateStore(object):
+    """the last fired and next fire times of the reminders notices by slug, persisted in a json file"""
+    def __init__(self, path):
+        """initialize the empty store"""
+        self._path = path
+        self._state = {}
+        self._lock = threading.Lock()
+        self._queued = None
+        self._writing = False
+
+    @property
+    def slugs(self):
+        """return the stored slugs"""
+        return list(self._state)
+
+    def load(self):
+        """blocking, read the state file once, a missing or corrupted file leaves the store empty"""
+        try:
+            with open(self._path) as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            _LOGGER.warning("failed to read the state file " + self._path + ", starting over")
+            return
+        if isinstance(state, dict):
+            self._state = {slug: record for slug, record in state.items() if isinstance(record, dict)}
+
+    def dump(self):
+        """return the state as json text, for writing it outside the event loop"""
+        return json.dumps(self._state, sort_keys=True)
+
+    def queue(self):
+        """queue a dump of the state for writing, return true if a writer has to be started for write_queued"""
+        text = self.dump()
+        with self._lock:
+            self._queued = text
+            if self._writing:
+                return False
+            self._writing = True
+            return True
+
+    def write_queued(self):
+        """blocking, the single writer, write the queued dumps in order until none is left so the latest one lands last"""
+        while True:
+            with self._lock:
+                text, self._queued = self._queued, None
+                if text is None:
+                    self._writing = False
+                    return
+            try:
+                self.write(text)
+            except OSError:
+                _LOGGER.error("failed to write the state file " + traceback.format_exc())
+
+    def write(self, text):
+        """blocking, replace the state file with the dumped text"""
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "w") as state_file:
+            state_file.write(text)
+        os.replace(temp_path, self._path)
+
+    def last_fired(self, slug, days_notice):
+        """return the last time the notice fired or None"""
+        return self._get(slug, STATE_LAST_FIRED, days_notice)
+
+    def next_fire_time(self, slug, days_notice):
+        """return the stored next fire time of the notice or None"""
+        return self._get(slug, STATE_NEXT_FIRE, days_notice)
+
+    def missed(self, slug, days_notice, now):
+        """return the stored next fire time of the notice if it passed before now without firing, else None, a notice
+        whose occurrence falls on a day before now's day isn't missed anymore, its event already passed"""
+        next_fire = self.next_fire_time(slug, days_notice)
+        if next_fire is None or next_fire >= now or (next_fire + datetime.timedelta(days=days_notice)).date() < now.date():
+            return None
+        last_fired = self.last_fired(slug, days_notice)
+        return next_fire if last_fired is None or last_fired < next_fire else None
+
+    def fired(self, slug, days_notice, fire_time):
+        """record the notice fired at fire_time, None forgets it"""
+        self._set(slug, STATE_LAST_FIRED, days_notice, fire_time)
+
+    def scheduled(self, slug, days_notice, fire_time):
+        """record the next fire time of the notice, None when it won't fire again"""
+        self._set(slug, STATE_NEXT_FIRE, days_notice, fire_time)
+
+    def remove(self, slug):
+        """forget a reminder"""
+        self._state.pop(slug, None)
+
+    def _get(self, slug, field, days_notice):
+        """return a stored time or None"""
+        value = self._state.get(slug, {}).get(field, {}).get(str(days_notice))
+        if value is None:
+            return None
+        try:
+            return datetime.datetime.strptime(value, STATE_TIME_FORMAT)
+        except (TypeError, ValueError):
+            return None
+
+    def _set(self, slug, field, days_notice, fire_time):
+        """store a time, None removes it"""
+        times = self._state.setdefault(slug, {}).setdefault(field, {})
+        if fire_time is None:
+            times.pop(str(days_notice), None)
+        else:
+            times[str(days_notice)] = fire_time.strftime(STATE_TIME_FORMAT)
+
+"""###########################
+######### Reminders ##########
+###########################"""
+class DateNotifierError(Exception):
+    """a reminder time is invalid or a reminder slug already exists or doesn't exist"""
+    pass
+
+
+class DateNotifierReminders(object):
+    """the reminders by slug, their notices in the scheduler and their fire times in the state store
+
+    a reminder has a slug, a notices list of days_notice and the next_fire_time(days_notice, after) and
+    fires_at(days_notice, fire_time) methods, the times are naive minutes"""
+    def __init__(self, store):
+        """initialize the registry on a loaded state store"""
+        self._store = store
+        self._scheduler = DateNotifierScheduler()
+        self._reminders = {}
+
+    def __len__(self):
+        """return the number of reminders"""
+        return len(self._reminders)
+
+    def __contains__(self, slug):
+        """return true if a reminder has the slug"""
+        return slug in self._reminders
+
+    def get(self, slug):
+        """return the reminder with the slug or None"""
+        return self._reminders.get(slug)
+
+    def fire_time(self, reminder, days_notice):
+        """return the fire time of a reminder notice or None"""
+        return self._scheduler.fire_time((reminder, days_notice))
+
+    def next_fire_time(self):
+        """return the earliest fire time or None"""
+        return self._scheduler.next_fire_time()
+
+    def add(self, reminder, now):
+        """schedule a new reminder, reusing its stored fire times and catching up on its latest notice missed before now"""
+        if reminder.slug in self._reminders:
+            raise DateNotifierError("reminder " + reminder.slug + " already exists")
+        self._reminders[reminder.slug] = reminder
+        """only the latest missed notice is caught up on"""
+        missed = [days_notice for days_notice in reminder.notices if reminder.fires_at(days_notice, self._store.missed(reminder.slug, days_notice, now))]
+        for days_notice in reminder.notices:
+            stored = self._store.next_fire_time(reminder.slug, days_notice)
+            if missed and days_notice == min(missed):
+                _LOGGER.info("catching up on the missed reminder " + reminder.slug)
+                fire_time = now
+            elif not stored is None and stored >= now and reminder.fires_at(days_notice, stored):
+                fire_time = stored
+            else:
+                """a notice that already fired at now is scheduled from the next minute"""
+                last_fired = self._store.last_fired(reminder.slug, days_notice)
+                after = now if last_fired is None or last_fired < now else last_fired + datetime.timedelta(minutes=1)
+                fire_time = reminder.next_fire_time(days_notice, after)
+            self._schedule(reminder, days_notice, fire_time)
+
+    def replace(self, reminder, now):
+        """swap the reminder with the same slug for the new one scheduled from now, return the old reminder, the last
+        fired times of the notices kept by the new reminder are kept"""
+        old_reminder = self._unschedule(reminder.slug)
+        for days_notice in old_reminder.notices:
+            self._store.scheduled(reminder.slug, days_notice, None)
+            if not days_notice in reminder.notices:
+                self._store.fired(reminder.slug, days_notice, None)
+        self.add(reminder, now)
+        return old_reminder
+
+    def update(self, slug, build, now):
+        """build the updated reminder from the current one and swap it in, return the (old, new) reminders, the current
+        reminder stays scheduled if build raises"""
+        old_reminder = self._reminders.get(slug)
+        if old_reminder is None:
+            raise DateNotifierError("reminder " + slug + " doesn't exist")
+        reminder = build(old_reminder)
+        self.replace(reminder, now)
+        return old_reminder, reminder
+
+    def remove(self, slug):
+        """unschedule and forget a reminder, return it"""
+        reminder = self._unschedule(slug)
+        self._store.remove(slug)
+        return reminder
+
+    def fire_due(self, now):
+        """pop the notices due at now, record them fired and roll them forward, return the (reminder, days_notice) fired"""
+        calc_date = now.replace(second=0, microsecond=0)
+        due = self._scheduler.pop_due(now)
+        for reminder, days_notice in due:
+            self._store.fired(reminder.slug, days_notice, calc_date)
+            """rolling the reminder forward to its next occurrence"""
+            self._schedule(reminder, days_notice, reminder.next_fire_time(days_notice, calc_date + datetime.timedelta(minutes=1)))
+        return due
+
+    def _unschedule(self, slug):
+        """forget a reminder and remove its notices from the scheduler, return it"""
+        reminder = self._reminders.pop(slug, None)
+        if reminder is None:
+            raise DateNotifierError("reminder " + slug + " doesn't exist")
+        for days_notice in reminder.notices:
+            self._scheduler.remove((reminder, days_notice))
+        return reminder
+
+    def _schedule(self, reminder, days_notice, fire_time):
+        """schedule and store a notice fire time, None when it won't fire again"""
+        self._store.scheduled(reminder.slug, days_notice, fire_time)
+        if not fire_time is None:
+            self._scheduler.add(fire_time, (reminder, days_notice))
@@ -0,0 +1,374 @@
+import datetime
+import os
+import random
+import tempfile
+
+import date_notifier_util
+
+START = datetime.datetime(2018, 1, 1, 0, 0)
+
+
+def occurrences(rule, after, count, days_notice=0):
+  fire_times = []
+  for _ in range(count):
+    fire_time = rule.fire_time_after(days_notice, after)
+    if fire_time is None:
+      break
+    fire_times.append(fire_time)
+    after = fire_time + datetime.timedelta(minutes=1)
+  return fire_times
+
+
+def test_daily_recurrence():
+  rule = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_DAILY, 21, 28)
+  assert rule.occurrence_after(datetime.datetime(2018, 5, 1, 21, 28)) == datetime.datetime(2018, 5, 1, 21, 28)
+  assert rule.occurrence_after(datetime.datetime(2018, 5, 1, 21, 29)) == datetime.datetime(2018, 5, 2, 21, 28)
+  # rolling every day across the leap day and the years
+  fire_times = occurrences(rule, datetime.datetime(2019, 12, 31, 22, 0), 3 * 365 + 1)
+  assert fire_times[0] == datetime.datetime(2020, 1, 1, 21, 28)
+  assert datetime.datetime(2020, 2, 29, 21, 28) in fire_times
+  assert fire_times[-1] == datetime.datetime(2022, 12, 31, 21, 28)
+  assert all(later - earlier == datetime.timedelta(days=1) for earlier, later in zip(fire_times, fire_times[1:]))
+
+
+def test_monthly_recurrence():
+  rule = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_MONTHLY, 8, 0, day=31)
+  fire_times = occurrences(rule, datetime.datetime(2019, 1, 31, 9, 0), 14)
+  # short months fall on their last day
+  assert [fire_time.date() for fire_time in fire_times[:4]] == [
+    datetime.date(2019, 2, 28), datetime.date(2019, 3, 31), datetime.date(2019, 4, 30), datetime.date(2019, 5, 31)]
+  assert fire_times[11].date() == datetime.date(2020, 1, 31) and fire_times[12].date() == datetime.date(2020, 2, 29)
+  assert len(set(fire_time.month for fire_time in fire_times[:12])) == 12
+  # a notice crossing the month and year boundaries
+  rule = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_MONTHLY, 8, 0, day=2)
+  assert occurrences(rule, datetime.datetime(2019, 12, 5), 3, days_notice=3) == [
+    datetime.datetime(2019, 12, 30, 8, 0), datetime.datetime(2020, 1, 30, 8, 0), datetime.datetime(2020, 2, 28, 8, 0)]
+
+
+def test_yearly_recurrence():
+  leap_day = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_YEARLY, 9, 30, day=29, month=2)
+  assert [fire_time.date() for fire_time in occurrences(leap_day, datetime.datetime(2019, 1, 1), 6)] == [
+    datetime.date(2019, 2, 28), datetime.date(2020, 2, 29), datetime.date(2021, 2, 28),
+    datetime.date(2022, 2, 28), datetime.date(2023, 2, 28), datetime.date(2024, 2, 29)]
+  # a notice two days before a new year's event fires in the previous year
+  new_year = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_YEARLY, 0, 0, day=1, month=1)
+  assert occurrences(new_year, datetime.datetime(2018, 6, 1), 3, days_notice=2) == [
+    datetime.datetime(2018, 12, 30), datetime.datetime(2019, 12, 30), datetime.datetime(2020, 12, 30)]
+  # the occurrence of the current year is kept until it passes
+  rule = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_YEARLY, 21, 26, day=21, month=11)
+  assert rule.occurrence_after(datetime.datetime(2018, 11, 21, 21, 26)) == datetime.datetime(2018, 11, 21, 21, 26)
+  assert rule.occurrence_after(datetime.datetime(2018, 11, 21, 21, 27)) == datetime.datetime(2019, 11, 21, 21, 26)
+
+
+def test_on_date_recurrence():
+  rule = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_ON_DATE, 21, 25, day=20, month=11, year=2017)
+  assert occurrences(rule, datetime.datetime(2017, 1, 1), 5, days_notice=1) == [datetime.datetime(2017, 11, 19, 21, 25)]
+  assert rule.fire_time_after(1, datetime.datetime(2017, 11, 19, 21, 26)) is None
+  assert date_notifier_util.clamp_day(2100, 2, 29) == 28 and date_notifier_util.clamp_day(2000, 2, 30) == 29
+
+
+def test_scheduler_order():
+  scheduler = date_notifier_util.DateNotifierScheduler()
+  assert scheduler.next_fire_time() is None and scheduler.pop_due(START) == []
+  scheduler.add(START + datetime.timedelta(minutes=5), "b")
+  scheduler.add(START + datetime.timedelta(minutes=1), "a")
+  scheduler.add(START + datetime.timedelta(minutes=5), "c")
+  assert len(scheduler) == 3 and "a" in scheduler
+  assert scheduler.next_fire_time() == START + datetime.timedelta(minutes=1)
+  assert scheduler.pop_due(START) == []
+  assert scheduler.pop_due(START + datetime.timedelta(minutes=1)) == ["a"]
+  # keys due at the same time are popped in the order they were added
+  assert scheduler.pop_due(START + datetime.timedelta(hours=1)) == ["b", "c"]
+  assert len(scheduler) == 0 and scheduler.next_fire_time() is None
+
+
+def test_scheduler_reschedule_and_remove():
+  scheduler = date_notifier_util.DateNotifierScheduler()
+  scheduler.add(START + datetime.timedelta(minutes=1), "a")
+  scheduler.add(START + datetime.timedelta(minutes=2), "b")
+  # rescheduling replaces the previous fire time
+  scheduler.add(START + datetime.timedelta(minutes=3), "a")
+  assert scheduler.fire_time("a") == START + datetime.timedelta(minutes=3)
+  assert scheduler.next_fire_time() == START + datetime.timedelta(minutes=2)
+  assert scheduler.remove("b") and not scheduler.remove("b")
+  assert scheduler.pop_due(START + datetime.timedelta(minutes=2)) == []
+  assert scheduler.pop_due(START + datetime.timedelta(minutes=3)) == ["a"]
+
+
+def test_scheduler_minute_index():
+  scheduler = date_notifier_util.DateNotifierScheduler()
+  for key in range(100):
+    scheduler.add(START + datetime.timedelta(minutes=key % 4, seconds=key % 60), key)
+  # the keys are indexed by their fire minute
+  assert scheduler.fire_time(5) == START + datetime.timedelta(minutes=1)
+  assert len(scheduler._heap) == 4
+  for key in range(0, 100, 4):
+    scheduler.remove(key)
+  # the emptied minute is skipped and can be scheduled again
+  assert scheduler.next_fire_time() == START + datetime.timedelta(minutes=1)
+  scheduler.add(START, "a")
+  assert scheduler.next_fire_time() == START
+  assert scheduler.pop_due(START + datetime.timedelta(seconds=59)) == ["a"]
+  assert scheduler.pop_due(START + datetime.timedelta(minutes=1)) == list(range(1, 100, 4))
+  assert len(scheduler) == 50
+
+
+def test_scheduler_thousands():
+  generator = random.Random(1)
+  scheduler = date_notifier_util.DateNotifierScheduler()
+  fire_times = {}
+  for key in range(5000):
+    fire_times[key] = START + datetime.timedelta(minutes=generator.randrange(60 * 24 * 365))
+    scheduler.add(fire_times[key], key)
+  for key in range(0, 5000, 2):
+    scheduler.remove(key)
+  # the removed entries don't pile up in the heap
+  for _ in range(3):
+    for key in range(1, 5000, 2):
+      scheduler.add(fire_times[key], key)
+  assert len(scheduler._heap) <= 2 * len(scheduler) + 64
+  popped = scheduler.pop_due(START + datetime.timedelta(days=365))
+  assert sorted(popped) == list(range(1, 5000, 2))
+  assert [fire_times[key] for key in popped] == sorted(fire_times[key] for key in popped)
+
+
+class FakeReminder(object):
+  def __init__(self, slug, rule, notices):
+    self.slug = slug
+    self.rule = rule
+    self.notices = notices
+
+  def next_fire_time(self, days_notice, after):
+    return self.rule.fire_time_after(days_notice, after)
+
+  def fires_at(self, days_notice, fire_time):
+    return not fire_time is None and self.rule.fire_time_after(days_notice, fire_time) == fire_time
+
+
+def daily(slug, hour):
+  return FakeReminder(slug, date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_DAILY, hour, 0), [0])
+
+
+def yearly_countdown(slug, days_notice):
+  rule = date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_YEARLY, 9, 0, day=10, month=1)
+  return FakeReminder(slug, rule, list(range(days_notice, -1, -1)))
+
+
+def test_reminders_add_update_remove():
+  with tempfile.TemporaryDirectory() as directory:
+    store = date_notifier_util.DateNotifierStateStore(os.path.join(directory, '.date_notifier.json'))
+    reminders = date_notifier_util.DateNotifierReminders(store)
+    other = daily('other', 8)
+    reminders.add(other, START)
+    reminders.add(yearly_countdown('birthday', 2), START)
+    birthday = reminders.get('birthday')
+    assert len(reminders) == 2 and 'birthday' in reminders
+    assert [reminders.fire_time(birthday, days_notice) for days_notice in (2, 1, 0)] == [
+      datetime.datetime(2018, 1, 8, 9), datetime.datetime(2018, 1, 9, 9), datetime.datetime(2018, 1, 10, 9)]
+    assert store.next_fire_time('birthday', 2) == datetime.datetime(2018, 1, 8, 9)
+    # a duplicate slug is refused and the existing reminder is kept
+    try:
+      reminders.add(daily('birthday', 7), START)
+      assert False
+    except date_notifier_util.DateNotifierError:
+      pass
+    assert reminders.get('birthday') is birthday
+
+    # updating swaps in the new reminder and its notices only
+    updated = yearly_countdown('birthday', 0)
+    assert reminders.replace(updated, START) is birthday
+    assert reminders.get('birthday') is updated
+    assert reminders.fire_time(birthday, 2) is None and reminders.fire_time(updated, 0) == datetime.datetime(2018, 1, 10, 9)
+    assert store.next_fire_time('birthday', 2) is None and store.next_fire_time('birthday', 0) == datetime.datetime(2018, 1, 10, 9)
+    assert reminders.fire_time(other, 0) == datetime.datetime(2018, 1, 1, 8) and store.next_fire_time('other', 0) == datetime.datetime(2018, 1, 1, 8)
+
+    # removing unschedules and forgets the reminder only
+    assert reminders.remove('birthday') is updated
+    assert 'birthday' not in reminders and reminders.fire_time(updated, 0) is None and 'birthday' not in store.slugs
+    assert reminders.next_fire_time() == datetime.datetime(2018, 1, 1, 8) and store.slugs == ['other']
+    # a missing slug is refused
+    for call in (lambda: reminders.remove('birthday'), lambda: reminders.replace(daily('birthday', 7), START)):
+      try:
+        call()
+        assert False
+      except date_notifier_util.DateNotifierError:
+        pass
+    assert len(reminders) == 1 and 'birthday' not in reminders
+
+
+def test_reminders_update_after_firing():
+  with tempfile.TemporaryDirectory() as directory:
+    store = date_notifier_util.DateNotifierStateStore(os.path.join(directory, '.date_notifier.json'))
+    reminders = date_notifier_util.DateNotifierReminders(store)
+    reminders.add(daily('news', 8), START)
+    fire_time = datetime.datetime(2018, 1, 1, 8)
+    assert len(reminders.fire_due(fire_time)) == 1
+    # updating the reminder in the minute it fired doesn't fire it again
+    updated = daily('news', 8)
+    reminders.replace(updated, fire_time)
+    assert store.last_fired('news', 0) == fire_time
+    assert reminders.fire_time(updated, 0) == datetime.datetime(2018, 1, 2, 8)
+    assert reminders.fire_due(fire_time) == []
+    # moving it later in the same day schedules it today
+    later = daily('news', 9)
+    reminders.replace(later, fire_time)
+    assert reminders.fire_time(later, 0) == datetime.datetime(2018, 1, 1, 9)
+    # the last fired times of the dropped notices are forgotten
+    countdown = yearly_countdown('news', 1)
+    reminders.replace(countdown, fire_time)
+    assert store.last_fired('news', 0) == fire_time and store.last_fired('news', 1) is None
+    reminders.replace(FakeReminder('news', countdown.rule, [1]), fire_time)
+    assert store.last_fired('news', 0) is None
+
+
+def reminder_from_config(slug, config):
+  recurrence = date_notifier_util.RECURRENCE_DAILY
+  for key, key_recurrence in (('day', date_notifier_util.RECURRENCE_MONTHLY), ('month', date_notifier_util.RECURRENCE_YEARLY), ('year', date_notifier_util.RECURRENCE_ON_DATE)):
+    if not config.get(key) is None:
+      recurrence = key_recurrence
+  rule = date_notifier_util.DateNotifierRecurrence(recurrence, config['hour'], config['minute'], config.get('day'), config.get('month'), config.get('year'))
+  return FakeReminder(slug, rule, [config.get('days_notice', 0)])
+
+
+def test_check_reminder_time():
+  date_notifier_util.check_reminder_time(0, 0)
+  date_notifier_util.check_reminder_time(23, 59, 31, 12, 9999)
+  invalid = [(24, 0), (0, 60), (-1, 0), (0, 0, 0), (0, 0, 32), (0, 0, 1, 13), (0, 0, None, 1), (0, 0, 1, None, 2018), (0, 0, None, 1, 2018),
+             (0, 0, 1, 1, 999), (None, 0)]
+  for parts in invalid:
+    for check in (date_notifier_util.check_reminder_time, lambda *parts: date_notifier_util.DateNotifierRecurrence(date_notifier_util.RECURRENCE_DAILY, *parts)):
+      try:
+        check(*parts)
+        assert False, parts
+      except date_notifier_util.DateNotifierError:
+        pass
+
+
+def test_reminders_invalid_update():
+  with tempfile.TemporaryDirectory() as directory:
+    store = date_notifier_util.DateNotifierStateStore(os.path.join(directory, '.date_notifier.json'))
+    reminders = date_notifier_util.DateNotifierReminders(store)
+    config = {'hour': 9, 'minute': 0, 'day': 10, 'month': 1, 'days_notice': 1}
+    birthday = reminder_from_config('birthday', config)
+    reminders.add(birthday, START)
+    fire_time = datetime.datetime(2018, 1, 9, 9)
+    assert reminders.fire_time(birthday, 1) == fire_time
+
+    def merged(changes):
+      return lambda old_reminder: reminder_from_config(old_reminder.slug, dict(config, **changes))
+
+    # a year without a month, a month without a day and hour 24 are refused, the old reminder stays scheduled unchanged
+    for changes in ({'month': None, 'year': 2019}, {'day': None}, {'hour': 24}):
+      try:
+        reminders.update('birthday', merged(changes), START)
+        assert False, changes
+      except date_notifier_util.DateNotifierError:
+        pass
+      assert reminders.get('birthday') is birthday and reminders.fire_time(birthday, 1) == fire_time
+      assert reminders.next_fire_time() == fire_time and store.next_fire_time('birthday', 1) == fire_time
+    assert len(reminders) == 1
+
+    # a valid update swaps the reminder
+    old_reminder, updated = reminders.update('birthday', merged({'hour': 10}), START)
+    assert old_reminder is birthday and reminders.get('birthday') is updated
+    assert reminders.fire_time(birthday, 1) is None and reminders.fire_time(updated, 1) == datetime.datetime(2018, 1, 9, 10)
+    try:
+      reminders.update('missing', merged({}), START)
+      assert False
+    except date_notifier_util.DateNotifierError:
+      pass
+
+
+def test_reminders_fire_and_catch_up():
+  with tempfile.TemporaryDirectory() as directory:
+    store = date_notifier_util.DateNotifierStateStore(os.path.join(directory, '.date_notifier.json'))
+    reminders = date_notifier_util.DateNotifierReminders(store)
+    reminder = yearly_countdown('birthday', 2)
+    reminders.add(reminder, START)
+    # firing rolls the notice forward to the next year
+    assert reminders.fire_due(datetime.datetime(2018, 1, 8, 9, 0, 30)) == [(reminder, 2)]
+    assert reminders.fire_time(reminder, 2) == datetime.datetime(2019, 1, 8, 9)
+    assert store.last_fired('birthday', 2) == datetime.datetime(2018, 1, 8, 9)
+    # after a restart the day before the event, only the latest missed notice is caught up on
+    restarted = date_notifier_util.DateNotifierReminders(store)
+    now = datetime.datetime(2018, 1, 9, 20, 0)
+    restarted.add(yearly_countdown('birthday', 2), now)
+    birthday = restarted.get('birthday')
+    assert [restarted.fire_time(birthday, days_notice) for days_notice in (2, 1, 0)] == [
+      datetime.datetime(2019, 1, 8, 9), now, datetime.datetime(2018, 1, 10, 9)]
+
+
+def test_batch_messages():
+  assert date_notifier_util.batch_messages(["a is due today."], 3) == "a is due today."
+  assert date_notifier_util.batch_messages(["a", "b", "c"], 3) == "a\nb\nc"
+  assert date_notifier_util.batch_messages(["a", "b", "c", "d", "e"], 3) == "a\nb\nc\nand 2 more reminders."
+
+
+def test_batch_by_notifier():
+  notices = [("phone", "a"), ("tablet", "x"), ("phone", "b"), ("phone", "c"), ("tablet", "y"), ("phone", "d"), ("phone", "e")]
+  batches = date_notifier_util.batch_by_notifier(notices, 3)
+  # one message per notifier, the limit applies to each notifier's message
+  assert list(batches) == ["phone", "tablet"]
+  assert batches["phone"] == "a\nb\nc\nand 2 more reminders."
+  assert batches["tablet"] == "x\ny"
+  assert date_notifier_util.batch_by_notifier([], 3) == {}
+
+
+def test_state_store():
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, '.date_notifier.json')
+    store = date_notifier_util.DateNotifierStateStore(path)
+    store.load()
+    assert store.slugs == [] and store.next_fire_time('daily', 0) is None
+    store.fired('daily', 0, START)
+    store.scheduled('daily', 0, START + datetime.timedelta(days=1))
+    store.scheduled('yearly', 2, START + datetime.timedelta(days=30))
+    store.write(store.dump())
+    # a new store reads back the fire times
+    store = date_notifier_util.DateNotifierStateStore(path)
+    store.load()
+    assert sorted(store.slugs) == ['daily', 'yearly']
+    assert store.last_fired('daily', 0) == START
+    assert store.next_fire_time('daily', 0) == START + datetime.timedelta(days=1)
+    # a stored fire time passed without firing is missed
+    assert store.missed('daily', 0, START + datetime.timedelta(days=1)) is None
+    assert store.missed('daily', 0, START + datetime.timedelta(days=1, hours=12)) == START + datetime.timedelta(days=1)
+    assert store.missed('daily', 0, START + datetime.timedelta(days=2)) is None
+    store.fired('daily', 0, START + datetime.timedelta(days=1))
+    assert store.missed('daily', 0, START + datetime.timedelta(days=1, hours=12)) is None
+    # a notice whose occurrence's day passed too isn't missed anymore
+    store.scheduled('notice', 2, START)
+    assert store.missed('notice', 2, START + datetime.timedelta(days=2, hours=23)) == START
+    assert store.missed('notice', 2, START + datetime.timedelta(days=3)) is None
+    store.remove('notice')
+    store.scheduled('yearly', 2, None)
+    store.remove('daily')
+    assert store.next_fire_time('yearly', 2) is None and store.slugs == ['yearly']
+    # queued states are written by a single writer, the latest one last
+    store.scheduled('yearly', 2, START)
+    assert store.queue()
+    store.scheduled('yearly', 2, START + datetime.timedelta(days=365))
+    assert not store.queue()
+    store.write_queued()
+    assert store.queue()
+    store.write_queued()
+    reloaded = date_notifier_util.DateNotifierStateStore(path)
+    reloaded.load()
+    assert reloaded.next_fire_time('yearly', 2) == START + datetime.timedelta(days=365)
+    # a corrupted file leaves the store empty
+    with open(path, 'w') as state_file:
+      state_file.write('{"daily": ')
+    store = date_notifier_util.DateNotifierStateStore(path)
+    store.load()
+    assert store.slugs == []
+
+
+def main():
+  for name, test in sorted(globals().items()):
+    if name.startswith('test_') and callable(test):
+      test()
+      print(name, 'OK')
+
+
+if __name__ == '__main__':
+  main()
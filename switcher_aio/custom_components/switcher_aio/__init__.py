@@ -6,6 +6,8 @@ Please visit https://github.com/TomerFi/home-assistant-custom-components for mor
 Installation notes:
 place this file and the services.xml file in the following folder and restart home assistant:
 /config/custom_components/switcher_aio/
+place switcher_v2_protocol.py from the switcher_v2_protocol folder in the following folder:
+/config/custom_components
 
 If an error occures, raise the log level to debug mode and analyze the logs, for example:
 logger:
@@ -30,14 +32,12 @@ switcher_aio:
   create_groups: true/false (default is true)
   schedules_scan_interval:
     minutes: 5 (default is 5)
+  capture_file: switcher.cap (optional, records the raw device traffic for replaying with switcher_v2_protocol.py)
 
 ////////////////////////////////////////////////////////////////////////////////////////////////"""
 import asyncio
 import logging
 
-import binascii as ba
-import time
-from struct import pack
 import re
 import socket
 import datetime
@@ -66,6 +66,15 @@ from homeassistant.components.input_text import DOMAIN as INPUT_TEXT_DOMAIN, MOD
 from homeassistant.components.group import DOMAIN as GROUP_DOMAIN, ENTITY_ID_FORMAT as GROUP_ENTITY_ID_FORMAT
 from homeassistant.components.notify import DOMAIN as NOTIFY_DOMAIN
 
+from custom_components.switcher_v2_protocol import (SUNDAY, MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, ALL_DAYS, WEEKDAY_TUP,
+    REMOTE_SESSION_ID, SOCKET_BIND_TUP, COMMAND_ON, COMMAND_OFF, NO_TIMER_REQUESTED, ENABLE_SCHEDULE, DISABLE_SCHEDULE, DAYS_INT_DICT,
+    LOGIN_PACKET, GET_STATE_PACKET, SEND_CONTROL_PACKET, SET_AUTO_OFF_PACKET, UPDATE_DEVICE_NAME_PACKET, GET_SCHEDULES_PACKET, DELETE_SCHEDULE_PACKET,
+    DISABLE_ENABLE_SCHEDULE_PACKET, CREATE_SCHEDULE_PACKET, build_packet, send_packet, get_timestamp, get_socket, close_socket_connection,
+    convert_minutes_to_timer, convert_timedelta_to_auto_off, convert_string_to_device_name, convert_timedelta_to_schedule_time, start_capture,
+    capture_broadcast, SwitcherV2BroadcastMSG, SwitcherV2LoginResponseMSG, SwitcherV2StateResponseMSG, SwitcherV2ControlResponseMSG,
+    SwitcherV2SetAutoOffResponseMSG, SwitcherV2UpdateNameResponseMSG, SwitcherV2GetScheduleResponseMSG, SwitcherV2DisableEnableScheduleResponseMSG,
+    SwitcherV2DeleteScheduleResponseMSG, SwitcherV2CreateScheduleResponseMSG)
+
 REQUIREMENTS = []
 DEPENDENCIES = [GROUP_DOMAIN]
 _LOGGER = logging.getLogger(__name__)
@@ -107,6 +116,7 @@ CONF_DAYS = "days"
 CONF_CONFIGURED = "configured"
 ATTR_NOT_CONFIGURED = "Not configured"
 CONF_SCHEDULE_ID = "schedule_id"
+CONF_CAPTURE_FILE = "capture_file"
 
 """###############################
 ######### Default Values #########
@@ -116,20 +126,6 @@ DEFAULT_CREATE_GROUPS = True
 DEFAULT_CONF_DAYS = []
 DEFAULT_SCHEDULES_SCAN_INTERVAL = datetime.timedelta(minutes=5)
 
-"""###############################
-####### Weekdays Constants #######
-###############################"""
-SUNDAY = "Sunday"
-MONDAY = "Monday"
-TUESDAY = "Tuesday"
-WEDNESDAY = "Wednesday"
-THURSDAY = "Thursday"
-FRIDAY = "Friday"
-SATURDAY = "Saturday"
-ALL_DAYS = "Every day"
-
-WEEKDAY_TUP = (MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY)
-
 """###############################
 ##### Configuration Schemas ######
 ###############################"""
@@ -140,7 +136,8 @@ CONFIG_SCHEMA = vol.Schema({
         vol.Required(CONF_DEVICE_ID): cv.string,
         vol.Optional(CONF_CREATE_VIEW, default=DEFAULT_CREATE_VIEW): cv.boolean,
         vol.Optional(CONF_CREATE_GROUPS, default=DEFAULT_CREATE_GROUPS): cv.boolean,
-        vol.Optional(CONF_SCHEDULE_SCAN_INTERVAL, default=DEFAULT_SCHEDULES_SCAN_INTERVAL): vol.All(cv.time_period, cv.positive_timedelta)
+        vol.Optional(CONF_SCHEDULE_SCAN_INTERVAL, default=DEFAULT_SCHEDULES_SCAN_INTERVAL): vol.All(cv.time_period, cv.positive_timedelta),
+        vol.Optional(CONF_CAPTURE_FILE): cv.string
         })
 }, extra=vol.ALLOW_EXTRA)
 
@@ -475,183 +472,6 @@ TIMER_TURN_OFF_NOTIFICATION_DATA = {
     "message": "{} has been turned off."
 }
 
-"""###############################
-###### SwitcherV2 Constants ######
-###############################"""
-ENCODING_CODEC = "utf-8"
-REMOTE_SESSION_ID = "00000000"
-REMOTE_KEY = b"00000000000000000000000000000000"
-SOCKET_PORT = 9957
-SOCKET_BIND_TUP = ("0.0.0.0", 20002)
-STATE_RESPONSE_ON = "0100"
-STATE_RESPONSE_OFF = "0000"
-COMMAND_ON = "1"
-COMMAND_OFF = "0"
-NO_TIMER_REQUESTED = "00000000"
-ENABLE_SCHEDULE = "01"
-DISABLE_SCHEDULE = "00"
-DAYS_HEX_DICT = {0x02:MONDAY, 0x04:TUESDAY, 0x08:WEDNESDAY, 0x10:THURSDAY, 0x20:FRIDAY, 0x40:SATURDAY, 0x80:SUNDAY}
-DAYS_INT_DICT = {MONDAY: 2, TUESDAY: 4, WEDNESDAY: 8, THURSDAY: 16, FRIDAY:32, SATURDAY:64, SUNDAY: 128}
-
-"""###############################
-######### Packet Formats #########
-###############################"""
-# remote session id, timestamp, phone id, device password
-LOGIN_PACKET = "fef052000232a100{}340001000000000000000000{}00000000000000000000f0fe1c00{}0000{}00000000000000000000000000000000000000000000000000000000"
-# local session id, timestamp, device id
-GET_STATE_PACKET = "fef0300002320103{}340001000000000000000000{}00000000000000000000f0fe{}00"
-# local session id, timestamp, device id, phone id, device password, command (1/0), timer
-SEND_CONTROL_PACKET = "fef05d0002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}000000000000000000000000000000000000000000000000000000000106000{}00{}"
-# local session id, timestamp, device id, phone id, device password, auto-off seconds
-SET_AUTO_OFF_PACKET = "fef05b0002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000040400{}"
-# local session id, timestamp, device id, phone id, device password, name
-UPDATE_DEVICE_NAME_PACKET = "fef0740002320202{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000{}"
-# local session id, timestamp, device id, phone id, device password
-GET_SCHEDULES_PACKET = "fef0570002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000060000"
-# local session id, timestamp, device id, phone id, device password, schedule id
-DELETE_SCHEDULE_PACKET = "fef0580002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}000000000000000000000000000000000000000000000000000000000801000{}"
-# local session id, timestamp, device id, phone id, device password, schedule data (time_id + on_off + week + timstate + start_time + end_time)
-DISABLE_ENABLE_SCHEDULE_PACKET = "fef0630002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000070c00{}"
-# local session id, timestamp, device id, phone id, device password, schedule data (on_off + week + timstate + start_time + end_time)
-CREATE_SCHEDULE_PACKET = "fef0630002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000030c00ff{}"
-
-"""###############################
-#### Tools Parsers Converters ####
-###############################"""
-
-
-@callback
-def convert_seconds_to_iso_time(all_seconds):
-    """convert seconds to iso time (%H:%M:%S)"""
-    try:
-        minutes, seconds = divmod(int(all_seconds), 60)
-        hours, minutes = divmod(minutes, 60)
-        return datetime.time(hour=hours, minute=minutes, second=seconds).isoformat()
-    except Exception:
-        _LOGGER.exception('failed to create iso time from ' + str(all_seconds) + ' seconds')
-        raise
-
-
-@callback
-def crc_sign_full_packet_com_key(data):
-    """CRC calculation"""
-    try:
-        crc = ba.hexlify(pack('>I', ba.crc_hqx(ba.unhexlify(data), 0x1021))).decode(ENCODING_CODEC)
-        data = data + crc[6:8] + crc[4:6]
-        crc = crc[6:8] + crc[4:6] + (ba.hexlify(REMOTE_KEY)).decode(ENCODING_CODEC)
-        crc = ba.hexlify(pack('>I', ba.crc_hqx(ba.unhexlify(crc), 0x1021))).decode(ENCODING_CODEC)
-        data = data + crc[6:8] + crc[4:6]
-        return data
-    except:
-        _LOGGER.exception('failed to sign crc ' + traceback.format_exc())
-        raise
-
-
-@callback
-def get_timestamp():
-    """Generate timestamp"""
-    try:
-        return ba.hexlify(pack('<I', int(round(time.time())))).decode(ENCODING_CODEC)
-    except Exception:
-        _LOGGER.exception('failed to generate timestamp')
-        raise
-
-
-@callback
-def get_socket(ip_addr):
-    """Connect to socket"""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((ip_addr, SOCKET_PORT))
-        _LOGGER.debug('connected socket to ' + ip_addr)
-        return sock
-    except Exception:
-        _LOGGER.exception('failed to connect socket to ' + ip_addr + traceback.format_exc())
-        raise
-
-
-@callback
-def close_socket_connection(sock, ip_addr):
-    """Close socket"""
-    try:
-        sock.close()
-        _LOGGER.debug('closed socket connection to ' + ip_addr)
-    except Exception:
-        _LOGGER.exception('socket to '+ ip_address + ' is not closable')
-        pass
-
-
-@callback
-def convert_minutes_to_timer(minutes):
-    """convert minutes to hex for timer"""
-    try:
-        return ba.hexlify(pack('<I', int(minutes) * 60)).decode(ENCODING_CODEC)
-    except Exception:
-        _LOGGER.exception('failed to create timer from ' + str(minutes) + ' minutes')
-        raise
-
-
-@callback
-def convert_timedelta_to_auto_off(full_time):
-    """convert timedelta seconds to hex for auto-off"""
-    try:
-        minutes = full_time.total_seconds() / 60
-        hours, minutes = divmod(minutes, 60)
-        seconds = int(hours) * 3600 + int(minutes) * 60
-        if seconds > 3599 and seconds < 86341:
-            return ba.hexlify(pack('<I', int(seconds))).decode(ENCODING_CODEC)
-    except Exception:
-        _LOGGER.exception('failed to create auto-off from' + str(full_time) + 'timedelta')
-        raise
-
-
-@callback
-def convert_string_to_device_name(name):
-    """convert string to device name"""
-    try:
-        return (ba.hexlify(name.encode(ENCODING_CODEC)) + ((32-len(name))*"00").encode(ENCODING_CODEC)).decode(ENCODING_CODEC)
-    except Exception:
-        _LOGGER.exception('failed to convert ' + name + ' to device name')
-        raise
-
-
-@callback
-def get_days_list_from_bytes(data):
-    """extract week days from shcedule bytes"""
-    days_list = []
-    try:
-        for day in DAYS_HEX_DICT:
-            if (day & data  != 0x00):
-                days_list.append(DAYS_HEX_DICT[day])
-        
-        return days_list
-    except Exception:
-        _LOGGER.exception("failed to extract week days from schedule")
-        raise
-
-
-@callback
-def get_time_from_bytes(data):
-    """extract start/end time from shcedule bytes"""
-    try:
-        timeStamp = int(data[6:8] + data[4:6] + data[2:4] + data[0:2] , 16)
-        return time.strftime("%H:%M", time.localtime(timeStamp))
-    except Exception:
-        _LOGGER.exception("failed to extract time from schedule")
-        raise
-
-
-@callback
-def convert_timedelta_to_schedule_time(time_value):
-    """convert timedelta to schedule start/end time"""
-    try:
-        return_time = time.mktime(time.strptime(time.strftime("%d/%m/%Y") + " " + str(time_value).split(":")[0] + ":" + str(time_value).split(":")[1], "%d/%m/%Y %H:%M"))  
-        return ba.hexlify(pack('<I', int(return_time))).decode(ENCODING_CODEC)
-    except Exception:
-        _LOGGER.exception("failed to convert time value to schedule time")
-        raise
-
-
 """############################
 ####### Packet Handlers #######
 ############################"""
@@ -661,13 +481,12 @@ def convert_timedelta_to_schedule_time(time_value):
 def async_send_login_packet(phone_id, device_password, sock, ts, retry=3):
     """Send login packet"""
     try:
-        packet = crc_sign_full_packet_com_key(LOGIN_PACKET.format(REMOTE_SESSION_ID, ts, phone_id, device_password))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2LoginResponseMSG(sock.recv(1024))
+        packet = build_packet(LOGIN_PACKET, REMOTE_SESSION_ID, ts, phone_id, device_password)
+        return SwitcherV2LoginResponseMSG(send_packet(sock, packet))
     except Exception:
         if retry > 0:
             _LOGGER.warning('failed to send login packet, retrying')
-            return async_send_login_packet(phone_id, device_password, sock, ts, retry - 1)
+            return (yield from async_send_login_packet(phone_id, device_password, sock, ts, retry - 1))
         else:
             _LOGGER.error('failed to send login packet ' + traceback.format_exc())
             raise
@@ -677,9 +496,8 @@ def async_send_login_packet(phone_id, device_password, sock, ts, retry=3):
 def async_send_get_state_packet(device_id, sock, ts, session_id):
     """Send get state packet"""
     try:
-        packet = crc_sign_full_packet_com_key(GET_STATE_PACKET.format(session_id, ts, device_id))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2StateResponseMSG(sock.recv(1024))
+        packet = build_packet(GET_STATE_PACKET, session_id, ts, device_id)
+        return SwitcherV2StateResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send state packet ' + traceback.format_exc())
         raise
@@ -691,14 +509,13 @@ def async_send_control_packet(device_id, phone_id, device_password, sock, ts, se
     try:
         if timer is None:
             """No timer requested"""
-            packet = crc_sign_full_packet_com_key(SEND_CONTROL_PACKET.format(session_id, ts, device_id, phone_id, device_password, cmd, NO_TIMER_REQUESTED))
+            packet = build_packet(SEND_CONTROL_PACKET, session_id, ts, device_id, phone_id, device_password, cmd, NO_TIMER_REQUESTED)
         else:
             """Incorporate timer in packet"""
             _LOGGER.debug('incorporating timer for ' + timer + ' minutes')
-            packet = crc_sign_full_packet_com_key(SEND_CONTROL_PACKET.format(session_id, ts, device_id, phone_id, device_password, cmd, convert_minutes_to_timer(timer)))
+            packet = build_packet(SEND_CONTROL_PACKET, session_id, ts, device_id, phone_id, device_password, cmd, convert_minutes_to_timer(timer))
 
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2ControlResponseMSG(sock.recv(1024))
+        return SwitcherV2ControlResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send control packet ' + traceback.format_exc())
         raise
@@ -708,9 +525,8 @@ def async_send_control_packet(device_id, phone_id, device_password, sock, ts, se
 def async_send_set_auto_off_packet(device_id, phone_id, device_password, full_time, sock, ts, session_id):
     """Send set auto-off packet"""
     try:
-        packet = crc_sign_full_packet_com_key(SET_AUTO_OFF_PACKET.format(session_id, ts, device_id, phone_id, device_password, convert_timedelta_to_auto_off(full_time)))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2SetAutoOffResponseMSG(sock.recv(1024))
+        packet = build_packet(SET_AUTO_OFF_PACKET, session_id, ts, device_id, phone_id, device_password, convert_timedelta_to_auto_off(full_time)[0])
+        return SwitcherV2SetAutoOffResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send set auto-off packet ' + traceback.format_exc())
         raise
@@ -720,9 +536,8 @@ def async_send_set_auto_off_packet(device_id, phone_id, device_password, full_ti
 def async_send_update_name_packet(device_id, phone_id, device_password, name, sock, ts, session_id):
     """Send set auto-off packet"""
     try:
-        packet = crc_sign_full_packet_com_key(UPDATE_DEVICE_NAME_PACKET.format(session_id, ts, device_id, phone_id, device_password, convert_string_to_device_name(name)))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2UpdateNameResponseMSG(sock.recv(1024))
+        packet = build_packet(UPDATE_DEVICE_NAME_PACKET, session_id, ts, device_id, phone_id, device_password, convert_string_to_device_name(name))
+        return SwitcherV2UpdateNameResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send update name packet ' + traceback.format_exc())
         raise
@@ -732,9 +547,8 @@ def async_send_update_name_packet(device_id, phone_id, device_password, name, so
 def async_send_get_schedules_packet(device_id, phone_id, device_password, sock, ts, session_id):
     """Send get schedule packet"""
     try:
-        packet = crc_sign_full_packet_com_key(GET_SCHEDULES_PACKET.format(session_id, ts, device_id, phone_id, device_password))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2GetScheduleResponseMSG(sock.recv(1024))
+        packet = build_packet(GET_SCHEDULES_PACKET, session_id, ts, device_id, phone_id, device_password)
+        return SwitcherV2GetScheduleResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send get schedules packet ' + traceback.format_exc())
         raise
@@ -744,9 +558,8 @@ def async_send_get_schedules_packet(device_id, phone_id, device_password, sock,
 def async_send_disable_enable_schedule_packet(device_id, phone_id, device_password, sock, ts, session_id, schedule_data):
     """Send get schedule packet"""
     try:
-        packet = crc_sign_full_packet_com_key(DISABLE_ENABLE_SCHEDULE_PACKET.format(session_id, ts, device_id, phone_id, device_password, schedule_data))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2DisableEnableScheduleResponseMSG(sock.recv(1024))
+        packet = build_packet(DISABLE_ENABLE_SCHEDULE_PACKET, session_id, ts, device_id, phone_id, device_password, schedule_data)
+        return SwitcherV2DisableEnableScheduleResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send disable enable schedule packet ' + traceback.format_exc())
         raise
@@ -756,9 +569,8 @@ def async_send_disable_enable_schedule_packet(device_id, phone_id, device_passwo
 def async_send_delete_schedule_packet(device_id, phone_id, device_password, sock, ts, session_id, schedule_id):
     """Send delete schedule packet"""
     try:
-        packet = crc_sign_full_packet_com_key(DELETE_SCHEDULE_PACKET.format(session_id, ts, device_id, phone_id, device_password, schedule_id))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2DeleteScheduleResponseMSG(sock.recv(1024))
+        packet = build_packet(DELETE_SCHEDULE_PACKET, session_id, ts, device_id, phone_id, device_password, schedule_id)
+        return SwitcherV2DeleteScheduleResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send delete schedule packet ' + traceback.format_exc())
         raise
@@ -768,9 +580,8 @@ def async_send_delete_schedule_packet(device_id, phone_id, device_password, sock
 def async_send_create_schedule_packet(device_id, phone_id, device_password, sock, ts, session_id, schedule_data):
     """Send create schedule packet"""
     try:
-        packet = crc_sign_full_packet_com_key(CREATE_SCHEDULE_PACKET.format(session_id, ts, device_id, phone_id, device_password, schedule_data))
-        sock.send(ba.unhexlify(packet))
-        return SwitcherV2CreateScheduleResponseMSG(sock.recv(1024))
+        packet = build_packet(CREATE_SCHEDULE_PACKET, session_id, ts, device_id, phone_id, device_password, schedule_data)
+        return SwitcherV2CreateScheduleResponseMSG(send_packet(sock, packet))
     except Exception:
         _LOGGER.error('failed to send create schedule packet ' + traceback.format_exc())
         raise
@@ -1401,6 +1212,14 @@ def async_setup(hass, config):
     create_view = config[DOMAIN][CONF_CREATE_VIEW]
     schedules_scan_interval = config[DOMAIN][CONF_SCHEDULE_SCAN_INTERVAL]
 
+    """Open the capture file for recording raw traffic"""
+    if CONF_CAPTURE_FILE in config[DOMAIN]:
+        try:
+            capture_writer = start_capture(hass.config.path(config[DOMAIN][CONF_CAPTURE_FILE]))
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, capture_writer.close)
+        except Exception:
+            _LOGGER.error("failed to open capture file " + traceback.format_exc())
+
     """Listen for discoverd device"""
     hass.bus.async_listen_once(EVENT_SWITCHER_DISCOVERY_DATA, discover_devices)
 
@@ -1448,6 +1267,7 @@ class SwitcherV2(threading.Thread):
         while self._ok_to_run:
             try:
                 message, address = tcp_socket.recvfrom(1024)
+                capture_broadcast(message)
                 msg = SwitcherV2BroadcastMSG(message)
                 if msg.verified:
                     if conf_dev_id == msg.device_id:
@@ -1643,480 +1463,6 @@ class SwitcherV2Device(object):
         return self._last_state_change
 
 
-class SwitcherV2Schedule(object):
-    """represnation of the switcher version 2 schedule"""
-    def __init__(self, idx, schedule_details):
-        self._schedule_id = None
-        self._enabled = False
-        self._recurring = False
-        self._days = []
-        self._start_time = None
-        self._end_time = None
-        self._duration = None
-        self._schedule_data = None
-        try:
-            self._schedule_id = str(int(schedule_details[idx][0:2], 16))
-            if int(schedule_details[idx][2:4], 16) == 1:
-                self._enabled = True
-            if not schedule_details[idx][4:6] == "00":
-                self._recurring = True
-                if schedule_details[idx][4:6] == "fe":
-                    self._days = ALL_DAYS
-                else:
-                    self._days = get_days_list_from_bytes(bytearray(ba.unhexlify((schedule_details[idx][4:6])))[0])
-
-            self._start_time = get_time_from_bytes(schedule_details[idx][8:16])
-            self._end_time = get_time_from_bytes(schedule_details[idx][16:24])
-            self._duration = str(datetime.datetime.strptime(self._end_time,'%H:%M') - datetime.datetime.strptime(self._start_time,'%H:%M'))
-
-            time_id = schedule_details[idx][0:2]
-            on_off = schedule_details[idx][2:4]
-            week = schedule_details[idx][4:6]
-            timestate = schedule_details[idx][6:8]
-            start_time = schedule_details[idx][8:16]
-            end_time = schedule_details[idx][16:24]
-            self._schedule_data = (time_id + on_off + week + timestate + start_time + end_time)
-        except:
-            _LOGGER.error("failed to parse schedule data " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def schedule_id(self):
-        """Return the schedule id"""
-        return self._schedule_id
-        
-    @property
-    def enabled(self):
-        """Return true if enabled"""
-        return self._enabled
-        
-    @property
-    def recurring(self):
-        """Return true if recurring"""
-        return self._recurring
-        
-    @property
-    def days(self):
-        """Return the weekdays of the schedule"""
-        return self._days
-        
-    @property
-    def start_time(self):
-        """Return the start time of the schedule"""
-        return self._start_time
-        
-    @property
-    def end_time(self):
-        """Return the end time of the schedule"""
-        return self._end_time
-        
-    @property
-    def duration(self):
-        """Return the duration of the schedule"""
-        return self._duration
-        
-    @property
-    def schedule_data(self):
-        """Return the schedule data for managing the schedule"""
-        return self._schedule_data
-
-    def set_enabled(self, value):
-        """Function to set the device as enabled or disabled"""
-        self._enabled = value
-
-    def set_schedule_data(self, data):
-        """Function to set the schedule data for managing the schedule"""
-        self._schedule_data = data
-
-
-"""#############################
-###### Response Messages #######
-#############################"""
-
-
-class SwitcherV2BroadcastMSG(object):
-    """represntation of the switcher version 2 broadcast message"""
-    def __init__(self, message):
-        self._verified = self._validated = False
-        self._ip_address = self._mac = self._name = self._device_id = self._state = self._time_to_auto_off = self._auto_off_config_time = None
-        self._power_consumption = self._electric_current = 0
-
-        try:
-            self._verified = ba.hexlify(message)[0:4].decode(ENCODING_CODEC) == 'fef0' and len(message) == 165
-            if self._verified:
-                temp_ip = ba.hexlify(message)[152:160]
-                ip_addr = int(temp_ip[6:8] + temp_ip[4:6] + temp_ip[2:4] + temp_ip[0:2], 16)
-                self._ip_address = socket.inet_ntoa(pack("<L", ip_addr))
-
-                mac = ba.hexlify(message)[160:172].decode(ENCODING_CODEC).upper()
-                self._mac = mac[0:2] + ':' + mac[2:4] + ':' + mac[4:6] + ':' + mac[6:8] + ':' + mac[8:10] + ':' + mac[10:12]
-
-                self._name = message[42:74].decode(ENCODING_CODEC).rstrip('\x00')
-
-                self._device_id = ba.hexlify(message)[36:42].decode(ENCODING_CODEC)
-
-                self._state = self._time_to_auto_off = STATE_ON if ba.hexlify(message)[266:270].decode(ENCODING_CODEC) == STATE_RESPONSE_ON else STATE_OFF
-
-                temp_auto_off_config = ba.hexlify(message)[310:318]
-                temp_auto_off_seconds = int(temp_auto_off_config[6:8] + temp_auto_off_config[4:6] + temp_auto_off_config[2:4] + temp_auto_off_config[0:2], 16)
-                self._auto_off_config_time = convert_seconds_to_iso_time(temp_auto_off_seconds)
-
-                if self._state == STATE_ON:
-                    temp_power = ba.hexlify(message)[270:278]
-                    self._power_consumption = int(temp_power[2:4] + temp_power[0:2], 16)
-                    self._electric_current = round((self._power_consumption / float(220)), 1)
-
-                    temp_time_left = ba.hexlify(message)[294:302]
-                    temp_time_left_seconds = int(temp_time_left[6:8] + temp_time_left[4:6] + temp_time_left[2:4] + temp_time_left[0:2], 16)
-                    self._time_to_auto_off = convert_seconds_to_iso_time(temp_time_left_seconds)
-
-            self._validated = True
-        except:
-            _LOGGER.exception("failed to parse broadcast message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def verified(self):
-        """return rather or not the message was verified as a switcher v2 message"""
-        return self._verified if self._validated == True else self._validated
-
-    @property
-    def ip(self):
-        """return the ip address"""
-        return self._ip_address
-
-    @property
-    def mac(self):
-        """return the mac address"""
-        return self._mac
-
-    @property
-    def name(self):
-        """return the device name"""
-        return self._name
-
-    @property
-    def device_id(self):
-        """return the device id"""
-        return self._device_id
-
-    @property
-    def state(self):
-        """return the state of the device"""
-        return self._state
-
-    @property
-    def time_left(self):
-        """return the time left to auto-offf"""
-        return self._time_to_auto_off
-
-    @property
-    def auto_off(self):
-        """return the auto-off configuration value"""
-        return self._auto_off_config_time
-
-    @property
-    def power(self):
-        """return the power consumptionin watts"""
-        return self._power_consumption
-
-    @property
-    def current(self):
-        """return the power consumptionin amps"""
-        return self._electric_current
-
-
-class SwitcherV2LoginResponseMSG(object):
-    """represntation of the switcher version 2 login response message"""
-    def __init__(self, response):
-        self._unparsed_response = response
-        self._session_id = None
-        try:
-            self._session_id = ba.hexlify(response)[16:24].decode(ENCODING_CODEC)
-        except:
-            _LOGGER.exception("failed to parse login response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def session_id(self):
-        """Return the retrieved session id"""
-        return self._session_id
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._session_id is not None
-
-
-class SwitcherV2StateResponseMSG(object):
-    """represntation of the switcher version 2 state response message"""
-    def __init__(self, response):
-        self._unparsed_response = response
-        self._state = self._time_to_auto_off = self._auto_off_config_time = None
-        self._power_consumption = self._electric_current = 0
-
-        try:
-            temp_power = ba.hexlify(response)[154:162]
-            self._power_consumption = int(temp_power[2:4] + temp_power[0:2], 16)
-            self._electric_current = round((self._power_consumption / float(220)), 1)
-
-            temp_time_left = ba.hexlify(response)[178:186]
-            temp_time_left_seconds = int(temp_time_left[6:8] + temp_time_left[4:6] + temp_time_left[2:4] + temp_time_left[0:2], 16)
-            self._time_to_auto_off = convert_seconds_to_iso_time(temp_time_left_seconds)
-
-            temp_auto_off = ba.hexlify(response)[194:202]
-            temp_auto_off_seconds = int(temp_auto_off[6:8] + temp_auto_off[4:6] + temp_auto_off[2:4] + temp_auto_off[0:2], 16)
-            self._auto_off_config_time = convert_seconds_to_iso_time(temp_auto_off_seconds)
-
-            temp_state = ba.hexlify(response)[150:154].decode(ENCODING_CODEC)
-            self._state = STATE_ON if temp_state == STATE_RESPONSE_ON else STATE_OFF if temp_state == STATE_RESPONSE_OFF else None
-
-        except:
-            _LOGGER.exception("failed to parse state response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def state(self):
-        """Return the state"""
-        return self._state
-
-    @property
-    def time_left(self):
-        """Return the time left to auto-off"""
-        return self._time_to_auto_off
-
-    @property
-    def auto_off(self):
-        """Return the auto-off configuration value"""
-        return self._auto_off_config_time
-
-    @property
-    def power(self):
-        """Return the current power consumption in watts"""
-        return self._power_consumption
-
-    @property
-    def current(self):
-        """Return the power consumption in amps"""
-        return self._electric_current
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._state is not None
-
-
-class SwitcherV2ControlResponseMSG(object):
-    """represntation of the switcher version 2 control response message"""
-    def __init__(self, response):
-        self._unparsed_response = None
-        try:
-            self._unparsed_response = ba.hexlify(response)[16:24].decode(ENCODING_CODEC)
-        except:
-            _LOGGER.exception("failed to parse control response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._unparsed_response is not None
-
-
-class SwitcherV2SetAutoOffResponseMSG(object):
-    """represntation of the switcher version 2 set auto-off response message"""
-    def __init__(self, response):
-        self._unparsed_response = None
-        try:
-            self._unparsed_response = ba.hexlify(response)[16:24].decode(ENCODING_CODEC)
-        except:
-            _LOGGER.exception("failed to parse set auto-off response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._unparsed_response is not None
-
-
-class SwitcherV2UpdateNameResponseMSG(object):
-    """represntation of the switcher version 2 update name response message"""
-    def __init__(self, response):
-        self._unparsed_response = None
-        try:
-            self._unparsed_response = ba.hexlify(response)[16:24].decode(ENCODING_CODEC)
-        except:
-            _LOGGER.exception("failed to parse update name response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._unparsed_response is not None
-
-
-class SwitcherV2GetScheduleResponseMSG(object):
-    """represnation of the switcher version 2 get schedule message"""
-    def __init__(self, response):
-        self._unparsed_response = None
-        self._schedule_list = []
-        try:
-            self._unparsed_response = ba.hexlify(response).decode(ENCODING_CODEC)
-
-            split_string_lambda = lambda x, n: [x[i:i+n] for i in range(0, len(x), n)]
-
-            res = ba.hexlify(response)
-            idx = res[90:-8].decode(ENCODING_CODEC)
-            schedules_details = split_string_lambda(idx,32)
-            if not len(schedules_details) == 0:
-                for i in range(len(schedules_details)):
-                    schedule = SwitcherV2Schedule(i, schedules_details)
-                    self._schedule_list.append(schedule)
-        except:
-            _LOGGER.exception("failed to parse get schedules response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._unparsed_response is not None
-
-    @property
-    def found_schedules(self):
-        """Return true if found shedules in the response"""
-        return not self._schedule_list == []
-
-    @property
-    def get_schedules(self):
-        """Return the schedules list"""
-        return self._schedule_list
-
-
-class SwitcherV2DisableEnableScheduleResponseMSG(object):
-    """represntation of the switcher version 2 disable enable schedule response message"""
-    def __init__(self, response):
-        self._unparsed_response = None
-        try:
-            self._unparsed_response = ba.hexlify(response)[16:24].decode(ENCODING_CODEC)
-        except:
-            _LOGGER.exception("failed to parse disable enable schedule response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._unparsed_response is not None
-
-
-class SwitcherV2DeleteScheduleResponseMSG(object):
-    """represntation of the switcher version 2 delete schedule response message"""
-    def __init__(self, response):
-        self._unparsed_response = None
-        try:
-            self._unparsed_response = ba.hexlify(response)[16:24].decode(ENCODING_CODEC)
-        except:
-            _LOGGER.exception("failed to parse delete schedule response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._unparsed_response is not None
-
-
-class SwitcherV2CreateScheduleResponseMSG(object):
-    """represntation of the switcher version 2 create schedule response message"""
-    def __init__(self, response):
-        self._unparsed_response = None
-        try:
-            self._unparsed_response = ba.hexlify(response)[16:24].decode(ENCODING_CODEC)
-        except:
-            _LOGGER.exception("failed to parse create schedule response message " + traceback.format_exc())
-
-    def as_dict(self):
-        """Callback for __dict__."""
-        return self.__dict__
-
-    @property
-    def unparsed_response(self):
-        """Return the uparsed response message"""
-        return self._unparsed_response
-
-    @property
-    def successful(self):
-        """Return the status of the message"""
-        return self._unparsed_response is not None
-
-
 """#############################
 ### Home Assistant Entities ####
 #############################"""
@@ -4,8 +4,10 @@ Build by TomerFi
 Please visit https://github.com/TomerFi/home-assistant-custom-components for more custom components
 
 installation notes:
-place this file in the following folder and restart home assistant:
+place this file and switcher_heater_util.py in the following folder and restart home assistant:
 /config/custom_components/switch
+place switcher_v2_protocol.py from the switcher_v2_protocol folder in the following folder:
+/config/custom_components
 
 if error occures, raise the log level to debug mode and analyze the logs:
                     custom_components.switch.switcher_heater: debug
@@ -22,28 +24,34 @@ switch:
         device_id: 'XXXXXX'
         device_password: 'XXXXXXXX'
         scan_interval: 20
+        fast_scan_interval: 5
+        max_scan_interval: 300
         icon: 'mdi:thermostat-box'
 
 ////////////////////////////////////////////////////////////////////////////////////////////////"""
 import asyncio
 import logging
 
-import binascii as ba
-import time
-from struct import pack
 import socket
-import datetime
+import threading
+import time
 import traceback
 
 import voluptuous as vol
 
 from homeassistant.components.switch import (PLATFORM_SCHEMA, SwitchDevice, ENTITY_ID_FORMAT)
-from homeassistant.const import (CONF_SWITCHES, CONF_FRIENDLY_NAME, CONF_SCAN_INTERVAL, CONF_IP_ADDRESS, STATE_ON, STATE_OFF, CONF_ENTITY_ID, CONF_ICON)
+from homeassistant.const import (CONF_SWITCHES, CONF_FRIENDLY_NAME, CONF_SCAN_INTERVAL, CONF_IP_ADDRESS, STATE_ON, STATE_OFF, CONF_ENTITY_ID, CONF_ICON, EVENT_HOMEASSISTANT_STOP)
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.event import (async_track_time_interval, async_track_state_change)
+from homeassistant.helpers.event import async_track_state_change
 from homeassistant.core import callback
 from homeassistant.helpers.entity import async_generate_entity_id
 
+from custom_components.switcher_v2_protocol import (SOCKET_BIND_TUP, DEFAULT_SESSION_TTL, NO_TIMER_REQUESTED, COMMAND_ON, COMMAND_OFF, GET_STATE_PACKET,
+    SEND_CONTROL_PACKET, SET_AUTO_OFF_PACKET, SwitcherV2StateResponseMSG, SwitcherV2ControlResponseMSG, SwitcherV2SetAutoOffResponseMSG,
+    SwitcherV2BroadcastMSG, SwitcherV2Connection, capture_broadcast, convert_minutes_to_timer, convert_seconds_to_iso_time, convert_timedelta_to_auto_off)
+from custom_components.switch.switcher_heater_util import (DEFAULT_POLL_CONCURRENCY, DEFAULT_SERVICE_CONCURRENCY, DEFAULT_FAST_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL, SwitcherHeaterPollCadence,
+    SwitcherHeaterPollScheduler, SwitcherHeaterCountdown, SwitcherHeaterCircuitBreaker, SwitcherHeaterResult, SwitcherHeaterRequests, SwitcherHeaterServiceDispatcher, settle_poll_result)
+
 REQUIREMENTS = []
 
 _LOGGER = logging.getLogger(__name__)
@@ -59,6 +67,14 @@ TURN_ON_30_SERVICE = PLATFORM.format("turn_on_30_minutes")
 TURN_ON_45_SERVICE = PLATFORM.format("turn_on_45_minutes")
 TURN_ON_60_SERVICE = PLATFORM.format("turn_on_60_minutes")
 SET_AUTO_OFF_SERVICE = PLATFORM.format("set_auto_off")
+EVENT_POLL_CYCLE = PLATFORM.format("poll_cycle")
+EVENT_SERVICE_RESULTS = PLATFORM.format("service_results")
+TIMER_SERVICES_MINUTES = {
+    TURN_ON_15_SERVICE: "15",
+    TURN_ON_30_SERVICE: "30",
+    TURN_ON_45_SERVICE: "45",
+    TURN_ON_60_SERVICE: "60"
+}
 
 """###############################
 #### Configuration Constants #####
@@ -69,6 +85,13 @@ CONF_DEVICE_ID = 'device_id'
 CONF_DEVICE_PASSWORD = 'device_password'
 CONF_NOTIFY_SERVICE_NAME = "notify_service_name"
 CONF_AUTO_OFF_CONFIG = "auto_off"
+CONF_LISTEN_BROADCASTS = "listen_broadcasts"
+CONF_BROADCAST_TIMEOUT = "broadcast_timeout"
+CONF_POLL_CONCURRENCY = "poll_concurrency"
+CONF_SERVICE_CONCURRENCY = "service_concurrency"
+CONF_SESSION_TTL = "session_ttl"
+CONF_FAST_SCAN_INTERVAL = "fast_scan_interval"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
 
 """###############################
 ######## Default Values ##########
@@ -76,6 +99,8 @@ CONF_AUTO_OFF_CONFIG = "auto_off"
 DEFAULT_SCAN_INTERVAL = 20
 DEFAULT_NAME = "SwitcherV2 Device"
 DEFAULT_ICON = "mdi:thermostat-box"
+DEFAULT_BROADCAST_TIMEOUT = 30
+BROADCAST_SETTLE_TIME = 2
 
 """###############################
 ##### Attributes Constants #######
@@ -84,6 +109,22 @@ ATTR_CURRENT_POWER_WATTS = "current_power_watts"
 ATTR_CURRENT_POWER_AMPS = "current_power_amps"
 ATTR_AUTO_OFF_TIME_LEFT = "auto_off_time_left"
 ATTR_AUTO_OFF_CONFIG = "auto_off_configuration"
+ATTR_AUTO_OFF_AT = "auto_off_at"
+ATTR_LAST_UPDATE_SOURCE = "last_update_source"
+ATTR_POLL_CADENCE = "poll_cadence"
+ATTR_CIRCUIT_BREAKER = "circuit_breaker"
+ATTR_CYCLE_DURATION = "duration"
+ATTR_CYCLE_POLLED = "polled"
+ATTR_CYCLE_FAILED = "failed"
+ATTR_SERVICE = "service"
+ATTR_RESULTS = "results"
+
+"""###############################
+####### Update Sources ###########
+###############################"""
+UPDATE_SOURCE_POLL = "poll"
+UPDATE_SOURCE_BROADCAST = "broadcast"
+UPDATE_SOURCE_COUNTDOWN = "countdown"
 
 """###############################
 ###### Notification Dicts ########
@@ -108,12 +149,19 @@ SWITCH_SCHEMA = vol.Schema({
     vol.Required(CONF_DEVICE_ID): cv.string,
     vol.Required(CONF_DEVICE_PASSWORD): cv.string,
     vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): cv.positive_int,
+    vol.Optional(CONF_FAST_SCAN_INTERVAL, default=DEFAULT_FAST_SCAN_INTERVAL): cv.positive_int,
+    vol.Optional(CONF_MAX_SCAN_INTERVAL, default=DEFAULT_MAX_SCAN_INTERVAL): cv.positive_int,
     vol.Optional(CONF_ICON, default=DEFAULT_ICON): cv.icon
 })
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_SWITCHES, default={}):
-        vol.Schema({cv.slug: SWITCH_SCHEMA})
+        vol.Schema({cv.slug: SWITCH_SCHEMA}),
+    vol.Optional(CONF_LISTEN_BROADCASTS, default=False): cv.boolean,
+    vol.Optional(CONF_BROADCAST_TIMEOUT, default=DEFAULT_BROADCAST_TIMEOUT): cv.positive_int,
+    vol.Optional(CONF_POLL_CONCURRENCY, default=DEFAULT_POLL_CONCURRENCY): cv.positive_int,
+    vol.Optional(CONF_SERVICE_CONCURRENCY, default=DEFAULT_SERVICE_CONCURRENCY): cv.positive_int,
+    vol.Optional(CONF_SESSION_TTL, default=DEFAULT_SESSION_TTL): cv.positive_int
 })
 
 TIMER_SERVICE_SCHEMA = vol.Schema({
@@ -126,244 +174,65 @@ SET_AUTO_OFF_SERVICE_SCHEMA = vol.Schema({
     vol.Required(CONF_AUTO_OFF_CONFIG): cv.time_period_str
 })
 
-"""###############################
-###### SwitcherV2 Constants ######
-###############################"""
-REMOTE_SESSION_ID = "00000000"
-REMOTE_KEY = b"00000000000000000000000000000000"
-SOCKET_PORT = 9957
-NO_TIMER_REQUESTED = "00000000"
-
-"""###############################
-######### Packet Formats #########
-###############################"""
-# remote session id, timestamp, phone id, device password
-LOGIN_PACKET = "fef052000232a100{}340001000000000000000000{}00000000000000000000f0fe1c00{}0000{}00000000000000000000000000000000000000000000000000000000"
-# local session id, timestamp, device id
-GET_STATE_PACKET = "fef0300002320103{}340001000000000000000000{}00000000000000000000f0fe{}00"
-# local session id, timestamp, device id, phone id, device password, command (1/0), timer
-SEND_CONTROL_PACKET = "fef05d0002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}000000000000000000000000000000000000000000000000000000000106000{}00{}"
-# local session id, timestamp, device id, phone id, device password, auto-off seconds
-SET_AUTO_OFF_PACKET ="fef05b0002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000040400{}"
-
-"""###############################
-#### Tools Parsers Converters ####
-###############################"""
-@callback
-def crc_sign_full_packet_com_key(pData):
-    """CRC calculation"""
-    try:
-        crc = (ba.hexlify(pack('>I', ba.crc_hqx(ba.unhexlify(pData), 0x1021)))).decode('utf-8')
-        pData = pData + crc[6:8] + crc[4:6]
-        crc = crc[6:8] + crc[4:6] + (ba.hexlify(REMOTE_KEY)).decode('utf-8')
-        crc = (ba.hexlify(pack('>I', ba.crc_hqx(ba.unhexlify(crc), 0x1021)))).decode('utf-8')
-        pData = pData + crc[6:8] + crc[4:6]
-        return pData
-    except:
-        _LOGGER.exception('failed to sign crc ' + traceback.format_exc())
-        return None
-
-@callback
-def get_timestamp():
-    """Generate timestamp"""
-    return (ba.hexlify(pack('<I', int(round(time.time()))))).decode('utf-8')
-
-@callback
-def get_socket(ip_addr):
-    """Connect to socket"""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((ip_addr, SOCKET_PORT))
-        _LOGGER.debug('connected socket to ' + ip_addr)
-        return sock
-    except:
-        _LOGGER.error('failed to connect socket to ' + ip_addr + traceback.format_exc())
-        return None
-
-@callback
-def close_socket_connection(sock, ip_addr):
-    """Close socket"""
-    try:
-        if not sock is None:
-            sock.close()
-            _LOGGER.debug('closed socket connection to ' + ip_addr)
-    except:
-        pass
-
-@callback
-def convert_minutes_to_timer(minutes):
-    """convert minutes to hex for timer"""
-    return (ba.hexlify(pack('<I', int(minutes) * 60 ))).decode('utf-8')
-
-@callback
-def convert_seconds_to_iso_time(all_seconds):
-    """convert seconds to iso time (%H:%M:%S)"""
-    minutes, seconds = divmod(int(all_seconds), 60)
-    hours, minutes = divmod(minutes, 60)
-    return datetime.time(hour=hours, minute=minutes, second=seconds).isoformat(timespec='auto')
-
-@callback
-def convert_timedelta_to_auto_off(full_time):
-    """convert timedelta seconds to hex for auto-off"""
-    auto_off = auto_off_config = None
-    try:
-        minutes = full_time.total_seconds() / 60
-        hours, minutes = divmod(minutes, 60)
-        seconds = int(hours) * 3600 + int(minutes) * 60
-        if seconds > 3599 and seconds < 86341:
-            auto_off = (ba.hexlify(pack('<I', int(seconds)))).decode('utf-8')
-            auto_off_config = convert_seconds_to_iso_time(seconds)
-    except:
-        _LOGGER.warning('failed to create auto-off from timedelta')
-
-    return auto_off, auto_off_config
-
-@callback
-def parse_power_consumption(response):
-    """parse power consumption"""
-    current_power_w = current_power_a = None
-    try:
-        power = ba.hexlify(response)[154:162]
-        current_power_w = int(power[2:4] + power[0:2], 16)
-        current_power_a = round((current_power_w / float(220)), 1)
-    except:
-        _LOGGER.warning('failed to parse power consumption data from response')
-
-    return current_power_w, current_power_a
-
-@callback
-def parse_auto_off_time_left(response):
-    """parse time left to auto off"""
-    auto_off_time_left = None
-    try:
-        time_left = ba.hexlify(response)[178:186]
-        all_seconds = int(time_left[6:8] + time_left[4:6] + time_left[2:4] + time_left[0:2] , 16)
-        auto_off_time_left = convert_seconds_to_iso_time(all_seconds)
-    except:
-        _LOGGER.warning('failed to parse off timer data from response')
-
-    return auto_off_time_left
-
-@callback
-def parse_auto_off_config(response):
-    """parse time left to auto off"""
-    auto_off_config = None
-    try:
-        time_left = ba.hexlify(response)[194:202]
-        all_seconds = int(time_left[6:8] + time_left[4:6] + time_left[2:4] + time_left[0:2] , 16)
-        auto_off_config = convert_seconds_to_iso_time(all_seconds)
-    except:
-        _LOGGER.warning('failed to parse off timer data from response')
-
-    return auto_off_config
-
-@callback
-def parse_status(response):
-    """parse time left to auto off"""
-    current_status = None
-    try:
-        state = (ba.hexlify(response)[150:154]).decode('utf-8')
-        if state == "0000":
-            current_status = STATE_OFF
-        elif state == "0100":
-            current_status = STATE_ON
-
-    except:
-        _LOGGER.warning('failed to parse current status data from response')
-
-    return current_status
-
 """############################
 ####### Packet Handlers #######
 ############################"""
-@asyncio.coroutine
-def async_send_login_packet(phone_id, device_password, sock, ts, retry=3):
-    """Send login packet"""
-    session_id = None
-    try:
-        packet = crc_sign_full_packet_com_key(LOGIN_PACKET.format(REMOTE_SESSION_ID, ts, phone_id, device_password))
-        if not packet is None:
-            sock.send(ba.unhexlify(packet))
-            res = sock.recv(1024)
-            session_id = (ba.hexlify(res)[16:24]).decode('utf-8')
-            _LOGGER.debug('login packet sent, retreived session id is: ' + session_id)
-            if (session_id is None or session_id == ""):
-                if (retry > 0):
-                    _LOGGER.warning('failed to get session id from device, retrying')
-                    return async_send_login_packet(phone_id, device_password, sock, ts, retry - 1)
-                else:
-                    _LOGGER.error('failed to session id from device, please try again later')
-                    session_id = None
-    except:
-        _LOGGER.error('failed to send login packet ' + traceback.format_exc())
-
-    return session_id
-
-@asyncio.coroutine
-def async_send_get_state_packet(device_id, sock, ts, session_id):
+"""The packet handlers are blocking, they run in the executor"""
+def send_get_state_packet(connection, device_id):
     """Send get state packet"""
     current_status = current_power_w = current_power_a = auto_off_time_left = auto_off_config = None
     try:
-        packet = crc_sign_full_packet_com_key(GET_STATE_PACKET.format(session_id, ts, device_id))
-        if not packet is None:
-            sock.send(ba.unhexlify(packet))
-            res = sock.recv(1024)
-            current_status = parse_status(res)
-            if not current_status is None:
-                auto_off_config = parse_auto_off_config(res)
-                _LOGGER.debug('state packet sent, device current state is ' + current_status)
-                if current_status == STATE_ON:
-                    current_power_w, current_power_a = parse_power_consumption(res)
-                    auto_off_time_left = parse_auto_off_time_left(res)
-            else:
-               _LOGGER.debug('state packet sent, failed to extract status from response') 
+        response = connection.request(SwitcherV2StateResponseMSG, GET_STATE_PACKET, device_id)
+        if not response is None:
+            current_status = response.state
+            auto_off_config = response.auto_off
+            _LOGGER.debug('state packet sent, device current state is ' + current_status)
+            if current_status == STATE_ON:
+                current_power_w, current_power_a = response.power, response.current
+                auto_off_time_left = response.time_left
+        else:
+           _LOGGER.debug('state packet sent, failed to extract status from response') 
     except:
         _LOGGER.error('failed to send get state packet ' + traceback.format_exc())
 
     return current_status, current_power_w, current_power_a, auto_off_time_left, auto_off_config
 
-@asyncio.coroutine
-def async_send_control_packet(device_id, phone_id, device_password, sock, ts, session_id, cmd, timer=None):
+def send_control_packet(connection, device_id, phone_id, device_password, cmd, timer=None):
     """Send control packet"""
     status = power_w = power_a = auto_off_time_left = None
     try:
         if timer is None:
             """No timer requested"""
-            packet = crc_sign_full_packet_com_key(SEND_CONTROL_PACKET.format(session_id, ts, device_id, phone_id, device_password, cmd, NO_TIMER_REQUESTED))
+            response = connection.request(SwitcherV2ControlResponseMSG, SEND_CONTROL_PACKET, device_id, phone_id, device_password, cmd, NO_TIMER_REQUESTED)
         else:
             """Incorporate timer in packet"""
             _LOGGER.debug('incorporating timer for ' + timer + ' minutes')
-            packet = crc_sign_full_packet_com_key(SEND_CONTROL_PACKET.format(session_id, ts, device_id, phone_id, device_password, cmd, convert_minutes_to_timer(timer)))
-        
-        if not packet is None:
-            sock.send(ba.unhexlify(packet))
-            res = sock.recv(1024)
-            if cmd == "0":
+            response = connection.request(SwitcherV2ControlResponseMSG, SEND_CONTROL_PACKET, device_id, phone_id, device_password, cmd, convert_minutes_to_timer(timer))
+
+        if not response is None:
+            if cmd == COMMAND_OFF:
                 _LOGGER.debug('control packet sent for state off')
                 status = STATE_OFF
-            elif cmd == "1":
+            elif cmd == COMMAND_ON:
                 _LOGGER.debug('control packet sent for state on')
                 power_w = power_a = 0
                 if not timer is None:
-                    auto_off_time_left = convert_seconds_to_iso_time(str(int(timer) * 60))
-                    
+                    auto_off_time_left = convert_seconds_to_iso_time(int(timer) * 60)
+
                 status = STATE_ON
     except:
         _LOGGER.error('failed to send control packet ' + traceback.format_exc())
 
     return status, power_w, power_a, auto_off_time_left
 
-@asyncio.coroutine
-def async_send_set_auto_off_packet(device_id, phone_id, device_password, full_time, sock, ts, session_id):
+def send_set_auto_off_packet(connection, device_id, phone_id, device_password, full_time):
     """Send set auto-off packet"""
     auto_off_config = None
     try:
         prep_auto_off, auto_off_config = convert_timedelta_to_auto_off(full_time)
         if not prep_auto_off is None:
-            packet = crc_sign_full_packet_com_key(SET_AUTO_OFF_PACKET.format(session_id, ts, device_id, phone_id, device_password, prep_auto_off))
-            if not packet is None:
-                sock.send(ba.unhexlify(packet))
-                res = sock.recv(1024)
+            if connection.request(SwitcherV2SetAutoOffResponseMSG, SET_AUTO_OFF_PACKET, device_id, phone_id, device_password, prep_auto_off) is None:
+                auto_off_config = None
         else:
             _LOGGER.error('failed to validate input. the correct format is HH:mm with a minimum of 01:00 and maximum of 23:59')
     except:
@@ -378,6 +247,11 @@ def async_send_set_auto_off_packet(device_id, phone_id, device_password, full_ti
 def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
     """Initialize the platform"""
     devices = config.get(CONF_SWITCHES)
+    listen_broadcasts = config.get(CONF_LISTEN_BROADCASTS)
+    broadcast_timeout = config.get(CONF_BROADCAST_TIMEOUT) if listen_broadcasts else None
+    poll_concurrency = config.get(CONF_POLL_CONCURRENCY)
+    service_concurrency = config.get(CONF_SERVICE_CONCURRENCY)
+    session_ttl = config.get(CONF_SESSION_TTL)
 
     switches = []
 
@@ -391,11 +265,30 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
         scan_interval = config.get(CONF_SCAN_INTERVAL) if config.get(CONF_SCAN_INTERVAL) >= DEFAULT_SCAN_INTERVAL else DEFAULT_SCAN_INTERVAL
         icon = config.get(CONF_ICON)
         
-        device = SwitcherHeater(generated_entity_id, name, ip_address, phone_id, device_id, device_password, scan_interval, icon)
+        cadence = SwitcherHeaterPollCadence(scan_interval, config.get(CONF_FAST_SCAN_INTERVAL), config.get(CONF_MAX_SCAN_INTERVAL))
 
-        async_track_time_interval(hass, device.async_update_device_state, datetime.timedelta(seconds=scan_interval))
+        device = SwitcherHeater(generated_entity_id, name, ip_address, phone_id, device_id, device_password, scan_interval, icon, cadence, session_ttl, broadcast_timeout)
         switches.append(device)
 
+    switches_by_entity_id = {switch.entity_id: switch for switch in switches}
+    service_dispatcher = SwitcherHeaterServiceDispatcher(hass.loop, service_concurrency)
+
+    @asyncio.coroutine
+    def async_dispatch_service(service, method_name, *args):
+        """Run the service concurrently on all the targeted devices and publish the per device results"""
+        targets = []
+        for entity_id in service.data[CONF_ENTITY_ID]:
+            switch = switches_by_entity_id.get(entity_id)
+            if switch is None:
+                _LOGGER.error("the entity id " + entity_id + " is not a switcher device")
+            else:
+                targets.append(switch)
+        if not targets:
+            return
+
+        service_results = yield from service_dispatcher.dispatch(service.service, targets, method_name, *args)
+        hass.bus.async_fire(EVENT_SERVICE_RESULTS, {ATTR_SERVICE: service.service, ATTR_RESULTS: service_results})
+
     @asyncio.coroutine
     def async_turn_on_with_timer_service(service):
         """Service for handling turn on with 15/30/45/60 minutes timer"""
@@ -410,38 +303,14 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
             else:
                 _LOGGER.error(service_name + " is not a legitimate notify service name")
 
-        for entity_id in service.data[CONF_ENTITY_ID]:
-            if service.service == TURN_ON_15_SERVICE:
-                minutes = "15"
-            elif service.service == TURN_ON_30_SERVICE:
-                minutes = "30"
-            elif service.service == TURN_ON_45_SERVICE:
-                minutes = "45"
-            elif service.service == TURN_ON_60_SERVICE:
-                minutes = "60"
-
-            _LOGGER.debug("received turn on with " + minutes + " minutes timer request id " + service.call_id + " for " + entity_id)
-
-            for switch in switches:
-                found = False
-                if switch.entity_id == entity_id:
-                    found = True
-                    yield from hass.async_add_job(switch.async_turn_on_with_timer(minutes, notify_service))
-                    break
-                if not found:
-                    _LOGGER.error("the entity id " + entity_id + " is not a switcher device")
+        minutes = TIMER_SERVICES_MINUTES[service.service]
+        _LOGGER.debug("received turn on with " + minutes + " minutes timer request id " + service.call_id)
+        yield from async_dispatch_service(service, "async_turn_on_with_timer", minutes, notify_service)
 
     @asyncio.coroutine
     def async_set_auto_off_service(service):
-        for entity_id in service.data[CONF_ENTITY_ID]:
-            for switch in switches:
-                found = False
-                if switch.entity_id == entity_id:
-                    found = True
-                    yield from hass.async_add_job(switch.async_set_auto_off(service.data[CONF_AUTO_OFF_CONFIG]))
-                    break
-                if not found:
-                    _LOGGER.error("the entity id " + entity_id + " is not a switcher device")
+        """Service for handling auto-off configuration"""
+        yield from async_dispatch_service(service, "async_set_auto_off", service.data[CONF_AUTO_OFF_CONFIG])
 
     if switches:
         hass.services.async_register(DOMAIN, TURN_ON_15_SERVICE, async_turn_on_with_timer_service, schema=TIMER_SERVICE_SCHEMA)
@@ -452,13 +321,91 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
         
         async_add_devices(switches, True)
 
+        @callback
+        def publish_poll_cycle(duration, polled, failed):
+            """Publish the duration of each poll cycle"""
+            hass.bus.async_fire(EVENT_POLL_CYCLE, {ATTR_CYCLE_DURATION: round(duration, 3), ATTR_CYCLE_POLLED: polled, ATTR_CYCLE_FAILED: failed})
+
+        """One scheduler polls all the devices, the interval is the shortest fast scan interval"""
+        scheduler = SwitcherHeaterPollScheduler(hass.loop, min(switch.fast_scan_interval for switch in switches), poll_concurrency, cycle_callback=publish_poll_cycle)
+        for switch in switches:
+            scheduler.add_device(switch)
+        scheduler.start()
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, scheduler.stop)
+
+        @callback
+        def close_connections(event):
+            """Close the devices sessions"""
+            for switch in switches:
+                hass.async_add_job(switch.close_connection)
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, close_connections)
+
+        if listen_broadcasts:
+            """Update the entities from the devices broadcasts, polling is kept as fallback"""
+            SwitcherHeaterBroadcastListener(hass, {switch.device_id: switch for switch in switches}).start()
+
     return True
 
+"""###########################
+##### Broadcast Listener #####
+###########################"""
+class SwitcherHeaterBroadcastListener(threading.Thread):
+    """listens for the switcher v2 udp broadcasts and dispatches them to the entities"""
+    def __init__(self, hass, devices):
+        threading.Thread.__init__(self)
+        """initialize the listener"""
+        self._hass = hass
+        self._devices = devices
+        self._ok_to_run = False
+        self._udp_socket = None
+
+    def run(self):
+        """register functions for event listening"""
+        self._hass.bus.listen_once(EVENT_HOMEASSISTANT_STOP, self.stop)
+
+        """start broadcast watch loop"""
+        _LOGGER.debug("starting broadcast watch loop")
+        try:
+            self._udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._udp_socket.settimeout(1)
+            self._udp_socket.bind(SOCKET_BIND_TUP)
+            self._ok_to_run = True
+        except:
+            _LOGGER.error("exception while binding broadcast socket, falling back to polling " + traceback.format_exc())
+
+        while self._ok_to_run:
+            try:
+                message, address = self._udp_socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except:
+                _LOGGER.error("exception while receiving broadcast message " + traceback.format_exc())
+                continue
+
+            capture_broadcast(message)
+            msg = SwitcherV2BroadcastMSG(message)
+            if msg.verified:
+                device = self._devices.get(msg.device_id)
+                if not device is None:
+                    self._hass.add_job(device.async_update_from_broadcast, msg)
+            else:
+                _LOGGER.debug("message not verified as a switcher v2 broadcast message")
+
+        if not self._udp_socket is None:
+            self._udp_socket.close()
+        _LOGGER.debug("broadcast watch loop stopped")
+
+    def stop(self, event):
+        """stop the broadcast watch loop"""
+        self._ok_to_run = False
+
 """###########################
 ##### SwitcherV2 Entity ######
 ###########################"""
 class SwitcherHeater(SwitchDevice):
-    def __init__(self, generated_entity_id, name, ip_address, phone_id, device_id, device_password, scan_interval, icon):
+    def __init__(self, generated_entity_id, name, ip_address, phone_id, device_id, device_password, scan_interval, icon, cadence, session_ttl=DEFAULT_SESSION_TTL, broadcast_timeout=None):
         """Initialize the device"""
         self.entity_id = generated_entity_id
         self._name = name
@@ -468,13 +415,21 @@ class SwitcherHeater(SwitchDevice):
         self._device_password = device_password
         self._scan_interval = scan_interval
         self._icon = icon
+        self._cadence = cadence
+        self._connection = SwitcherV2Connection(ip_address, phone_id, device_password, ttl=session_ttl)
+        self._broadcast_timeout = broadcast_timeout
 
         self._state = None
-        self._skip_update = False
+        self._last_broadcast = None
+        self._last_update_source = None
+        self._requests = SwitcherHeaterRequests()
         self._current_power_w = None
         self._current_power_a = None
         self._listenr_remove_func = None
         self._auto_off_time_left = None
+        self._countdown = SwitcherHeaterCountdown()
+        self._countdown_handle = None
+        self._breaker = SwitcherHeaterCircuitBreaker()
         self._auto_off_config = None
 
         _LOGGER.debug('new entity established: ' + self.entity_id)
@@ -482,56 +437,37 @@ class SwitcherHeater(SwitchDevice):
     """############################
     ###### Request Handlers #######
     ############################"""
-    @asyncio.coroutine
-    def async_send_command_to_device(self, cmd, timer=None):
+    """The request handlers are blocking, they run in the executor, the circuit breaker is checked in the loop by async_run_command"""
+    def send_command_to_device(self, cmd, timer=None):
         """Handles control requests"""
         status = current_power_w = current_power_a = auto_off_time_left = auto_off_config = None
         try:
-            sock = get_socket(self._ip_address)
-            if not sock is None:
-                ts = get_timestamp()
-                session_id = yield from async_send_login_packet(self._phone_id, self._device_password, sock, ts)
-                if not session_id is None:
-                    status, current_power_w, current_power_a, auto_off_time_left, auto_off_config =  yield from async_send_get_state_packet(self._device_id, sock, ts, session_id)
-                    if not status is None:
-                        status, current_power_w, current_power_a, auto_off_time_left = yield from async_send_control_packet(self._device_id, self._phone_id, self._device_password, sock, ts, session_id, cmd, timer)
-                    close_socket_connection(sock, self._ip_address)
+            status, current_power_w, current_power_a, auto_off_time_left, auto_off_config = send_get_state_packet(self._connection, self._device_id)
+            if not status is None:
+                status, current_power_w, current_power_a, auto_off_time_left = send_control_packet(self._connection, self._device_id, self._phone_id, self._device_password, cmd, timer)
         except:
             _LOGGER.error('failed to set the state of the device ' + traceback.format_exc())
 
         return status, current_power_w, current_power_a, auto_off_time_left, auto_off_config
 
-    @asyncio.coroutine
-    def async_get_state_of_device(self):
-        """Handles update requests"""
-        status = current_power_w = current_power_a = auto_off_time_left = auto_off_config = None
-        try:
-            sock = get_socket(self._ip_address)
-            if not sock is None:
-                ts = get_timestamp()
-                session_id = yield from async_send_login_packet(self._phone_id, self._device_password, sock, ts)
-                if not session_id is None:
-                    status, current_power_w, current_power_a, auto_off_time_left, auto_off_config = yield from async_send_get_state_packet(self._device_id, sock, ts, session_id)
-                    close_socket_connection(sock, self._ip_address)
-        except:
-            _LOGGER.error('failed to update device ' + traceback.format_exc())
+    def poll(self):
+        """Handles update requests, the poll is skipped if a command is running"""
+        sequence, timestamp = self._requests.stamp()
+        if self._requests.commands_in_flight > 0:
+            return SwitcherHeaterResult(sequence, timestamp, None, True)
+        return SwitcherHeaterResult(sequence, timestamp, self._connection.request(SwitcherV2StateResponseMSG, GET_STATE_PACKET, self._device_id), False)
 
-        return status, current_power_w, current_power_a, auto_off_time_left, auto_off_config
+    def close_connection(self):
+        """Close the connection to the device, blocking"""
+        self._connection.close()
 
-    @asyncio.coroutine
-    def async_set_auto_off_to_device(self, full_time):
+    def set_auto_off_to_device(self, full_time):
         """Handles control requests"""
         status = current_power_w = current_power_a = auto_off_time_left = auto_off_config = None
         try:
-            sock = get_socket(self._ip_address)
-            if not sock is None:
-                ts = get_timestamp()
-                session_id = yield from async_send_login_packet(self._phone_id, self._device_password, sock, ts)
-                if not session_id is None:
-                    status, current_power_w, current_power_a, auto_off_time_left, auto_off_config =  yield from async_send_get_state_packet(self._device_id, sock, ts, session_id)
-                    if not status is None:
-                        auto_off_config = yield from async_send_set_auto_off_packet(self._device_id, self._phone_id, self._device_password, full_time, sock, ts, session_id)
-                    close_socket_connection(sock, self._ip_address)
+            status, current_power_w, current_power_a, auto_off_time_left, auto_off_config = send_get_state_packet(self._connection, self._device_id)
+            if not status is None:
+                auto_off_config = send_set_auto_off_packet(self._connection, self._device_id, self._phone_id, self._device_password, full_time)
         except:
             _LOGGER.error('failed to set auto-off for the device ' + traceback.format_exc())
 
@@ -540,6 +476,26 @@ class SwitcherHeater(SwitchDevice):
     """############################
     ###### Entity Properties ######
     ############################"""
+    @property
+    def device_id(self):
+        """Return the device id as it appears in the broadcast messages."""
+        return self._device_id.lower()
+
+    @property
+    def scan_interval(self):
+        """Return the current scan interval in seconds."""
+        return self._cadence.interval
+
+    @property
+    def fast_scan_interval(self):
+        """Return the fastest scan interval in seconds."""
+        return self._cadence.fast_scan_interval
+
+    @property
+    def broadcasts_alive(self):
+        """Return true if a broadcast was received within the broadcast timeout."""
+        return not self._broadcast_timeout is None and not self._last_broadcast is None and time.monotonic() - self._last_broadcast < self._broadcast_timeout
+
     @property
     def name(self):
         """Return the name of the switch."""
@@ -558,7 +514,7 @@ class SwitcherHeater(SwitchDevice):
     @property
     def available(self):
         """Return true if the device is available for use."""
-        return self._state is not None
+        return self._state is not None and (self.broadcasts_alive or not self._breaker.is_open)
 
     @property
     def is_on(self):
@@ -580,6 +536,8 @@ class SwitcherHeater(SwitchDevice):
         """Return the optional state attributes."""
         attributes = {
             CONF_SCAN_INTERVAL: self._scan_interval,
+            ATTR_POLL_CADENCE: self._cadence.interval,
+            ATTR_CIRCUIT_BREAKER: self._breaker.state,
             CONF_IP_ADDRESS: self._ip_address
         }
 
@@ -587,10 +545,15 @@ class SwitcherHeater(SwitchDevice):
             attributes[ATTR_CURRENT_POWER_WATTS] = self._current_power_w
         if not self._current_power_a is None:
             attributes[ATTR_CURRENT_POWER_AMPS] = self._current_power_a
-        if not self._auto_off_time_left is None:
+        if self._countdown.active:
+            attributes[ATTR_AUTO_OFF_TIME_LEFT] = self._countdown.time_left()
+            attributes[ATTR_AUTO_OFF_AT] = self._countdown.expected_off().isoformat()
+        elif not self._auto_off_time_left is None:
             attributes[ATTR_AUTO_OFF_TIME_LEFT] = self._auto_off_time_left
         if not self._auto_off_config is None:
             attributes[ATTR_AUTO_OFF_CONFIG] = self._auto_off_config
+        if not self._last_update_source is None:
+            attributes[ATTR_LAST_UPDATE_SOURCE] = self._last_update_source
 
         return attributes
 
@@ -601,44 +564,37 @@ class SwitcherHeater(SwitchDevice):
     def async_turn_on(self, **kwargs):
         """Turn the switch on."""
         _LOGGER.debug('received turn on request')
-        """Skips next update after state changed, usefull for slow devices. if intial interval value was bigger or equals to 30, skip request will be ignored"""
-        self._skip_update = True
-        self._state, self._current_power_w, self._current_power_a, self._auto_off_time_left, self._auto_off_config = yield from self.hass.async_add_job(self.async_send_command_to_device,  "1")
-        if self._state is None:
-            self._skip_update = False
+        self._cadence.snap_back()
+        yield from self.async_run_command(self.send_command_to_device, COMMAND_ON)
         if self._auto_off_time_left is None:
             self._auto_off_time_left = self._auto_off_config
+        self.async_restart_countdown()
         yield from self.async_update_ha_state()
 
     @asyncio.coroutine
     def async_turn_off(self, **kwargs):
         """Turn the switch off."""
         _LOGGER.debug('received turn off request')
-        """Skips next update after state changed, usefull for slow devices. if intial interval value was bigger or equals to 30, skip request will be ignored"""
-        self._skip_update = True
-        self._state, self._current_power_w, self._current_power_a, self._auto_off_time_left, self._auto_off_config = yield from self.hass.async_add_job(self.async_send_command_to_device,  "0")
-        if self._state is None:
-            self._skip_update = False
+        self._cadence.snap_back()
+        yield from self.async_run_command(self.send_command_to_device, COMMAND_OFF)
+        self.async_restart_countdown()
         yield from self.async_update_ha_state()
 
     @asyncio.coroutine
     def async_turn_on_with_timer(self, minutes, notify_service):
-        """Turn the switch on with 15/30/45/60 minutes timer."""
+        """Turn the switch on with 15/30/45/60 minutes timer, returns true if the device responded."""
         _LOGGER.debug('received turn on request')
-        """Skips next update after state changed, usefull for slow devices. if intial interval value was bigger or equals to 30, skip request will be ignored"""
-        self._skip_update = True
-        self._state, self._current_power_w, self._current_power_a, self._auto_off_time_left, self._auto_off_config = yield from self.hass.async_add_job(self.async_send_command_to_device,  "1", minutes)
-        if self._state is None:
-            self._skip_update = False
-        elif not notify_service is None:
+        self._cadence.snap_back()
+        status = yield from self.async_run_command(self.send_command_to_device, COMMAND_ON, minutes)
+        if not status is None and not notify_service is None:
             """Handle notification services turned on request"""
-            ON_DATA = TIMER_TURN_ON_NOTIFICATION_DATA
+            ON_DATA = dict(TIMER_TURN_ON_NOTIFICATION_DATA)
             ON_DATA["message"] = ON_DATA["message"].format(self._name, minutes)
             self.hass.async_add_job(self.hass.services.async_call(NOTIFY_DOMAIN, notify_service, ON_DATA))
             _LOGGER.debug('turned on notification sent to ' + notify_service)
 
             """Handle notification services turned off registration"""
-            OFF_DATA = TIMER_TURN_OFF_NOTIFICATION_DATA
+            OFF_DATA = dict(TIMER_TURN_OFF_NOTIFICATION_DATA)
             OFF_DATA["message"] = OFF_DATA["message"].format(self._name)
             
             @callback
@@ -659,27 +615,114 @@ class SwitcherHeater(SwitchDevice):
             self._listenr_remove_func = async_track_state_change(self.hass, self.entity_id, send_turn_off_notification, to_state=STATE_OFF)
             _LOGGER.debug('turned off notification registered to ' + notify_service)
 
+        self.async_restart_countdown()
         yield from self.async_update_ha_state()
+        return status is not None
 
     @asyncio.coroutine
     def async_set_auto_off(self, full_time):
-        """Turn the switch off."""
+        """Set the auto-off configuration, returns true if the device responded."""
         _LOGGER.debug('received turn off request')
-        """Skips next update after state changed, usefull for slow devices. if intial interval value was bigger or equals to 30, skip request will be ignored"""
-        self._skip_update = True
-        self._state, self._current_power_w, self._current_power_a, self._auto_off_time_left, self._auto_off_config = yield from self.hass.async_add_job(self.async_set_auto_off_to_device , full_time)
-        if self._state is None:
-            self._skip_update = False
+        self._cadence.snap_back()
+        status = yield from self.async_run_command(self.set_auto_off_to_device, full_time)
+        self.async_restart_countdown()
         yield from self.async_update_ha_state()
+        return status is not None and self._auto_off_config is not None
 
     @asyncio.coroutine
-    def async_update_device_state(self, event):
-        """Update the device's state and attributes"""
-        _LOGGER.debug('received update request')
-        if self._skip_update == True and self._scan_interval < 30:
-            _LOGGER.debug('skipping unnecessary update request')
+    def async_run_command(self, request_handler, *args):
+        """Run a request handler in the executor and apply its result unless a newer result was already applied, returns the device state from the result"""
+        sequence, timestamp = self._requests.command_started()
+        result = (None, None, None, None, None)
+        try:
+            """The breaker is only touched from the loop, the poll results update it too"""
+            if self._breaker.allow_request():
+                try:
+                    result = yield from self.hass.async_add_job(request_handler, *args)
+                finally:
+                    self._breaker.record(not result[0] is None)
+            else:
+                _LOGGER.error('the device ' + self.entity_id + ' is not responding, try again later')
+        finally:
+            self._requests.command_done()
+
+        if self._requests.apply(sequence, timestamp):
+            self._state, self._current_power_w, self._current_power_a, self._auto_off_time_left, self._auto_off_config = result
+        return result[0]
+
+    @callback
+    def poll_required(self):
+        """Return false for skipping the next scheduled poll"""
+        if self.hass is None or self.broadcasts_alive or self._requests.commands_in_flight > 0:
+            return False
+        return self._breaker.allow_request()
+
+    @callback
+    def async_poll_result(self, result):
+        """Update the device's state and attributes from a poll result"""
+        if not settle_poll_result(self._requests, self._breaker, result):
+            """The poll was skipped or a newer result was applied while it was running"""
+            return
+
+        msg = None if result is None else result.response
+        self._state = self._current_power_w = self._current_power_a = self._auto_off_time_left = self._auto_off_config = None
+        if not msg is None and msg.successful:
+            self._state = msg.state
+            self._auto_off_config = msg.auto_off
+            if msg.state == STATE_ON:
+                self._current_power_w, self._current_power_a, self._auto_off_time_left = msg.power, msg.current, msg.time_left
+        self._last_update_source = UPDATE_SOURCE_POLL
+        self._cadence.update(None if self._state is None else self._state == STATE_ON)
+
+        self.async_restart_countdown()
+        self.hass.async_add_job(self.async_update_ha_state())
+
+    @callback
+    def async_update_from_broadcast(self, msg):
+        """Update the device's state and attributes from a broadcast message"""
+        self._last_broadcast = time.monotonic()
+        if self.hass is None:
+            return
+        if self._requests.commands_in_flight > 0 or self._last_broadcast - self._requests.last_command_done < BROADCAST_SETTLE_TIME:
+            """The broadcast may have been sent before the last command was applied"""
+            _LOGGER.debug('skipping broadcast update after state changed')
+            return
+        self._requests.apply(*self._requests.stamp())
+
+        self._state = msg.state
+        self._auto_off_config = msg.auto_off
+        if msg.state == STATE_ON:
+            self._current_power_w, self._current_power_a, self._auto_off_time_left = msg.power, msg.current, msg.time_left
         else:
-            self._state, self._current_power_w, self._current_power_a, self._auto_off_time_left, self._auto_off_config = yield from self.hass.async_add_job(self.async_get_state_of_device)
-            
-        self._skip_update = False
-        yield from self.async_update_ha_state()
+            self._current_power_w = self._current_power_a = self._auto_off_time_left = None
+        self._last_update_source = UPDATE_SOURCE_BROADCAST
+
+        self.async_restart_countdown()
+        self.hass.async_add_job(self.async_update_ha_state())
+
+    @callback
+    def async_restart_countdown(self):
+        """Correct the local auto-off countdown from the last state update and reschedule its timer"""
+        if not self._countdown_handle is None:
+            self._countdown_handle.cancel()
+            self._countdown_handle = None
+
+        if self._state == STATE_ON and not self._auto_off_time_left is None:
+            self._countdown.set(self._auto_off_time_left)
+            self._countdown_handle = self.hass.loop.call_later(self._countdown.remaining(), self.async_countdown_expired)
+        else:
+            self._countdown.clear()
+
+    @callback
+    def async_countdown_expired(self):
+        """Turn the entity off at the auto-off deadline, the next poll will correct it if needed"""
+        self._countdown_handle = None
+        self._countdown.clear()
+        if self._state != STATE_ON:
+            return
+        _LOGGER.debug('auto-off countdown expired for ' + self.entity_id)
+        self._state = STATE_OFF
+        self._current_power_w = self._current_power_a = self._auto_off_time_left = None
+        self._last_update_source = UPDATE_SOURCE_COUNTDOWN
+        self._cadence.snap_back()
+        self.hass.async_add_job(self.async_update_ha_state())
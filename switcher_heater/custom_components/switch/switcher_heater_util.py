@@ -0,0 +1,462 @@
+"""
+Home Assistant free tools for the switcher_heater platform.
+
+The poll scheduler runs the devices blocking state polls in the loop's executor, spread across the poll interval
+with a random jitter and with a bounded number of polls running at the same time. The polls start within the first
+POLL_SPREAD part of the interval, leaving the rest for the last polls to finish before the next cycle.
+
+A polled device is any object providing:
+- scan_interval: the device's current scan interval in seconds, read on every cycle so it may change between polls.
+- poll_required(): runs in the loop, return false for skipping the device's poll in the current cycle.
+- poll(): blocking, runs in the executor, returns the poll result, a false result is counted as a failed poll.
+- async_poll_result(result): runs in the loop, result is None if poll() raised an exception.
+
+The results are stamped with a request sequence and a monotonic timestamp, a result older than the
+one already applied to a device is discarded when it arrives. A running poll is not cancelled by a command, its
+result is dropped if the command's result was applied first. A poll reaching the executor while a command is
+running is skipped without dialing the device.
+
+The service dispatcher runs a service on the targeted devices with a bounded number of devices handled at the same
+time, each device is any object providing an entity_id and the service's coroutine method, returning true on success.
+
+The circuit breaker stops dialing a device after consecutive failures and lets one probe through every reset timeout.
+It isn't thread safe, the platform only uses it from the event loop, around the executor jobs.
+
+The countdown keeps the monotonic deadline of the device's auto-off, deriving the time left without polling the device.
+"""
+import datetime
+import itertools
+import logging
+import random
+import time
+import traceback
+from collections import deque, namedtuple
+from functools import partial
+
+_LOGGER = logging.getLogger(__name__)
+
+"""###############################
+######## Default Values ##########
+###############################"""
+DEFAULT_POLL_CONCURRENCY = 5
+DEFAULT_SERVICE_CONCURRENCY = 10
+DEFAULT_FAST_SCAN_INTERVAL = 5
+DEFAULT_MAX_SCAN_INTERVAL = 300
+FAST_POLLS_AFTER_COMMAND = 3
+DEFAULT_BREAKER_FAILURES = 3
+DEFAULT_BREAKER_RESET_TIMEOUT = 60
+POLL_SPREAD = 0.75
+
+"""###############################
+##### Circuit Breaker States #####
+###############################"""
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+"""###########################
+######## Poll Results ########
+###########################"""
+class SwitcherHeaterResult(namedtuple('SwitcherHeaterResult', ['sequence', 'timestamp', 'response', 'skipped'])):
+    """a poll result stamped with the request sequence and monotonic timestamp, skipped if a command was running"""
+    __slots__ = ()
+
+    def __bool__(self):
+        """return false if the device did not respond"""
+        return self.skipped or not self.response is None
+
+
+class SwitcherHeaterRequests(object):
+    """orders the results of a device's polls, commands and broadcasts by the sequence of their requests"""
+    def __init__(self):
+        """initialize the sequence"""
+        self._sequence = itertools.count(1)
+        self._applied_sequence = 0
+        self._applied_timestamp = None
+        self._commands_in_flight = 0
+        self._last_command_done = 0
+
+    @property
+    def applied_sequence(self):
+        """return the sequence of the last applied result"""
+        return self._applied_sequence
+
+    @property
+    def commands_in_flight(self):
+        """return the number of commands not yet done"""
+        return self._commands_in_flight
+
+    @property
+    def last_command_done(self):
+        """return the monotonic time the last command was done"""
+        return self._last_command_done
+
+    def stamp(self):
+        """return the next request sequence and the monotonic timestamp of the request, thread safe"""
+        return next(self._sequence), time.monotonic()
+
+    def command_started(self):
+        """stamp a command request, polls are skipped until it is done"""
+        self._commands_in_flight += 1
+        return self.stamp()
+
+    def command_done(self, now=None):
+        """record the end of a command"""
+        self._commands_in_flight -= 1
+        self._last_command_done = time.monotonic() if now is None else now
+
+    def apply(self, sequence, timestamp):
+        """return true and record the result if no newer result was applied, a stale result returns false"""
+        if sequence < self._applied_sequence:
+            _LOGGER.debug('discarding result ' + str(sequence) + ', result ' + str(self._applied_sequence) + ' is newer')
+            return False
+        self._applied_sequence, self._applied_timestamp = sequence, timestamp
+        return True
+
+
+def settle_poll_result(requests, breaker, result, now=None):
+    """settle the breaker's probe with a poll result, returns true if the result should be applied to the device"""
+    if result is None:
+        breaker.record(False, now)
+        return True
+    if result.skipped:
+        """the device was not dialed, let the next poll probe it"""
+        _LOGGER.debug('poll ' + str(result.sequence) + ' was skipped while a command was running')
+        breaker.release()
+        return False
+    """a stale result still tells if the device responded"""
+    breaker.record(not result.response is None and result.response.successful, now)
+    return requests.apply(result.sequence, result.timestamp)
+
+"""###########################
+######## Poll Cadence ########
+###########################"""
+class SwitcherHeaterPollCadence(object):
+    """the scan interval policy of a device: fast after commands, scan interval while on and exponential backoff while off"""
+    def __init__(self, scan_interval, fast_scan_interval=DEFAULT_FAST_SCAN_INTERVAL, max_scan_interval=DEFAULT_MAX_SCAN_INTERVAL, fast_polls=FAST_POLLS_AFTER_COMMAND):
+        """initialize the cadence"""
+        self._scan_interval = scan_interval
+        self._fast_scan_interval = min(fast_scan_interval, scan_interval)
+        self._max_scan_interval = max(max_scan_interval, scan_interval)
+        self._fast_polls = fast_polls
+        self._fast_polls_left = 0
+        self._interval = scan_interval
+
+    @property
+    def interval(self):
+        """return the current scan interval in seconds"""
+        return self._interval
+
+    @property
+    def fast_scan_interval(self):
+        """return the fastest scan interval in seconds"""
+        return self._fast_scan_interval
+
+    def snap_back(self):
+        """poll fast for the next few polls, called on commands and service calls"""
+        self._fast_polls_left = self._fast_polls
+        self._interval = self._fast_scan_interval
+
+    def update(self, is_on):
+        """set the next interval after a poll, is_on is None when the device did not respond"""
+        if self._fast_polls_left > 0:
+            self._fast_polls_left -= 1
+            self._interval = self._fast_scan_interval
+        elif is_on is False:
+            self._interval = min(self._interval * 2, self._max_scan_interval) if self._interval >= self._scan_interval else self._scan_interval
+        else:
+            self._interval = self._scan_interval
+        return self._interval
+
+"""###########################
+###### Circuit Breaker #######
+###########################"""
+class SwitcherHeaterCircuitBreaker(object):
+    """closed while the device responds, open after consecutive failures and half open while probing the device"""
+    def __init__(self, failure_threshold=DEFAULT_BREAKER_FAILURES, reset_timeout=DEFAULT_BREAKER_RESET_TIMEOUT):
+        """initialize the breaker"""
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = BREAKER_CLOSED
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def state(self):
+        """return the breaker state"""
+        return self._state
+
+    @property
+    def is_open(self):
+        """return true if requests to the device are blocked"""
+        return self._state == BREAKER_OPEN
+
+    def allow_request(self, now=None):
+        """return true if the device may be dialed, moves an open breaker to half open once the reset timeout has passed"""
+        if self._state == BREAKER_CLOSED:
+            return True
+        if self._state == BREAKER_OPEN and (time.monotonic() if now is None else now) - self._opened_at >= self._reset_timeout:
+            _LOGGER.debug('circuit breaker half open, probing device')
+            self._state = BREAKER_HALF_OPEN
+            return True
+        """only one probe at a time while half open"""
+        return False
+
+    def record(self, successful, now=None):
+        """record the result of a request to the device"""
+        if successful:
+            if self._state != BREAKER_CLOSED:
+                _LOGGER.debug('circuit breaker closed, device is responding')
+            self._state = BREAKER_CLOSED
+            self._failures = 0
+            return
+
+        self._failures += 1
+        if self._state == BREAKER_HALF_OPEN or self._failures >= self._failure_threshold:
+            if self._state != BREAKER_OPEN:
+                _LOGGER.warning('circuit breaker open after ' + str(self._failures) + ' consecutive failures')
+            self._state = BREAKER_OPEN
+            self._opened_at = time.monotonic() if now is None else now
+
+    def release(self):
+        """reopen a half open breaker whose probe was not sent, the next request may probe the device"""
+        if self._state == BREAKER_HALF_OPEN:
+            self._state = BREAKER_OPEN
+
+"""###########################
+######### Countdown ##########
+###########################"""
+def convert_iso_time_to_seconds(iso_time):
+    """convert iso time (%H:%M:%S) to seconds"""
+    hours, minutes, seconds = iso_time.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+class SwitcherHeaterCountdown(object):
+    """local countdown to the device's auto-off, corrected by every state update"""
+    def __init__(self):
+        """initialize the countdown"""
+        self._deadline = None
+
+    @property
+    def active(self):
+        """return true if a deadline is set"""
+        return not self._deadline is None
+
+    def set(self, time_left, now=None):
+        """set the deadline from an iso time left, None clears the deadline"""
+        if time_left is None:
+            self._deadline = None
+        else:
+            self._deadline = (time.monotonic() if now is None else now) + convert_iso_time_to_seconds(time_left)
+        return self._deadline
+
+    def clear(self):
+        """clear the deadline"""
+        self._deadline = None
+
+    def remaining(self, now=None):
+        """return the seconds left to the deadline or None"""
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - (time.monotonic() if now is None else now))
+
+    def time_left(self, now=None):
+        """return the iso time left to the deadline or None"""
+        remaining = self.remaining(now)
+        if remaining is None:
+            return None
+        minutes, seconds = divmod(int(round(remaining)), 60)
+        hours, minutes = divmod(minutes, 60)
+        return "%02d:%02d:%02d" % (hours, minutes, seconds)
+
+    def expected_off(self, now=None):
+        """return the local datetime expected for the auto-off or None"""
+        remaining = self.remaining(now)
+        if remaining is None:
+            return None
+        return (datetime.datetime.now() + datetime.timedelta(seconds=remaining)).replace(microsecond=0)
+
+"""###########################
+##### Service Dispatcher #####
+###########################"""
+class SwitcherHeaterServiceDispatcher(object):
+    """runs the services on the targeted devices concurrently, the concurrency limit is shared by all the service calls"""
+    def __init__(self, loop, concurrency=DEFAULT_SERVICE_CONCURRENCY):
+        """initialize the dispatcher"""
+        self._loop = loop
+        self._concurrency = max(1, concurrency)
+        self._queue = deque()
+        self._active = 0
+
+    @property
+    def active(self):
+        """return the number of devices currently handled"""
+        return self._active
+
+    def dispatch(self, service, devices, method_name, *args):
+        """run the method on all the devices, returns a future of the entity ids and true for each device that succeeded"""
+        future = self._loop.create_future()
+        call = {"service": service, "future": future, "results": {}, "pending": len(devices)}
+        if not devices:
+            future.set_result(call["results"])
+            return future
+        for device in devices:
+            self._queue.append((call, device, method_name, args))
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """start queued devices while there is room"""
+        while self._queue and self._active < self._concurrency:
+            call, device, method_name, args = self._queue.popleft()
+            self._active += 1
+            try:
+                task = self._loop.create_task(getattr(device, method_name)(*args))
+            except Exception:
+                _LOGGER.error('service ' + call["service"] + ' failed for ' + device.entity_id + ' ' + traceback.format_exc())
+                self._device_done(call, device, False)
+                continue
+            task.add_done_callback(partial(self._task_done, call, device))
+
+    def _task_done(self, call, device, task):
+        """collect the device's result"""
+        result = False
+        try:
+            result = task.result()
+        except Exception:
+            _LOGGER.error('service ' + call["service"] + ' failed for ' + device.entity_id + ' ' + traceback.format_exc())
+        else:
+            if not result:
+                _LOGGER.error('service ' + call["service"] + ' failed for ' + device.entity_id)
+        self._device_done(call, device, result is True)
+        self._dispatch()
+
+    def _device_done(self, call, device, successful):
+        """record the device's result and resolve the call after the last device"""
+        self._active -= 1
+        call["results"][device.entity_id] = successful
+        call["pending"] -= 1
+        if call["pending"] == 0 and not call["future"].done():
+            _LOGGER.debug('service ' + call["service"] + ' results: ' + str(call["results"]))
+            call["future"].set_result(call["results"])
+
+"""###########################
+####### Poll Scheduler #######
+###########################"""
+class SwitcherHeaterPollScheduler(object):
+    """spreads the devices polls across the interval and runs them with bounded concurrency"""
+    def __init__(self, loop, interval, concurrency=DEFAULT_POLL_CONCURRENCY, executor=None, cycle_callback=None):
+        """initialize the scheduler, cycle_callback(duration, polled, failed) is called in the loop at the end of each cycle"""
+        self._loop = loop
+        self._interval = interval
+        self._concurrency = max(1, concurrency)
+        self._executor = executor
+        self._cycle_callback = cycle_callback
+
+        self._devices = []
+        self._queue = deque()
+        self._handles = []
+        self._next_cycle_handle = None
+        self._last_polls = {}
+        self._cycle_start = None
+        self._pending = 0
+        self._active = 0
+        self._failed = 0
+        self._polled = 0
+        self._last_cycle_duration = None
+
+    @property
+    def interval(self):
+        """return the cycle interval in seconds"""
+        return self._interval
+
+    @property
+    def last_cycle_duration(self):
+        """return the duration in seconds of the last completed cycle"""
+        return self._last_cycle_duration
+
+    @property
+    def running(self):
+        """return true if a cycle is in progress"""
+        return self._pending > 0
+
+    def add_device(self, device):
+        """add a device to be polled starting from the next cycle"""
+        self._devices.append(device)
+
+    def start(self):
+        """start the first cycle, must be called from the loop"""
+        self._next_cycle_handle = self._loop.call_soon(self._start_cycle)
+
+    def stop(self, event=None):
+        """cancel the scheduled cycle and the polls not yet dispatched"""
+        if not self._next_cycle_handle is None:
+            self._next_cycle_handle.cancel()
+            self._next_cycle_handle = None
+        for handle in self._handles:
+            handle.cancel()
+        self._handles = []
+        self._queue.clear()
+
+    def _start_cycle(self):
+        """spread the due devices across the interval"""
+        now = self._loop.time()
+        self._next_cycle_handle = self._loop.call_at(now + self._interval, self._start_cycle)
+        if self._pending > 0:
+            _LOGGER.warning('poll cycle is still running after ' + str(round(now - self._cycle_start, 3)) + ' seconds, skipping the next cycle')
+            return
+
+        due = []
+        for device in self._devices:
+            """devices with longer scan intervals are polled in some of the cycles"""
+            last_poll = self._last_polls.get(device)
+            if (last_poll is None or now - last_poll >= device.scan_interval - self._interval / 2) and device.poll_required():
+                self._last_polls[device] = now
+                due.append(device)
+        if not due:
+            return
+
+        self._cycle_start = now
+        self._pending = len(due)
+        self._polled = len(due)
+        self._failed = 0
+        slot = self._interval * POLL_SPREAD / len(due)
+        self._handles = [self._loop.call_later((index + random.random()) * slot, self._enqueue, device) for index, device in enumerate(due)]
+
+    def _enqueue(self, device):
+        """queue a device for polling"""
+        self._queue.append(device)
+        self._dispatch()
+
+    def _dispatch(self):
+        """run queued polls while there is room"""
+        while self._queue and self._active < self._concurrency:
+            device = self._queue.popleft()
+            self._active += 1
+            future = self._loop.run_in_executor(self._executor, device.poll)
+            future.add_done_callback(partial(self._poll_done, device))
+
+    def _poll_done(self, device, future):
+        """hand the result to the device and close the cycle after the last poll"""
+        self._active -= 1
+        result = None
+        try:
+            result = future.result()
+        except Exception:
+            _LOGGER.error('failed to poll device ' + traceback.format_exc())
+        if not result:
+            self._failed += 1
+
+        try:
+            device.async_poll_result(result)
+        except Exception:
+            _LOGGER.error('failed to update device from poll result ' + traceback.format_exc())
+
+        self._pending -= 1
+        if self._pending == 0:
+            self._last_cycle_duration = self._loop.time() - self._cycle_start
+            _LOGGER.debug('poll cycle of ' + str(self._polled) + ' devices finished in ' + str(round(self._last_cycle_duration, 3)) + ' seconds, ' + str(self._failed) + ' failed')
+            if not self._cycle_callback is None:
+                self._cycle_callback(self._last_cycle_duration, self._polled, self._failed)
+        self._dispatch()
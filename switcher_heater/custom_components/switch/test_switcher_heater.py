@@ -0,0 +1,401 @@
+import asyncio
+import datetime
+import os
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from struct import pack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'switcher_v2_protocol', 'custom_components'))
+
+import switcher_heater_util
+import switcher_v2_protocol as protocol
+
+PHONE_ID = "1234"
+DEVICE_PASSWORD = "00112233"
+SESSION_ID = b"\x0a\x0b\x0c\x0d"
+HEATERS = 200
+
+
+def device_id(index):
+  return "%06x" % (0xa00000 + index)
+
+
+def make_state_response(index):
+  response = bytearray(110)
+  response[0:2] = protocol.PACKET_MAGIC
+  response[8:12] = SESSION_ID
+  response[75:77] = protocol.STATE_BYTES_ON if index % 2 == 0 else protocol.STATE_BYTES_OFF
+  response[77:79] = pack('<H', index)
+  response[89:93] = pack('<I', 60)
+  response[97:101] = pack('<I', 3600)
+  return bytes(response)
+
+
+class FakeHeatersServer(socketserver.ThreadingTCPServer):
+  """stand-in for many heaters behind one port, the device is picked by the device id of the get state packet"""
+  daemon_threads = True
+
+  def __init__(self, latency, requests_per_connection=None):
+    socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0), FakeHeaterHandler)
+    self.latency = latency
+    self.requests_per_connection = requests_per_connection
+    self.lock = threading.Lock()
+    self.requests = self.logins = 0
+
+
+class FakeHeaterHandler(socketserver.BaseRequestHandler):
+  def handle(self):
+    server = self.server
+    handled = 0
+    while server.requests_per_connection is None or handled < server.requests_per_connection:
+      request = self.request.recv(1024)
+      if not request:
+        break
+      handled += 1
+      time.sleep(server.latency)
+      with server.lock:
+        server.requests += 1
+      if protocol.get_request_type(request) == protocol.REQUEST_LOGIN:
+        with server.lock:
+          server.logins += 1
+        self.request.send(make_state_response(0))
+      else:
+        self.request.send(make_state_response(int(request[40:43].hex(), 16) - 0xa00000))
+
+
+class FakeHeater(object):
+  lock = threading.Lock()
+  active = max_active = 0
+
+  def __init__(self, index, port, scan_interval):
+    self.index = index
+    self.port = port
+    self.scan_interval = scan_interval
+    self.results = []
+    self.polled_at = []
+
+  def poll_required(self):
+    return True
+
+  def poll(self):
+    self.polled_at.append(time.monotonic())
+    if self.port is None:
+      return True
+    with FakeHeater.lock:
+      FakeHeater.active += 1
+      FakeHeater.max_active = max(FakeHeater.max_active, FakeHeater.active)
+    try:
+      return protocol.get_device_state('127.0.0.1', PHONE_ID, device_id(self.index), DEVICE_PASSWORD, self.port)
+    finally:
+      with FakeHeater.lock:
+        FakeHeater.active -= 1
+
+  def async_poll_result(self, result):
+    self.results.append(result)
+
+
+def run_cycles(devices, interval, concurrency, cycles):
+  FakeHeater.max_active = 0
+  loop = asyncio.new_event_loop()
+  executor = ThreadPoolExecutor(max_workers=32)
+  done = loop.create_future()
+  reports = []
+
+  def cycle_callback(duration, polled, failed):
+    reports.append((duration, polled, failed))
+    if len(reports) == cycles and not done.done():
+      done.set_result(None)
+
+  scheduler = switcher_heater_util.SwitcherHeaterPollScheduler(loop, interval, concurrency, executor, cycle_callback)
+  for device in devices:
+    scheduler.add_device(device)
+  scheduler.start()
+  try:
+    loop.run_until_complete(asyncio.wait_for(done, interval * cycles + 10))
+  finally:
+    scheduler.stop()
+    executor.shutdown()
+    loop.close()
+  return reports
+
+
+def test_scale_200_heaters():
+  server = FakeHeatersServer(0.005)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  try:
+    interval = 2.0
+    heaters = [FakeHeater(index, server.server_address[1], 20) for index in range(HEATERS)]
+    reports = run_cycles(heaters, interval, 10, 1)
+  finally:
+    server.shutdown()
+    server.server_close()
+
+  duration, polled, failed = reports[0]
+  print('%d heaters polled in %.3f seconds, %d requests, max %d concurrent' % (polled, duration, server.requests, FakeHeater.max_active))
+  assert (polled, failed) == (HEATERS, 0)
+  assert FakeHeater.max_active <= 10
+  assert duration < interval + 1
+  for heater in heaters:
+    assert len(heater.results) == 1
+    msg = heater.results[0]
+    assert msg.state == (protocol.STATE_ON if heater.index % 2 == 0 else protocol.STATE_OFF)
+    assert msg.power == heater.index
+  # polls are spread across the interval instead of firing on the same tick
+  started = sorted(heater.polled_at[0] for heater in heaters)
+  assert started[-1] - started[0] > interval / 2
+
+
+def test_concurrency_limit():
+  server = FakeHeatersServer(0.02)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  try:
+    heaters = [FakeHeater(index, server.server_address[1], 20) for index in range(40)]
+    reports = run_cycles(heaters, 0.2, 3, 1)
+  finally:
+    server.shutdown()
+    server.server_close()
+
+  assert reports[0][1:] == (40, 0)
+  assert FakeHeater.max_active == 3
+
+
+def test_scan_interval_multiples():
+  fast = FakeHeater(0, None, 0.05)
+  slow = FakeHeater(1, None, 0.1)
+  run_cycles([fast, slow], 0.05, 2, 4)
+  assert len(fast.results) == 4
+  assert len(slow.results) == 2
+
+
+def test_poll_cadence():
+  cadence = switcher_heater_util.SwitcherHeaterPollCadence(20, 5, 300, 3)
+  assert cadence.interval == 20
+  # backing off while off
+  assert [cadence.update(False) for _ in range(6)] == [40, 80, 160, 300, 300, 300]
+  # snapping back on commands, polling fast for a few polls
+  cadence.snap_back()
+  assert cadence.interval == 5
+  assert [cadence.update(False) for _ in range(5)] == [5, 5, 5, 20, 40]
+  assert cadence.update(True) == 20
+  assert cadence.update(None) == 20
+  assert switcher_heater_util.SwitcherHeaterPollCadence(20, 30, 10).fast_scan_interval == 20
+
+
+def test_countdown():
+  assert switcher_heater_util.convert_iso_time_to_seconds("01:02:05") == 3725
+  countdown = switcher_heater_util.SwitcherHeaterCountdown()
+  assert not countdown.active and countdown.time_left() is None and countdown.expected_off() is None
+  countdown.set("00:30:00", now=1000.0)
+  assert countdown.remaining(now=1000.0) == 1800
+  assert countdown.time_left(now=1090.0) == "00:28:30"
+  assert countdown.time_left(now=5000.0) == "00:00:00"
+  # a poll corrects the deadline
+  countdown.set("00:10:00", now=1100.0)
+  assert countdown.remaining(now=1100.0) == 600
+  countdown.set(None)
+  assert not countdown.active
+  countdown.set("00:01:00")
+  assert 59 <= (countdown.expected_off() - datetime.datetime.now()).total_seconds() <= 61
+
+
+def test_circuit_breaker():
+  breaker = switcher_heater_util.SwitcherHeaterCircuitBreaker(3, 60)
+  assert breaker.state == switcher_heater_util.BREAKER_CLOSED
+  for _ in range(2):
+    assert breaker.allow_request(now=0)
+    breaker.record(False, now=0)
+  assert breaker.state == switcher_heater_util.BREAKER_CLOSED
+  breaker.record(False, now=0)
+  assert breaker.is_open and not breaker.allow_request(now=59)
+  # one probe after the reset timeout, a failed probe opens the breaker again
+  assert breaker.allow_request(now=60)
+  assert breaker.state == switcher_heater_util.BREAKER_HALF_OPEN and not breaker.allow_request(now=60)
+  breaker.record(False, now=60)
+  assert breaker.is_open and not breaker.allow_request(now=100)
+  assert breaker.allow_request(now=120)
+  breaker.record(True)
+  assert breaker.state == switcher_heater_util.BREAKER_CLOSED and breaker.allow_request()
+
+
+def get_states(server, ttl, count):
+  connection = protocol.SwitcherV2Connection('127.0.0.1', PHONE_ID, DEVICE_PASSWORD, server.server_address[1], ttl)
+  try:
+    return [connection.request(protocol.SwitcherV2StateResponseMSG, protocol.GET_STATE_PACKET, device_id(4)) for _ in range(count)]
+  finally:
+    connection.close()
+
+
+def test_session_reuse():
+  server = FakeHeatersServer(0, requests_per_connection=4)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  try:
+    # one login for three requests, then the device closes the connection and the session is renewed
+    states = get_states(server, 60, 6)
+    assert all(msg.successful and msg.power == 4 for msg in states)
+    assert server.logins == 2
+    # a zero ttl logs in for every request
+    server.logins = 0
+    assert all(msg.successful for msg in get_states(server, 0, 3))
+    assert server.logins == 3
+  finally:
+    server.shutdown()
+    server.server_close()
+
+
+def test_poll_results():
+  Result = switcher_heater_util.SwitcherHeaterResult
+  assert Result(1, 0.0, object(), False)
+  assert Result(2, 0.0, None, True)
+  assert not Result(3, 0.0, None, False)
+
+  class StampedHeater(FakeHeater):
+    def __init__(self, index, response, skipped):
+      FakeHeater.__init__(self, index, None, 0.05)
+      self.result = Result(index, time.monotonic(), response, skipped)
+
+    def poll(self):
+      return self.result
+
+  heaters = [StampedHeater(0, True, False), StampedHeater(1, None, True), StampedHeater(2, None, False)]
+  # skipped polls are not failures
+  assert run_cycles(heaters, 0.05, 3, 1)[0][1:] == (3, 1)
+  assert [heater.results[0].sequence for heater in heaters] == [0, 1, 2]
+
+
+def test_stale_poll_result():
+  requests = switcher_heater_util.SwitcherHeaterRequests()
+  # a poll is running when a command starts, the command's result is applied first
+  poll = requests.stamp()
+  command = requests.command_started()
+  assert requests.commands_in_flight == 1
+  requests.command_done(now=10.0)
+  assert requests.commands_in_flight == 0 and requests.last_command_done == 10.0
+  assert requests.apply(*command)
+  # the running poll was not cancelled, its result is dropped when it lands
+  assert not requests.apply(*poll)
+  assert requests.applied_sequence == command[0]
+
+  # a poll started after the command is applied
+  assert requests.apply(*requests.stamp())
+  assert requests.applied_sequence == command[0] + 1
+
+
+class FakeResponse(object):
+  def __init__(self, successful):
+    self.successful = successful
+
+
+def test_breaker_probe_settled():
+  Result = switcher_heater_util.SwitcherHeaterResult
+  requests = switcher_heater_util.SwitcherHeaterRequests()
+  breaker = switcher_heater_util.SwitcherHeaterCircuitBreaker(1, 60)
+  settle = switcher_heater_util.settle_poll_result
+
+  assert settle(requests, breaker, None, now=0)
+  assert breaker.is_open and not breaker.allow_request(now=59)
+
+  # the probe poll is skipped because a command started, the next poll probes again
+  assert breaker.allow_request(now=60)
+  assert not settle(requests, breaker, Result(*requests.stamp(), None, True))
+  assert breaker.is_open and breaker.allow_request(now=60)
+
+  # the probe poll lands after a newer result, its failure is recorded but not applied
+  poll = requests.stamp()
+  assert requests.apply(*requests.stamp())
+  assert not settle(requests, breaker, Result(*poll, FakeResponse(False), False), now=60)
+  assert breaker.is_open and not breaker.allow_request(now=60)
+
+  # a stale probe whose device responded closes the breaker
+  assert breaker.allow_request(now=120)
+  poll = requests.stamp()
+  assert requests.apply(*requests.stamp())
+  assert not settle(requests, breaker, Result(*poll, FakeResponse(True), False))
+  assert breaker.state == switcher_heater_util.BREAKER_CLOSED and breaker.allow_request()
+
+  # a fresh result is applied
+  assert settle(requests, breaker, Result(*requests.stamp(), FakeResponse(True), False))
+
+  # releasing a closed breaker does nothing
+  breaker.release()
+  assert breaker.state == switcher_heater_util.BREAKER_CLOSED
+
+
+class FakeServiceHeater(object):
+  active = 0
+  max_active = 0
+
+  def __init__(self, index, outcome, delay=0.05):
+    self.entity_id = 'switch.heater_' + str(index)
+    self.outcome = outcome
+    self.delay = delay
+    self.calls = []
+
+  async def async_set_auto_off(self, full_time):
+    self.calls.append(full_time)
+    FakeServiceHeater.active += 1
+    FakeServiceHeater.max_active = max(FakeServiceHeater.max_active, FakeServiceHeater.active)
+    try:
+      await asyncio.sleep(self.delay)
+    finally:
+      FakeServiceHeater.active -= 1
+    if self.outcome == 'raise':
+      raise OSError('device not responding')
+    return self.outcome
+
+
+def dispatch_calls(concurrency, calls):
+  FakeServiceHeater.active = FakeServiceHeater.max_active = 0
+  loop = asyncio.new_event_loop()
+  try:
+    dispatcher = switcher_heater_util.SwitcherHeaterServiceDispatcher(loop, concurrency)
+    futures = [dispatcher.dispatch('switcher_heater_set_auto_off', devices, 'async_set_auto_off', '02:00') for devices in calls]
+    start = time.monotonic()
+    results = loop.run_until_complete(asyncio.gather(*futures))
+    assert dispatcher.active == 0
+    return results, time.monotonic() - start
+  finally:
+    loop.close()
+
+
+def test_service_dispatch():
+  heaters = [FakeServiceHeater(index, True) for index in range(10)]
+  results, duration = dispatch_calls(10, [heaters])
+  # all the devices are handled at the same time
+  assert FakeServiceHeater.max_active == 10
+  assert duration < 0.05 * 3
+  assert results[0] == {heater.entity_id: True for heater in heaters}
+  assert all(heater.calls == ['02:00'] for heater in heaters)
+
+  # no targets resolve right away
+  assert dispatch_calls(10, [[]])[0] == [{}]
+
+
+def test_service_dispatch_limit():
+  heaters = [FakeServiceHeater(index, True) for index in range(12)]
+  results, duration = dispatch_calls(4, [heaters[:6], heaters[6:]])
+  # the limit is shared by concurrent service calls
+  assert FakeServiceHeater.max_active == 4
+  assert duration >= 0.05 * 3
+  assert results == [{heater.entity_id: True for heater in heaters[:6]}, {heater.entity_id: True for heater in heaters[6:]}]
+
+
+def test_service_dispatch_results():
+  heaters = [FakeServiceHeater(0, True), FakeServiceHeater(1, False), FakeServiceHeater(2, None), FakeServiceHeater(3, 'raise'), FakeServiceHeater(4, True)]
+  results = dispatch_calls(2, [heaters])[0]
+  # failures and exceptions are reported per device without failing the others
+  assert results == [{'switch.heater_0': True, 'switch.heater_1': False, 'switch.heater_2': False, 'switch.heater_3': False, 'switch.heater_4': True}]
+  assert FakeServiceHeater.active == 0
+
+
+def main():
+  for name, test in sorted(globals().items()):
+    if name.startswith('test_') and callable(test):
+      test()
+      print(name, 'OK')
+
+
+if __name__ == '__main__':
+  main()
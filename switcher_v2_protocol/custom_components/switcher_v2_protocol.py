@@ -0,0 +1,945 @@
+"""////////////////////////////////////////////////////////////////////////////////////////////////
+Switcher version 2 protocol core, shared by the switcher_heater platform and the switcher_aio component.
+Build by TomerFi
+Please visit https://github.com/TomerFi/home-assistant-custom-components for more custom components
+
+installation notes:
+place this file in the following folder next to switcher_heater or switcher_aio and restart home assistant:
+/config/custom_components
+
+This module has no home assistant dependencies, it holds the packet formats, the packet signing,
+the socket helpers, the response parsers and the capture and replay tools.
+
+Capture file format, an 8 bytes magic followed by length-prefixed records:
+  record type (1 byte), monotonic timestamp (8 bytes double), first length (2 bytes), second length (2 bytes), first, second
+UDP broadcast records carry the raw broadcast message as first and an empty second,
+TCP records carry the raw request as first and the raw response as second.
+
+Replaying a capture:
+python switcher_v2_protocol.py switcher.cap
+python switcher_v2_protocol.py switcher.cap --realtime
+
+////////////////////////////////////////////////////////////////////////////////////////////////"""
+import argparse
+import binascii as ba
+import datetime
+import logging
+import mmap
+import os
+import socket
+import threading
+import time
+import traceback
+from struct import Struct
+
+_LOGGER = logging.getLogger(__name__)
+
+"""###############################
+######### Shared States ##########
+###############################"""
+# same values as homeassistant.const.STATE_ON and homeassistant.const.STATE_OFF
+STATE_ON = "on"
+STATE_OFF = "off"
+
+"""###############################
+####### Weekdays Constants #######
+###############################"""
+SUNDAY = "Sunday"
+MONDAY = "Monday"
+TUESDAY = "Tuesday"
+WEDNESDAY = "Wednesday"
+THURSDAY = "Thursday"
+FRIDAY = "Friday"
+SATURDAY = "Saturday"
+ALL_DAYS = "Every day"
+
+WEEKDAY_TUP = (MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY)
+
+"""###############################
+###### SwitcherV2 Constants ######
+###############################"""
+ENCODING_CODEC = "utf-8"
+REMOTE_SESSION_ID = "00000000"
+REMOTE_KEY = b"00000000000000000000000000000000"
+SOCKET_PORT = 9957
+SOCKET_BIND_TUP = ("0.0.0.0", 20002)
+SOCKET_CONNECT_TIMEOUT = 3
+SOCKET_READ_TIMEOUT = 5
+DEFAULT_SESSION_TTL = 120
+LOGIN_RETRIES = 3
+STATE_RESPONSE_ON = "0100"
+STATE_RESPONSE_OFF = "0000"
+COMMAND_ON = "1"
+COMMAND_OFF = "0"
+NO_TIMER_REQUESTED = "00000000"
+ENABLE_SCHEDULE = "01"
+DISABLE_SCHEDULE = "00"
+DAYS_HEX_DICT = {0x02:MONDAY, 0x04:TUESDAY, 0x08:WEDNESDAY, 0x10:THURSDAY, 0x20:FRIDAY, 0x40:SATURDAY, 0x80:SUNDAY}
+DAYS_INT_DICT = {MONDAY: 2, TUESDAY: 4, WEDNESDAY: 8, THURSDAY: 16, FRIDAY:32, SATURDAY:64, SUNDAY: 128}
+
+"""###############################
+######### Packet Formats #########
+###############################"""
+# remote session id, timestamp, phone id, device password
+LOGIN_PACKET = "fef052000232a100{}340001000000000000000000{}00000000000000000000f0fe1c00{}0000{}00000000000000000000000000000000000000000000000000000000"
+# local session id, timestamp, device id
+GET_STATE_PACKET = "fef0300002320103{}340001000000000000000000{}00000000000000000000f0fe{}00"
+# local session id, timestamp, device id, phone id, device password, command (1/0), timer
+SEND_CONTROL_PACKET = "fef05d0002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}000000000000000000000000000000000000000000000000000000000106000{}00{}"
+# local session id, timestamp, device id, phone id, device password, auto-off seconds
+SET_AUTO_OFF_PACKET = "fef05b0002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000040400{}"
+# local session id, timestamp, device id, phone id, device password, name
+UPDATE_DEVICE_NAME_PACKET = "fef0740002320202{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000{}"
+# local session id, timestamp, device id, phone id, device password
+GET_SCHEDULES_PACKET = "fef0570002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000060000"
+# local session id, timestamp, device id, phone id, device password, schedule id
+DELETE_SCHEDULE_PACKET = "fef0580002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}000000000000000000000000000000000000000000000000000000000801000{}"
+# local session id, timestamp, device id, phone id, device password, schedule data (time_id + on_off + week + timstate + start_time + end_time)
+DISABLE_ENABLE_SCHEDULE_PACKET = "fef0630002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000070c00{}"
+# local session id, timestamp, device id, phone id, device password, schedule data (on_off + week + timstate + start_time + end_time)
+CREATE_SCHEDULE_PACKET = "fef0630002320102{}340001000000000000000000{}00000000000000000000f0fe{}00{}0000{}00000000000000000000000000000000000000000000000000000000030c00ff{}"
+
+"""###############################
+####### Message Structures #######
+###############################"""
+# all offsets are in bytes, multi-byte numbers are little endian
+UINT16 = Struct("<H")
+UINT32 = Struct("<I")
+CRC_POLYNOMIAL = 0x1021
+PACKET_MAGIC = b"\xfe\xf0"
+STATE_BYTES_ON = b"\x01\x00"
+STATE_BYTES_OFF = b"\x00\x00"
+
+SESSION_ID_OFFSET = 8
+
+STATE_RESPONSE_STATE_OFFSET = 75
+STATE_RESPONSE_POWER_OFFSET = 77
+STATE_RESPONSE_TIME_LEFT_OFFSET = 89
+STATE_RESPONSE_AUTO_OFF_OFFSET = 97
+
+BROADCAST_LENGTH = 165
+BROADCAST_DEVICE_ID_OFFSET = 18
+BROADCAST_NAME_OFFSET = 42
+BROADCAST_IP_OFFSET = 76
+BROADCAST_MAC_OFFSET = 80
+BROADCAST_STATE_OFFSET = 133
+BROADCAST_POWER_OFFSET = 135
+BROADCAST_TIME_LEFT_OFFSET = 147
+BROADCAST_AUTO_OFF_OFFSET = 155
+
+"""###############################
+####### Capture Constants ########
+###############################"""
+CAPTURE_MAGIC = b"SWV2CAP1"
+# record type, monotonic timestamp, first length, second length
+RECORD_HEADER = Struct("<BdHH")
+RECORD_BROADCAST = 1
+RECORD_TCP = 2
+
+REQUEST_LOGIN = "login"
+REQUEST_GET_STATE = "get_state"
+REQUEST_CONTROL = "control"
+REQUEST_SET_AUTO_OFF = "set_auto_off"
+REQUEST_UPDATE_NAME = "update_name"
+REQUEST_GET_SCHEDULES = "get_schedules"
+REQUEST_DELETE_SCHEDULE = "delete_schedule"
+REQUEST_DISABLE_ENABLE_SCHEDULE = "disable_enable_schedule"
+REQUEST_CREATE_SCHEDULE = "create_schedule"
+
+# packet command word (bytes 6-8) to request type
+REQUEST_COMMANDS = {
+    b"\xa1\x00": REQUEST_LOGIN,
+    b"\x01\x03": REQUEST_GET_STATE,
+    b"\x02\x02": REQUEST_UPDATE_NAME
+}
+# packet sub command (bytes 80-82) to request type, for the 0102 command word
+REQUEST_SUB_COMMANDS = {
+    b"\x01\x06": REQUEST_CONTROL,
+    b"\x04\x04": REQUEST_SET_AUTO_OFF,
+    b"\x06\x00": REQUEST_GET_SCHEDULES,
+    b"\x08\x01": REQUEST_DELETE_SCHEDULE,
+    b"\x07\x0c": REQUEST_DISABLE_ENABLE_SCHEDULE,
+    b"\x03\x0c": REQUEST_CREATE_SCHEDULE
+}
+
+"""capture writer for raw traffic, set with start_capture"""
+_CAPTURE_WRITER = None
+
+"""###############################
+#### Tools Parsers Converters ####
+###############################"""
+
+
+def sign_packet(data):
+    """CRC calculation, returns the packet bytes followed by the packet crc and the crc signed with the remote key"""
+    crc = UINT16.pack(ba.crc_hqx(data, CRC_POLYNOMIAL))
+    return data + crc + UINT16.pack(ba.crc_hqx(crc + REMOTE_KEY, CRC_POLYNOMIAL))
+
+
+def build_packet(packet_format, *args):
+    """Format a packet template and return the signed packet bytes"""
+    return sign_packet(ba.unhexlify(packet_format.format(*args)))
+
+
+def crc_sign_full_packet_com_key(data):
+    """CRC calculation for hex string packets"""
+    return sign_packet(ba.unhexlify(data)).hex()
+
+
+def get_timestamp():
+    """Generate timestamp"""
+    return UINT32.pack(int(round(time.time()))).hex()
+
+
+def get_socket(ip_addr, port=SOCKET_PORT, connect_timeout=SOCKET_CONNECT_TIMEOUT, read_timeout=SOCKET_READ_TIMEOUT):
+    """Connect to socket, the connect and every following send and recv are limited by the timeouts in seconds"""
+    try:
+        sock = socket.create_connection((ip_addr, port), connect_timeout)
+        sock.settimeout(read_timeout)
+        _LOGGER.debug('connected socket to ' + ip_addr)
+        return sock
+    except Exception:
+        _LOGGER.error('failed to connect socket to ' + ip_addr + ' ' + traceback.format_exc())
+        return None
+
+
+def close_socket_connection(sock, ip_addr):
+    """Close socket"""
+    try:
+        if sock is not None:
+            sock.close()
+            _LOGGER.debug('closed socket connection to ' + ip_addr)
+    except Exception:
+        _LOGGER.debug('socket to ' + ip_addr + ' is not closable')
+
+
+def send_packet(sock, packet):
+    """Send packet bytes and return the raw response, the exchange is captured if capturing was started"""
+    sock.send(packet)
+    response = sock.recv(1024)
+    if _CAPTURE_WRITER is not None:
+        _CAPTURE_WRITER.write_exchange(packet, response)
+    return response
+
+
+def convert_minutes_to_timer(minutes):
+    """convert minutes to hex for timer"""
+    return UINT32.pack(int(minutes) * 60).hex()
+
+
+def convert_seconds_to_iso_time(all_seconds):
+    """convert seconds to iso time (%H:%M:%S)"""
+    minutes, seconds = divmod(int(all_seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours > 23:
+        raise ValueError('hour must be in 0..23')
+    return "%02d:%02d:%02d" % (hours, minutes, seconds)
+
+
+def convert_timedelta_to_auto_off(full_time):
+    """convert timedelta seconds to hex for auto-off, returns the hex and the iso time or None for both if out of range"""
+    auto_off = auto_off_config = None
+    try:
+        minutes = full_time.total_seconds() / 60
+        hours, minutes = divmod(minutes, 60)
+        seconds = int(hours) * 3600 + int(minutes) * 60
+        if seconds > 3599 and seconds < 86341:
+            auto_off = UINT32.pack(seconds).hex()
+            auto_off_config = convert_seconds_to_iso_time(seconds)
+    except Exception:
+        _LOGGER.warning('failed to create auto-off from ' + str(full_time) + ' timedelta')
+
+    return auto_off, auto_off_config
+
+
+def convert_string_to_device_name(name):
+    """convert string to device name"""
+    return (name.encode(ENCODING_CODEC) + bytes(32 - len(name))).hex()
+
+
+def get_days_list_from_bytes(data):
+    """extract week days from shcedule bytes"""
+    return [DAYS_HEX_DICT[day] for day in DAYS_HEX_DICT if day & data != 0x00]
+
+
+def get_time_from_bytes(data):
+    """extract start/end time from shcedule bytes"""
+    timestamp = UINT32.unpack(ba.unhexlify(data))[0]
+    return time.strftime("%H:%M", time.localtime(timestamp))
+
+
+def convert_timedelta_to_schedule_time(time_value):
+    """convert timedelta to schedule start/end time"""
+    return_time = time.mktime(time.strptime(time.strftime("%d/%m/%Y") + " " + str(time_value).split(":")[0] + ":" + str(time_value).split(":")[1], "%d/%m/%Y %H:%M"))
+    return UINT32.pack(int(return_time)).hex()
+
+
+def parse_status(response):
+    """parse the device state from a state response"""
+    state = response[STATE_RESPONSE_STATE_OFFSET:STATE_RESPONSE_STATE_OFFSET + 2]
+    if state == STATE_BYTES_ON:
+        return STATE_ON
+    if state == STATE_BYTES_OFF:
+        return STATE_OFF
+    return None
+
+
+def parse_power_consumption(response):
+    """parse power consumption from a state response, returns watts and amps"""
+    current_power_w = UINT16.unpack_from(response, STATE_RESPONSE_POWER_OFFSET)[0]
+    return current_power_w, round(current_power_w / 220.0, 1)
+
+
+def parse_auto_off_time_left(response):
+    """parse time left to auto off from a state response"""
+    return convert_seconds_to_iso_time(UINT32.unpack_from(response, STATE_RESPONSE_TIME_LEFT_OFFSET)[0])
+
+
+def parse_auto_off_config(response):
+    """parse the auto off configuration from a state response"""
+    return convert_seconds_to_iso_time(UINT32.unpack_from(response, STATE_RESPONSE_AUTO_OFF_OFFSET)[0])
+
+
+def parse_session_id(response):
+    """parse the session id from a response header"""
+    session_id = response[SESSION_ID_OFFSET:SESSION_ID_OFFSET + 4]
+    if len(session_id) != 4:
+        raise ValueError('response too short for a session id')
+    return session_id.hex()
+
+
+"""###############################
+########### Connection ###########
+###############################"""
+
+
+class SwitcherV2Connection(object):
+    """authenticated connection to a device, the session is reused until the ttl expires and renewed on failure"""
+    def __init__(self, ip_addr, phone_id, device_password, port=SOCKET_PORT, ttl=DEFAULT_SESSION_TTL):
+        self._ip_addr = ip_addr
+        self._phone_id = phone_id
+        self._device_password = device_password
+        self._port = port
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._sock = self._session_id = self._ts = self._opened_at = None
+        self._logins = self._requests = 0
+
+    @property
+    def session_id(self):
+        """return the current session id or None if not logged in"""
+        return self._session_id
+
+    @property
+    def logins(self):
+        """return the number of successful logins"""
+        return self._logins
+
+    @property
+    def requests(self):
+        """return the number of successful requests"""
+        return self._requests
+
+    def _close(self):
+        close_socket_connection(self._sock, self._ip_addr)
+        self._sock = self._session_id = self._ts = self._opened_at = None
+
+    def _login(self):
+        """open a new socket and login, returns true if a session id was retrieved"""
+        self._close()
+        sock = get_socket(self._ip_addr, self._port)
+        if sock is None:
+            return False
+
+        ts = get_timestamp()
+        try:
+            for _ in range(LOGIN_RETRIES + 1):
+                response = SwitcherV2LoginResponseMSG(send_packet(sock, build_packet(LOGIN_PACKET, REMOTE_SESSION_ID, ts, self._phone_id, self._device_password)))
+                if response.successful:
+                    _LOGGER.debug('logged in to ' + self._ip_addr + ', session id is: ' + response.session_id)
+                    self._sock, self._session_id, self._ts, self._opened_at = sock, response.session_id, ts, time.monotonic()
+                    self._logins += 1
+                    return True
+                _LOGGER.warning('failed to get session id from ' + self._ip_addr + ', retrying')
+            _LOGGER.error('failed to get session id from ' + self._ip_addr + ', please try again later')
+        except Exception:
+            _LOGGER.error('failed to send login packet to ' + self._ip_addr + ' ' + traceback.format_exc())
+
+        close_socket_connection(sock, self._ip_addr)
+        return False
+
+    def request(self, response_class, packet_format, *args):
+        """send a session packet, the session id and the timestamp are prepended to args,
+        returns the response_class message or None if it was unsuccessful with a new session too"""
+        with self._lock:
+            for _ in range(2):
+                if self._sock is None or time.monotonic() - self._opened_at >= self._ttl:
+                    if not self._login():
+                        return None
+                try:
+                    response = response_class(send_packet(self._sock, build_packet(packet_format, self._session_id, self._ts, *args)))
+                    if response.successful:
+                        self._requests += 1
+                        return response
+                    _LOGGER.debug('unsuccessful response from ' + self._ip_addr + ', logging in again')
+                except Exception:
+                    _LOGGER.debug('request to ' + self._ip_addr + ' failed, logging in again ' + traceback.format_exc())
+                self._close()
+            return None
+
+    def close(self):
+        """close the socket and drop the session"""
+        with self._lock:
+            self._close()
+
+
+def get_device_state(ip_addr, phone_id, device_id, device_password, port=SOCKET_PORT):
+    """Blocking login and get state exchange, returns the SwitcherV2StateResponseMSG or None on failure"""
+    connection = SwitcherV2Connection(ip_addr, phone_id, device_password, port, ttl=0)
+    try:
+        return connection.request(SwitcherV2StateResponseMSG, GET_STATE_PACKET, device_id)
+    finally:
+        connection.close()
+
+
+"""###############################
+######## Capture & Replay ########
+###############################"""
+
+
+def get_request_type(request):
+    """identify the request type of a raw request packet"""
+    command = bytes(request[6:8])
+    if command == b"\x01\x02":
+        return REQUEST_SUB_COMMANDS.get(bytes(request[80:82]))
+    return REQUEST_COMMANDS.get(command)
+
+
+def start_capture(path):
+    """start capturing all the traffic passing through this module to path, returns the capture writer"""
+    global _CAPTURE_WRITER
+    if _CAPTURE_WRITER is None:
+        _CAPTURE_WRITER = SwitcherV2CaptureWriter(path)
+    elif _CAPTURE_WRITER.path != path:
+        _LOGGER.warning('already capturing to ' + _CAPTURE_WRITER.path + ', ignoring ' + path)
+    return _CAPTURE_WRITER
+
+
+def capture_broadcast(message):
+    """capture a raw broadcast message if capturing was started"""
+    if _CAPTURE_WRITER is not None:
+        _CAPTURE_WRITER.write_broadcast(message)
+
+
+class SwitcherV2CaptureWriter(object):
+    """append only writer for capture files, safe for use from multiple threads"""
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a+b")
+        self._file.seek(0)
+        magic = self._file.read(len(CAPTURE_MAGIC))
+        if not magic:
+            self._file.write(CAPTURE_MAGIC)
+        elif magic != CAPTURE_MAGIC:
+            self._file.close()
+            raise ValueError(path + " is not a switcher capture file")
+        self._file.seek(0, os.SEEK_END)
+        _LOGGER.debug("capturing switcher traffic to " + path)
+
+    @property
+    def path(self):
+        """Return the capture file path"""
+        return self._path
+
+    def write_broadcast(self, message):
+        """append a raw udp broadcast message"""
+        self._write(RECORD_BROADCAST, message, b"")
+
+    def write_exchange(self, request, response):
+        """append a raw tcp request and its response"""
+        self._write(RECORD_TCP, request, response)
+
+    def _write(self, record_type, first, second):
+        """append a single record"""
+        record = RECORD_HEADER.pack(record_type, time.monotonic(), len(first), len(second)) + bytes(first) + bytes(second)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(record)
+                self._file.flush()
+
+    def close(self, event=None):
+        """close the capture file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                _LOGGER.debug("capture file " + self._path + " closed")
+
+
+def iter_capture(path):
+    """memory-map a capture file and yield (record type, timestamp, first, second) for each record"""
+    with open(path, "rb") as capture_file:
+        if os.fstat(capture_file.fileno()).st_size < len(CAPTURE_MAGIC):
+            return
+        with mmap.mmap(capture_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+                raise ValueError(path + " is not a switcher capture file")
+            offset = len(CAPTURE_MAGIC)
+            size = len(data)
+            header_size = RECORD_HEADER.size
+            unpack_header = RECORD_HEADER.unpack_from
+            while offset + header_size <= size:
+                record_type, timestamp, first_len, second_len = unpack_header(data, offset)
+                start = offset + header_size
+                end = start + first_len + second_len
+                if end > size:
+                    _LOGGER.warning("truncated record at offset " + str(offset) + " in " + path)
+                    return
+                yield record_type, timestamp, data[start:start + first_len], data[start + first_len:end]
+                offset = end
+
+
+def replay_capture(path, broadcast_decoder=None, response_decoders=None, realtime=False):
+    """feed a capture file through the decoders, yields (timestamp, request type, decoded message).
+    broadcast records are reported with a request type of None, unknown requests are skipped"""
+    broadcast_decoder = broadcast_decoder or SwitcherV2BroadcastMSG
+    response_decoders = response_decoders or RESPONSE_DECODERS
+    first_timestamp = replay_start = None
+    for record_type, timestamp, first, second in iter_capture(path):
+        if realtime:
+            if first_timestamp is None:
+                first_timestamp = timestamp
+                replay_start = time.monotonic()
+            delay = (timestamp - first_timestamp) - (time.monotonic() - replay_start)
+            if delay > 0:
+                time.sleep(delay)
+
+        if record_type == RECORD_BROADCAST:
+            yield timestamp, None, broadcast_decoder(first)
+        elif record_type == RECORD_TCP:
+            request_type = get_request_type(first)
+            decoder = response_decoders.get(request_type)
+            if decoder is not None:
+                yield timestamp, request_type, decoder(second)
+            else:
+                _LOGGER.debug("no decoder for request type " + str(request_type))
+
+
+"""#############################
+#### Represntation Classes #####
+#############################"""
+
+
+class SwitcherV2Schedule(object):
+    """represnation of the switcher version 2 schedule"""
+    def __init__(self, idx, schedule_details):
+        self._schedule_id = None
+        self._enabled = False
+        self._recurring = False
+        self._days = []
+        self._start_time = None
+        self._end_time = None
+        self._duration = None
+        self._schedule_data = None
+        try:
+            self._schedule_id = str(int(schedule_details[idx][0:2], 16))
+            if int(schedule_details[idx][2:4], 16) == 1:
+                self._enabled = True
+            if not schedule_details[idx][4:6] == "00":
+                self._recurring = True
+                if schedule_details[idx][4:6] == "fe":
+                    self._days = ALL_DAYS
+                else:
+                    self._days = get_days_list_from_bytes(int(schedule_details[idx][4:6], 16))
+
+            self._start_time = get_time_from_bytes(schedule_details[idx][8:16])
+            self._end_time = get_time_from_bytes(schedule_details[idx][16:24])
+            self._duration = str(datetime.datetime.strptime(self._end_time,'%H:%M') - datetime.datetime.strptime(self._start_time,'%H:%M'))
+
+            time_id = schedule_details[idx][0:2]
+            on_off = schedule_details[idx][2:4]
+            week = schedule_details[idx][4:6]
+            timestate = schedule_details[idx][6:8]
+            start_time = schedule_details[idx][8:16]
+            end_time = schedule_details[idx][16:24]
+            self._schedule_data = (time_id + on_off + week + timestate + start_time + end_time)
+        except Exception:
+            _LOGGER.error("failed to parse schedule data " + traceback.format_exc())
+
+    def as_dict(self):
+        """Callback for __dict__."""
+        return self.__dict__
+
+    @property
+    def schedule_id(self):
+        """Return the schedule id"""
+        return self._schedule_id
+
+    @property
+    def enabled(self):
+        """Return true if enabled"""
+        return self._enabled
+
+    @property
+    def recurring(self):
+        """Return true if recurring"""
+        return self._recurring
+
+    @property
+    def days(self):
+        """Return the weekdays of the schedule"""
+        return self._days
+
+    @property
+    def start_time(self):
+        """Return the start time of the schedule"""
+        return self._start_time
+
+    @property
+    def end_time(self):
+        """Return the end time of the schedule"""
+        return self._end_time
+
+    @property
+    def duration(self):
+        """Return the duration of the schedule"""
+        return self._duration
+
+    @property
+    def schedule_data(self):
+        """Return the schedule data for managing the schedule"""
+        return self._schedule_data
+
+    def set_enabled(self, value):
+        """Function to set the device as enabled or disabled"""
+        self._enabled = value
+
+    def set_schedule_data(self, data):
+        """Function to set the schedule data for managing the schedule"""
+        self._schedule_data = data
+
+
+"""#############################
+###### Response Messages #######
+#############################"""
+
+
+class SwitcherV2BroadcastMSG(object):
+    """represntation of the switcher version 2 broadcast message"""
+    def __init__(self, message):
+        self._verified = self._validated = False
+        self._ip_address = self._mac = self._name = self._device_id = self._state = self._time_to_auto_off = self._auto_off_config_time = None
+        self._power_consumption = self._electric_current = 0
+
+        try:
+            self._verified = message[0:2] == PACKET_MAGIC and len(message) == BROADCAST_LENGTH
+            if self._verified:
+                self._ip_address = socket.inet_ntoa(message[BROADCAST_IP_OFFSET:BROADCAST_IP_OFFSET + 4])
+
+                mac = message[BROADCAST_MAC_OFFSET:BROADCAST_MAC_OFFSET + 6].hex().upper()
+                self._mac = ':'.join((mac[0:2], mac[2:4], mac[4:6], mac[6:8], mac[8:10], mac[10:12]))
+
+                self._name = message[BROADCAST_NAME_OFFSET:BROADCAST_NAME_OFFSET + 32].decode(ENCODING_CODEC).rstrip('\x00')
+
+                self._device_id = message[BROADCAST_DEVICE_ID_OFFSET:BROADCAST_DEVICE_ID_OFFSET + 3].hex()
+
+                self._state = self._time_to_auto_off = STATE_ON if message[BROADCAST_STATE_OFFSET:BROADCAST_STATE_OFFSET + 2] == STATE_BYTES_ON else STATE_OFF
+
+                self._auto_off_config_time = convert_seconds_to_iso_time(UINT32.unpack_from(message, BROADCAST_AUTO_OFF_OFFSET)[0])
+
+                if self._state == STATE_ON:
+                    self._power_consumption = UINT16.unpack_from(message, BROADCAST_POWER_OFFSET)[0]
+                    self._electric_current = round(self._power_consumption / 220.0, 1)
+                    self._time_to_auto_off = convert_seconds_to_iso_time(UINT32.unpack_from(message, BROADCAST_TIME_LEFT_OFFSET)[0])
+
+            self._validated = True
+        except Exception:
+            _LOGGER.exception("failed to parse broadcast message " + traceback.format_exc())
+
+    def as_dict(self):
+        """Callback for __dict__."""
+        return self.__dict__
+
+    @property
+    def verified(self):
+        """return rather or not the message was verified as a switcher v2 message"""
+        return self._verified if self._validated == True else self._validated
+
+    @property
+    def ip(self):
+        """return the ip address"""
+        return self._ip_address
+
+    @property
+    def mac(self):
+        """return the mac address"""
+        return self._mac
+
+    @property
+    def name(self):
+        """return the device name"""
+        return self._name
+
+    @property
+    def device_id(self):
+        """return the device id"""
+        return self._device_id
+
+    @property
+    def state(self):
+        """return the state of the device"""
+        return self._state
+
+    @property
+    def time_left(self):
+        """return the time left to auto-offf"""
+        return self._time_to_auto_off
+
+    @property
+    def auto_off(self):
+        """return the auto-off configuration value"""
+        return self._auto_off_config_time
+
+    @property
+    def power(self):
+        """return the power consumptionin watts"""
+        return self._power_consumption
+
+    @property
+    def current(self):
+        """return the power consumptionin amps"""
+        return self._electric_current
+
+
+class SwitcherV2LoginResponseMSG(object):
+    """represntation of the switcher version 2 login response message"""
+    def __init__(self, response):
+        self._unparsed_response = response
+        self._session_id = None
+        try:
+            self._session_id = parse_session_id(response)
+        except Exception:
+            _LOGGER.exception("failed to parse login response message " + traceback.format_exc())
+
+    def as_dict(self):
+        """Callback for __dict__."""
+        return self.__dict__
+
+    @property
+    def unparsed_response(self):
+        """Return the uparsed response message"""
+        return self._unparsed_response
+
+    @property
+    def session_id(self):
+        """Return the retrieved session id"""
+        return self._session_id
+
+    @property
+    def successful(self):
+        """Return the status of the message"""
+        return self._session_id is not None
+
+
+class SwitcherV2StateResponseMSG(object):
+    """represntation of the switcher version 2 state response message"""
+    def __init__(self, response):
+        self._unparsed_response = response
+        self._state = self._time_to_auto_off = self._auto_off_config_time = None
+        self._power_consumption = self._electric_current = 0
+
+        """each field is parsed on its own, the message is successful if the state parses"""
+        try:
+            self._state = parse_status(response)
+        except Exception:
+            _LOGGER.exception("failed to parse the state of the state response message " + traceback.format_exc())
+
+        try:
+            self._power_consumption, self._electric_current = parse_power_consumption(response)
+        except Exception:
+            _LOGGER.exception("failed to parse the power consumption of the state response message " + traceback.format_exc())
+
+        try:
+            self._time_to_auto_off = parse_auto_off_time_left(response)
+        except Exception:
+            _LOGGER.exception("failed to parse the time left of the state response message " + traceback.format_exc())
+
+        try:
+            self._auto_off_config_time = parse_auto_off_config(response)
+        except Exception:
+            _LOGGER.exception("failed to parse the auto-off configuration of the state response message " + traceback.format_exc())
+
+    def as_dict(self):
+        """Callback for __dict__."""
+        return self.__dict__
+
+    @property
+    def unparsed_response(self):
+        """Return the uparsed response message"""
+        return self._unparsed_response
+
+    @property
+    def state(self):
+        """Return the state"""
+        return self._state
+
+    @property
+    def time_left(self):
+        """Return the time left to auto-off"""
+        return self._time_to_auto_off
+
+    @property
+    def auto_off(self):
+        """Return the auto-off configuration value"""
+        return self._auto_off_config_time
+
+    @property
+    def power(self):
+        """Return the current power consumption in watts"""
+        return self._power_consumption
+
+    @property
+    def current(self):
+        """Return the power consumption in amps"""
+        return self._electric_current
+
+    @property
+    def successful(self):
+        """Return the status of the message"""
+        return self._state is not None
+
+
+class SwitcherV2AckResponseMSG(object):
+    """represntation of the switcher version 2 acknowledge response messages, holds the session id of the response"""
+    MESSAGE_TYPE = "acknowledge"
+
+    def __init__(self, response):
+        self._unparsed_response = None
+        try:
+            self._unparsed_response = parse_session_id(response)
+        except Exception:
+            _LOGGER.exception("failed to parse " + self.MESSAGE_TYPE + " response message " + traceback.format_exc())
+
+    def as_dict(self):
+        """Callback for __dict__."""
+        return self.__dict__
+
+    @property
+    def unparsed_response(self):
+        """Return the uparsed response message"""
+        return self._unparsed_response
+
+    @property
+    def successful(self):
+        """Return the status of the message"""
+        return self._unparsed_response is not None
+
+
+class SwitcherV2ControlResponseMSG(SwitcherV2AckResponseMSG):
+    """represntation of the switcher version 2 control response message"""
+    MESSAGE_TYPE = "control"
+
+
+class SwitcherV2SetAutoOffResponseMSG(SwitcherV2AckResponseMSG):
+    """represntation of the switcher version 2 set auto-off response message"""
+    MESSAGE_TYPE = "set auto-off"
+
+
+class SwitcherV2UpdateNameResponseMSG(SwitcherV2AckResponseMSG):
+    """represntation of the switcher version 2 update name response message"""
+    MESSAGE_TYPE = "update name"
+
+
+class SwitcherV2DisableEnableScheduleResponseMSG(SwitcherV2AckResponseMSG):
+    """represntation of the switcher version 2 disable enable schedule response message"""
+    MESSAGE_TYPE = "disable enable schedule"
+
+
+class SwitcherV2DeleteScheduleResponseMSG(SwitcherV2AckResponseMSG):
+    """represntation of the switcher version 2 delete schedule response message"""
+    MESSAGE_TYPE = "delete schedule"
+
+
+class SwitcherV2CreateScheduleResponseMSG(SwitcherV2AckResponseMSG):
+    """represntation of the switcher version 2 create schedule response message"""
+    MESSAGE_TYPE = "create schedule"
+
+
+class SwitcherV2GetScheduleResponseMSG(object):
+    """represnation of the switcher version 2 get schedule message"""
+    def __init__(self, response):
+        self._unparsed_response = None
+        self._schedule_list = []
+        try:
+            self._unparsed_response = response.hex()
+            idx = self._unparsed_response[90:-8]
+            schedules_details = [idx[i:i + 32] for i in range(0, len(idx), 32)]
+            for i in range(len(schedules_details)):
+                self._schedule_list.append(SwitcherV2Schedule(i, schedules_details))
+        except Exception:
+            _LOGGER.exception("failed to parse get schedules response message " + traceback.format_exc())
+
+    def as_dict(self):
+        """Callback for __dict__."""
+        return self.__dict__
+
+    @property
+    def unparsed_response(self):
+        """Return the uparsed response message"""
+        return self._unparsed_response
+
+    @property
+    def successful(self):
+        """Return the status of the message"""
+        return self._unparsed_response is not None
+
+    @property
+    def found_schedules(self):
+        """Return true if found shedules in the response"""
+        return not self._schedule_list == []
+
+    @property
+    def get_schedules(self):
+        """Return the schedules list"""
+        return self._schedule_list
+
+
+"""response decoders by request type, used for replaying captured traffic"""
+RESPONSE_DECODERS = {
+    REQUEST_LOGIN: SwitcherV2LoginResponseMSG,
+    REQUEST_GET_STATE: SwitcherV2StateResponseMSG,
+    REQUEST_CONTROL: SwitcherV2ControlResponseMSG,
+    REQUEST_SET_AUTO_OFF: SwitcherV2SetAutoOffResponseMSG,
+    REQUEST_UPDATE_NAME: SwitcherV2UpdateNameResponseMSG,
+    REQUEST_GET_SCHEDULES: SwitcherV2GetScheduleResponseMSG,
+    REQUEST_DELETE_SCHEDULE: SwitcherV2DeleteScheduleResponseMSG,
+    REQUEST_DISABLE_ENABLE_SCHEDULE: SwitcherV2DisableEnableScheduleResponseMSG,
+    REQUEST_CREATE_SCHEDULE: SwitcherV2CreateScheduleResponseMSG
+}
+
+
+def main():
+    """replay a capture file and print decoding statistics"""
+    parser = argparse.ArgumentParser(description="replay a switcher v2 capture file through the message decoders")
+    parser.add_argument("path", help="capture file path")
+    parser.add_argument("--realtime", action="store_true", help="replay using the captured timing instead of full speed")
+    parser.add_argument("--repeat", type=int, default=1, help="number of passes over the capture")
+    args = parser.parse_args()
+
+    counts = {}
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for timestamp, request_type, message in replay_capture(args.path, realtime=args.realtime):
+            key = request_type or "broadcast"
+            counts[key] = counts.get(key, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    for key in sorted(counts):
+        print("%-24s %d" % (key, counts[key]))
+    print("%-24s %d messages in %.3f seconds (%.0f messages per second)" % ("total", total, elapsed, total / elapsed if elapsed else 0))
+
+
+if __name__ == "__main__":
+    main()
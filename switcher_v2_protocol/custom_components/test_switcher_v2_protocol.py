@@ -0,0 +1,202 @@
+import binascii as ba
+import datetime
+import os
+import socket
+import tempfile
+import time
+from struct import pack
+
+import switcher_v2_protocol as protocol
+
+PHONE_ID = "1234"
+DEVICE_ID = "a1b2c3"
+DEVICE_PASSWORD = "00112233"
+SESSION_ID = "0a0b0c0d"
+TIMESTAMP = "5bd4a1f0"
+
+
+def reference_crc_sign(data):
+  """the original hex string implementation of the packet signing"""
+  crc = (ba.hexlify(pack('>I', ba.crc_hqx(ba.unhexlify(data), 0x1021)))).decode('utf-8')
+  data = data + crc[6:8] + crc[4:6]
+  crc = crc[6:8] + crc[4:6] + (ba.hexlify(protocol.REMOTE_KEY)).decode('utf-8')
+  crc = (ba.hexlify(pack('>I', ba.crc_hqx(ba.unhexlify(crc), 0x1021)))).decode('utf-8')
+  return data + crc[6:8] + crc[4:6]
+
+
+def make_state_response(state, power, time_left, auto_off):
+  response = bytearray(110)
+  response[0:2] = protocol.PACKET_MAGIC
+  response[8:12] = ba.unhexlify(SESSION_ID)
+  response[75:77] = state
+  response[77:79] = pack('<H', power)
+  response[89:93] = pack('<I', time_left)
+  response[97:101] = pack('<I', auto_off)
+  return bytes(response)
+
+
+def make_broadcast(state, power, time_left, auto_off, name="Boiler", ip="192.168.1.33", mac=b"\x01\x02\x03\xaa\xbb\xcc"):
+  message = bytearray(165)
+  message[0:2] = protocol.PACKET_MAGIC
+  message[18:21] = ba.unhexlify(DEVICE_ID)
+  message[42:42 + len(name)] = name.encode('utf-8')
+  message[76:80] = socket.inet_aton(ip)
+  message[80:86] = mac
+  message[133:135] = state
+  message[135:137] = pack('<H', power)
+  message[147:151] = pack('<I', time_left)
+  message[155:159] = pack('<I', auto_off)
+  return bytes(message)
+
+
+def all_request_packets():
+  return {
+    protocol.REQUEST_LOGIN: protocol.build_packet(protocol.LOGIN_PACKET, protocol.REMOTE_SESSION_ID, TIMESTAMP, PHONE_ID, DEVICE_PASSWORD),
+    protocol.REQUEST_GET_STATE: protocol.build_packet(protocol.GET_STATE_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID),
+    protocol.REQUEST_CONTROL: protocol.build_packet(protocol.SEND_CONTROL_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD, protocol.COMMAND_ON, protocol.convert_minutes_to_timer(15)),
+    protocol.REQUEST_SET_AUTO_OFF: protocol.build_packet(protocol.SET_AUTO_OFF_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD, "100e0000"),
+    protocol.REQUEST_UPDATE_NAME: protocol.build_packet(protocol.UPDATE_DEVICE_NAME_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD, protocol.convert_string_to_device_name("Boiler")),
+    protocol.REQUEST_GET_SCHEDULES: protocol.build_packet(protocol.GET_SCHEDULES_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD),
+    protocol.REQUEST_DELETE_SCHEDULE: protocol.build_packet(protocol.DELETE_SCHEDULE_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD, "1"),
+    protocol.REQUEST_DISABLE_ENABLE_SCHEDULE: protocol.build_packet(protocol.DISABLE_ENABLE_SCHEDULE_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD, "0101fe01" + "00" * 8),
+    protocol.REQUEST_CREATE_SCHEDULE: protocol.build_packet(protocol.CREATE_SCHEDULE_PACKET, SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD, "01fe01" + "00" * 8),
+  }
+
+
+def test_packet_signing_matches_reference():
+  for packet_format, args in (
+      (protocol.LOGIN_PACKET, (protocol.REMOTE_SESSION_ID, TIMESTAMP, PHONE_ID, DEVICE_PASSWORD)),
+      (protocol.GET_STATE_PACKET, (SESSION_ID, TIMESTAMP, DEVICE_ID)),
+      (protocol.SEND_CONTROL_PACKET, (SESSION_ID, TIMESTAMP, DEVICE_ID, PHONE_ID, DEVICE_PASSWORD, "0", protocol.NO_TIMER_REQUESTED))):
+    expected = reference_crc_sign(packet_format.format(*args))
+    assert protocol.crc_sign_full_packet_com_key(packet_format.format(*args)) == expected
+    assert protocol.build_packet(packet_format, *args) == ba.unhexlify(expected)
+
+
+def test_converters():
+  assert len(protocol.get_timestamp()) == 8
+  assert protocol.convert_minutes_to_timer(15) == "84030000"
+  assert protocol.convert_seconds_to_iso_time(3725) == "01:02:05"
+  assert protocol.convert_seconds_to_iso_time("0") == "00:00:00"
+  assert protocol.convert_timedelta_to_auto_off(datetime.timedelta(hours=1, minutes=30)) == ("18150000", "01:30:00")
+  assert protocol.convert_timedelta_to_auto_off(datetime.timedelta(minutes=30)) == (None, None)
+  assert protocol.convert_string_to_device_name("ab") == "6162" + "00" * 30
+  assert protocol.get_days_list_from_bytes(0x06) == [protocol.MONDAY, protocol.TUESDAY]
+  try:
+    protocol.convert_seconds_to_iso_time(86400)
+    assert False, "expected ValueError"
+  except ValueError:
+    pass
+
+
+def test_state_response():
+  response = make_state_response(protocol.STATE_BYTES_ON, 2420, 3725, 5400)
+  assert protocol.parse_status(response) == protocol.STATE_ON
+  assert protocol.parse_power_consumption(response) == (2420, 11.0)
+  assert protocol.parse_auto_off_time_left(response) == "01:02:05"
+  assert protocol.parse_auto_off_config(response) == "01:30:00"
+
+  msg = protocol.SwitcherV2StateResponseMSG(response)
+  assert msg.successful
+  assert (msg.state, msg.power, msg.current, msg.time_left, msg.auto_off) == (protocol.STATE_ON, 2420, 11.0, "01:02:05", "01:30:00")
+
+  assert protocol.parse_status(make_state_response(protocol.STATE_BYTES_OFF, 0, 0, 5400)) == protocol.STATE_OFF
+  assert protocol.parse_status(make_state_response(b"\x02\x00", 0, 0, 5400)) is None
+  assert not protocol.SwitcherV2StateResponseMSG(b"\xfe\xf0").successful
+
+  # a bad field doesn't fail the message, only the state does
+  msg = protocol.SwitcherV2StateResponseMSG(response[:77])
+  assert msg.successful
+  assert (msg.state, msg.power, msg.current, msg.time_left, msg.auto_off) == (protocol.STATE_ON, 0, 0, None, None)
+  msg = protocol.SwitcherV2StateResponseMSG(response[:95])
+  assert msg.successful
+  assert (msg.state, msg.power, msg.current, msg.time_left, msg.auto_off) == (protocol.STATE_ON, 2420, 11.0, "01:02:05", None)
+  assert not protocol.SwitcherV2StateResponseMSG(make_state_response(b"\x02\x00", 2420, 3725, 5400)).successful
+
+
+def test_broadcast_message():
+  msg = protocol.SwitcherV2BroadcastMSG(make_broadcast(protocol.STATE_BYTES_ON, 2420, 3725, 5400))
+  assert msg.verified
+  assert (msg.ip, msg.mac, msg.name, msg.device_id) == ("192.168.1.33", "01:02:03:AA:BB:CC", "Boiler", DEVICE_ID)
+  assert (msg.state, msg.power, msg.current, msg.time_left, msg.auto_off) == (protocol.STATE_ON, 2420, 11.0, "01:02:05", "01:30:00")
+
+  msg = protocol.SwitcherV2BroadcastMSG(make_broadcast(protocol.STATE_BYTES_OFF, 2420, 3725, 5400))
+  assert (msg.state, msg.power, msg.current, msg.auto_off) == (protocol.STATE_OFF, 0, 0, "01:30:00")
+
+  assert not protocol.SwitcherV2BroadcastMSG(b"\xfe\xf0" + bytes(100)).verified
+
+
+def test_login_and_ack_responses():
+  response = make_state_response(protocol.STATE_BYTES_OFF, 0, 0, 0)
+  assert protocol.SwitcherV2LoginResponseMSG(response).session_id == SESSION_ID
+  assert protocol.SwitcherV2ControlResponseMSG(response).unparsed_response == SESSION_ID
+  assert not protocol.SwitcherV2LoginResponseMSG(b"").successful
+  assert not protocol.SwitcherV2SetAutoOffResponseMSG(b"\xfe\xf0").successful
+
+
+def test_request_types():
+  for request_type, packet in all_request_packets().items():
+    assert protocol.get_request_type(packet) == request_type
+
+
+def test_capture_and_replay():
+  path = os.path.join(tempfile.mkdtemp(), "switcher.cap")
+  broadcast = make_broadcast(protocol.STATE_BYTES_ON, 2420, 3725, 5400)
+  state_response = make_state_response(protocol.STATE_BYTES_ON, 2420, 3725, 5400)
+  packets = all_request_packets()
+
+  writer = protocol.SwitcherV2CaptureWriter(path)
+  writer.write_broadcast(broadcast)
+  writer.write_exchange(packets[protocol.REQUEST_GET_STATE], state_response)
+  writer.close()
+  # reopening appends to the same capture
+  writer = protocol.SwitcherV2CaptureWriter(path)
+  writer.write_exchange(packets[protocol.REQUEST_CONTROL], state_response)
+  writer.close()
+
+  records = list(protocol.iter_capture(path))
+  assert [record[0] for record in records] == [protocol.RECORD_BROADCAST, protocol.RECORD_TCP, protocol.RECORD_TCP]
+  assert records[0][2] == broadcast and records[0][3] == b""
+  assert records[1][2] == packets[protocol.REQUEST_GET_STATE] and records[1][3] == state_response
+  assert records[0][1] <= records[1][1] <= records[2][1]
+
+  replayed = list(protocol.replay_capture(path))
+  assert [request_type for _, request_type, _ in replayed] == [None, protocol.REQUEST_GET_STATE, protocol.REQUEST_CONTROL]
+  assert replayed[0][2].device_id == DEVICE_ID
+  assert replayed[1][2].state == protocol.STATE_ON
+  assert replayed[2][2].successful
+
+  # a record cut in the middle of writing is dropped
+  with open(path, "ab") as capture_file:
+    capture_file.write(protocol.RECORD_HEADER.pack(protocol.RECORD_BROADCAST, 0.0, 165, 0) + broadcast[:10])
+  assert len(list(protocol.iter_capture(path))) == 3
+
+
+def test_socket_timeouts():
+  server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  server.bind(('127.0.0.1', 0))
+  server.listen(1)
+  try:
+    # the server accepts but never answers
+    sock = protocol.get_socket('127.0.0.1', server.getsockname()[1], read_timeout=0.2)
+    start = time.monotonic()
+    try:
+      protocol.send_packet(sock, all_request_packets()[protocol.REQUEST_LOGIN])
+      assert False, "expected socket.timeout"
+    except socket.timeout:
+      pass
+    assert time.monotonic() - start < 1
+    protocol.close_socket_connection(sock, '127.0.0.1')
+  finally:
+    server.close()
+
+
+def main():
+  for name, test in sorted(globals().items()):
+    if name.startswith('test_') and callable(test):
+      test()
+      print(name, 'OK')
+
+
+if __name__ == '__main__':
+  main()